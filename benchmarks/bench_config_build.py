@@ -0,0 +1,288 @@
+"""Config build benchmark for ha_mqtt_dash.
+
+Generates synthetic profiles (every widget type, the layout shorthand and the
+multi-page form) at a range of widget and device counts. For each scenario it
+measures:
+
+- ``_extract_entities_from_profiles`` over all profiles
+- ``MqttBridge._build_config_for_device`` per device (build time)
+- ``encode_config`` of the built documents (encode time, payload bytes)
+- tracemalloc peak and net allocation during build+encode
+- ``MqttBridge.async_publish_all_configs`` end to end against a stub hass and
+  an in-memory MQTT publisher (inline compile mode)
+
+Results are written as JSON so runs from different releases can be compared::
+
+    python benchmarks/bench_config_build.py --out bench_results.json
+    python benchmarks/bench_config_build.py --widgets 10,100 --devices 1,50 --baseline bench_results.json
+
+Requires Home Assistant to be importable (``pip install homeassistant``); no
+broker, Store or running HA instance is used.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from custom_components.ha_mqtt_dash import mqtt_bridge  # noqa: E402
+from custom_components.ha_mqtt_dash.config_builder import (  # noqa: E402
+    _extract_entities_from_profiles,
+    encode_config,
+)
+from custom_components.ha_mqtt_dash.const import (  # noqa: E402
+    CONF_COMPILE_MODE,
+    CONF_DEVICES,
+    CONF_PROFILES,
+    COMPILE_MODE_INLINE,
+)
+
+DEFAULT_WIDGETS = [10, 50, 100, 250, 500]
+DEFAULT_DEVICES = [1, 10, 100, 500]
+FORMS = ["widgets", "layout", "pages"]
+# Pages must stay within the apply_profile limit of 200 widgets per page
+_WIDGETS_PER_PAGE = 100
+
+
+# ---------- synthetic profiles ----------
+
+def _widget(i: int) -> Dict[str, Any]:
+    """One widget of a type chosen round-robin across every supported widget type."""
+    x, y = i % 12, i // 12
+    pos = {"id": f"w{i}", "x": x, "y": y, "w": 1, "h": 1}
+    fmt = {"textSize": 14, "align": "center", "textColor": "#ffffff", "bgColor": "#202020"}
+    kinds = [
+        {"entity_id": f"light.bench_{i}", "type": "light", "format": fmt},
+        {"entity_id": f"switch.bench_{i}", "type": "switch"},
+        {"entity_id": f"scene.bench_{i}", "type": "scene"},
+        {"entity_id": f"script.bench_{i}", "type": "button", "protected": True},
+        {"entity_id": f"person.bench_{i}", "type": "person"},
+        {"entity_id": f"sensor.bench_{i}", "type": "sensor", "unit": "°C", "format": fmt},
+        {"entity_id": f"climate.bench_{i}", "type": "climate", "modes": ["heat", "off"],
+         "state_formats": {"heat": {"color": "#ff0000"}}},
+        {"entity_id": f"media_player.bench_{i}", "type": "mediaplayer"},
+        {"entity_id": f"weather.bench_{i}", "type": "weather", "attrs": ["temperature", "humidity"],
+         "attr_units": {"temperature": "°C"}},
+        {"type": "label", "text": f"Label {i}", "format": fmt},
+        {"type": "clock", "time_pattern": "HH:mm"},
+        {"type": "timer", "default_seconds": 300, "configurable": True},
+        {"type": "camera", "stream_url": f"http://cam.local/{i}.mjpg", "scale_mode": "fit",
+         "overlay_button": {"entity_id": f"lock.bench_{i}", "label": "Open", "action": "toggle"}},
+        {"type": "webpage", "url": f"http://example.local/{i}"},
+        {"type": "mealie", "mealie_url": "http://mealie.local", "visible_section": "today"},
+        {"type": "printer", "nozzle_entity": f"sensor.nozzle_{i}", "bed_entity": f"sensor.bed_{i}",
+         "time_entity": f"sensor.ptime_{i}", "progress_entity": f"sensor.progress_{i}",
+         "status_entity": f"sensor.pstatus_{i}", "progress_unit": "%"},
+        {"entity_id": f"sensor.sv_{i}", "type": "sousvide", "temp_entity": f"sensor.svt_{i}",
+         "target_entity": f"sensor.svtarget_{i}", "time_entity": f"sensor.svtime_{i}"},
+        {"entity_id": f"sensor.wash_{i}", "type": "appliance", "time_entity": f"sensor.wtime_{i}",
+         "program_entity": f"sensor.wprog_{i}"},
+    ]
+    w = dict(kinds[i % len(kinds)])
+    w.update(pos)
+    w["label"] = f"Widget {i}"
+    return w
+
+
+def make_profile(form: str, n_widgets: int) -> Dict[str, Any]:
+    # A second top-level key keeps the builder from unwrapping {"ui": {...}} as a
+    # single-key wrapper, which would drop ui.pages
+    name = f"bench-{form}-{n_widgets}"
+    grid = {"columns": 12, "widget_dimensions": [120, 120], "widget_margins": [5, 5]}
+    if form == "widgets":
+        return {"name": name, "ui": {"grid": grid, "widgets": [_widget(i) for i in range(n_widgets)]}}
+    if form == "layout":
+        domains = ["light", "switch", "sensor", "scene", "script", "input_boolean"]
+        rows: List[str] = []
+        row: List[str] = []
+        for i in range(n_widgets):
+            item = f"{domains[i % len(domains)]}.layout_{i}"
+            if i % 7 == 0:
+                item += "(2x1)"
+            row.append(item)
+            if len(row) == 6:
+                rows.append(", ".join(row))
+                row = []
+        if row:
+            rows.append(", ".join(row))
+        return {"name": name, "dashboard": {"columns": 12, "layout": rows, "widget_dimensions": [120, 120]}}
+    if form == "pages":
+        pages = []
+        for start in range(0, n_widgets, _WIDGETS_PER_PAGE):
+            pages.append({
+                "title": f"Page {len(pages) + 1}",
+                "widgets": [_widget(i) for i in range(start, min(n_widgets, start + _WIDGETS_PER_PAGE))],
+            })
+        return {"name": name, "ui": {"grid": grid, "widgets": [], "pages": pages}}
+    raise ValueError(f"unknown form {form!r}")
+
+
+# ---------- stubs ----------
+
+class MemoryPublisher:
+    """Stands in for homeassistant.components.mqtt: records publishes in memory."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.bytes = 0
+
+    async def async_publish(self, hass, topic, payload, qos=0, retain=False) -> None:
+        self.count += 1
+        self.bytes += len(payload) if payload else 0
+
+
+def _stub_bridge(devices: List[Dict[str, Any]], profiles: Dict[str, Any]):
+    cfg = {CONF_DEVICES: devices, CONF_PROFILES: profiles, CONF_COMPILE_MODE: COMPILE_MODE_INLINE}
+
+    async def _executor(func, *args):
+        return func(*args)
+
+    hass = SimpleNamespace(
+        data={},
+        async_add_executor_job=_executor,
+        config=SimpleNamespace(path=lambda *p: os.path.join("/tmp", *p)),
+    )
+    entry = SimpleNamespace(entry_id="bench", data={}, options=cfg)
+    bridge = mqtt_bridge.MqttBridge(hass, entry)
+    # Keep the real StorageHelper but drop its Store so nothing touches disk
+    bridge._storage_helper._store = None
+    return bridge
+
+
+# ---------- measurement ----------
+
+def _timed(fn, *args) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def run_scenario(form: str, n_widgets: int, n_devices: int, repeat: int) -> Dict[str, Any]:
+    profiles = {f"bench{d}": make_profile(form, n_widgets) for d in range(n_devices)}
+    devices = [{"device_id": f"bench{d}", "profile": f"bench{d}"} for d in range(n_devices)]
+    bridge = _stub_bridge(devices, profiles)
+
+    best: Dict[str, float] = {}
+
+    def _keep(name: str, value: float) -> None:
+        best[name] = min(best.get(name, value), value)
+
+    for _ in range(repeat):
+        _, ms = _timed(_extract_entities_from_profiles, profiles)
+        _keep("extract_entities_ms", ms)
+
+        t0 = time.perf_counter()
+        docs = [bridge._build_config_for_device(dev) for dev in devices]
+        _keep("build_ms", (time.perf_counter() - t0) * 1000.0)
+        t0 = time.perf_counter()
+        payloads = [encode_config(doc) for doc in docs]
+        _keep("encode_ms", (time.perf_counter() - t0) * 1000.0)
+        del docs
+
+        # Separate pass: tracemalloc slows allocation-heavy code, so it must not
+        # skew the timings above
+        tracemalloc.start()
+        traced = [encode_config(bridge._build_config_for_device(dev)) for dev in devices]
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _keep("alloc_peak_bytes", float(peak))
+        _keep("alloc_net_bytes", float(current))
+        del traced
+
+        publisher = MemoryPublisher()
+        saved = mqtt_bridge.mqtt
+        mqtt_bridge.mqtt = publisher
+        try:
+            bridge._config_state.clear()
+            t0 = time.perf_counter()
+            asyncio.run(bridge.async_publish_all_configs())
+            _keep("publish_all_ms", (time.perf_counter() - t0) * 1000.0)
+        finally:
+            mqtt_bridge.mqtt = saved
+
+    sizes = [len(p) for p in payloads]
+    return {
+        "form": form,
+        "widgets": n_widgets,
+        "devices": n_devices,
+        **{k: round(v, 3) for k, v in best.items()},
+        "payload_bytes_total": sum(sizes),
+        "payload_bytes_max": max(sizes) if sizes else 0,
+        "publishes": publisher.count,
+        "published_bytes": publisher.bytes,
+    }
+
+
+def _compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as fh:
+        base = json.load(fh)
+    by_key = {(r["form"], r["widgets"], r["devices"]): r for r in base.get("results", [])}
+    metrics = ("build_ms", "encode_ms", "publish_all_ms", "payload_bytes_total", "alloc_peak_bytes")
+    print(f"\nvs baseline {baseline_path} (version {base.get('version')}):")
+    for r in results:
+        old = by_key.get((r["form"], r["widgets"], r["devices"]))
+        if not old:
+            continue
+        parts = []
+        for m in metrics:
+            if old.get(m):
+                parts.append(f"{m} {100.0 * (r[m] - old[m]) / old[m]:+.1f}%")
+        print(f"  {r['form']:8s} w={r['widgets']:<4d} d={r['devices']:<4d} " + "  ".join(parts))
+
+
+def _ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--widgets", type=_ints, default=DEFAULT_WIDGETS, help="comma-separated widget counts")
+    parser.add_argument("--devices", type=_ints, default=DEFAULT_DEVICES, help="comma-separated device counts")
+    parser.add_argument("--forms", default=",".join(FORMS), help="comma-separated profile forms")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; best is kept")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results path")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "custom_components", "ha_mqtt_dash", "manifest.json"), encoding="utf-8") as fh:
+        version = json.load(fh).get("version")
+
+    results = []
+    for form in [f.strip() for f in args.forms.split(",") if f.strip()]:
+        for n_widgets in args.widgets:
+            for n_devices in args.devices:
+                r = run_scenario(form, n_widgets, n_devices, max(1, args.repeat))
+                results.append(r)
+                print(
+                    f"{form:8s} w={n_widgets:<4d} d={n_devices:<4d} build={r['build_ms']:9.2f}ms "
+                    f"encode={r['encode_ms']:8.2f}ms publish={r['publish_all_ms']:9.2f}ms "
+                    f"bytes={r['payload_bytes_total']:<10d} peak={r['alloc_peak_bytes'] / 1024:9.1f}KiB"
+                )
+
+    report = {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nwrote {len(results)} scenario(s) to {args.out}")
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@ from homeassistant.core import HomeAssistant  # type: ignore
 from homeassistant.config_entries import ConfigEntry  # type: ignore
 from .const import DOMAIN, CONF_API_ENABLED, CONF_API_UNTIL_KEY
 import json
-from .storage import StorageHelper
+from .storage import drop_storage_helper
+from .store_archive import archive_path
 import voluptuous as vol  # type: ignore
 import homeassistant.helpers.config_validation as cv  # type: ignore
 from homeassistant.helpers.device_registry import async_get as async_get_dev_reg  # type: ignore
@@ -81,7 +82,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # admin/services
     async def _svc_push_config(call):
         _LOGGER.debug("svc:push_config")
-        await bridge.async_publish_all_configs()
+        await bridge.async_push_config()
 
     async def _svc_reload_config(call):
         _LOGGER.debug("svc:reload_config")
@@ -108,9 +109,9 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         await bridge.async_prune_unassigned()
 
     async def _svc_dump_state(call):
-        cfg = {**(entry.data or {}), **(entry.options or {})}
-        devs = cfg.get("devices", []) or []
-        profs = cfg.get("profiles", {}) or {}
+        # Options hold only the device directory and maybe the profile index; the runtime snapshot has the Store copies
+        devs = bridge.cfg.devices
+        profs = bridge.cfg.profiles
         _LOGGER.debug(
             "svc:dump_state devices=%d profiles=%d ids=%s profile_keys=%s",
             len(devs), len(profs), [d.get("device_id") for d in devs if d.get("device_id")], list(profs.keys()),
@@ -136,6 +137,35 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         await bridge.async_dump_store(publish=publish, topic=topic)
     hass.services.async_register(DOMAIN, "dump_store", _svc_dump_store)
 
+    async def _svc_export_store(call):
+        name = call.data.get("path") or "ha_mqtt_dash_store.jsonl.gz"
+        try:
+            path = archive_path(hass.config.path(), name)
+        except ValueError as err:
+            _LOGGER.warning("svc:export_store %s", err)
+            return
+        _LOGGER.debug("svc:export_store path=%s", path)
+        await bridge.async_export_store(path)
+    hass.services.async_register(DOMAIN, "export_store", _svc_export_store)
+
+    async def _svc_import_store(call):
+        name = call.data.get("path")
+        if not isinstance(name, str) or not name:
+            _LOGGER.warning("svc:import_store missing path")
+            return
+        try:
+            path = archive_path(hass.config.path(), name)
+        except ValueError as err:
+            _LOGGER.warning("svc:import_store %s", err)
+            return
+        replace = bool(call.data.get("replace", False))
+        _LOGGER.debug("svc:import_store path=%s replace=%s", path, replace)
+        try:
+            await bridge.async_import_store(path, replace=replace)
+        except (OSError, ValueError) as err:
+            _LOGGER.warning("svc:import_store failed for %s: %s", path, err)
+    hass.services.async_register(DOMAIN, "import_store", _svc_import_store)
+
     async def _svc_dump_runtime_cfg(call):
         publish = bool(call.data.get("publish", False)) if hasattr(call, "data") else False
         topic = call.data.get("topic") if hasattr(call, "data") else None
@@ -169,21 +199,62 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         if not isinstance(profile, dict):
             _LOGGER.warning("svc:set_device_profile expects dict JSON for %s", dev_id)
             return
-        # Persist into HA Store (canonical), which also mirrors to options
-        try:
-            helper = StorageHelper(hass, entry)
-            await helper.async_init()
-            profs = dict(helper.storage.get("profiles") or {})
-            profs[dev_id] = profile
-            await helper.persist_profiles(profs)
-            _LOGGER.debug("svc:set_device_profile persisted to Store for %s (keys=%s)", dev_id, list(profs.keys()))
-        except Exception:
-            _LOGGER.exception("svc:set_device_profile: failed to persist Store for %s", dev_id)
-        # Schedule republish+reload so device sees changes quickly
-        bridge.schedule_republish_reload("set_device_profile")
+        _LOGGER.debug("svc:set_device_profile device_id=%s", dev_id)
+        await bridge.async_set_device_profile(dev_id, profile)
 
     hass.services.async_register(DOMAIN, "set_device_profile", _svc_set_device_profile)
 
+    async def _svc_rollback_profile(call):
+        profile = call.data.get("profile")
+        if not isinstance(profile, str) or not profile:
+            _LOGGER.warning("svc:rollback_profile missing profile")
+            return
+        try:
+            steps = int(call.data.get("steps", 1))
+        except (TypeError, ValueError):
+            _LOGGER.warning("svc:rollback_profile invalid steps for %s", profile)
+            return
+        _LOGGER.debug("svc:rollback_profile profile=%s steps=%d", profile, steps)
+        await bridge.async_rollback_profile(profile, steps)
+    hass.services.async_register(DOMAIN, "rollback_profile", _svc_rollback_profile)
+
+    async def _svc_set_group(call):
+        group = call.data.get("group")
+        profile = call.data.get("profile")
+        if not isinstance(group, str) or not group.strip():
+            _LOGGER.warning("svc:set_group missing group")
+            return
+        _LOGGER.debug("svc:set_group group=%s profile=%s", group, profile)
+        await bridge.async_set_group(group, profile if isinstance(profile, str) else None)
+    hass.services.async_register(DOMAIN, "set_group", _svc_set_group)
+
+    async def _svc_set_device_group(call):
+        dev_id = call.data.get("device_id")
+        group = call.data.get("group")
+        overlay = call.data.get("overlay")
+        if not isinstance(dev_id, str) or not dev_id:
+            _LOGGER.warning("svc:set_device_group missing device_id")
+            return
+        if isinstance(overlay, str):
+            try:
+                overlay = json.loads(overlay) if overlay.strip() else None
+            except Exception:
+                _LOGGER.warning("svc:set_device_group invalid overlay JSON for %s", dev_id)
+                return
+        if overlay is not None and not isinstance(overlay, dict):
+            _LOGGER.warning("svc:set_device_group expects overlay as a JSON object for %s", dev_id)
+            return
+        _LOGGER.debug("svc:set_device_group device_id=%s group=%s", dev_id, group)
+        await bridge.async_set_device_group(dev_id, group if isinstance(group, str) else None, overlay)
+    hass.services.async_register(DOMAIN, "set_device_group", _svc_set_device_group)
+
+    async def _svc_broadcast_action(call):
+        action = call.data.get("action")
+        group = call.data.get("group")
+        _LOGGER.debug("svc:broadcast_action action=%s group=%s", action, group)
+        await bridge.async_broadcast_action(action if isinstance(action, str) else "", group if isinstance(group, str) else None)
+    hass.services.async_register(DOMAIN, "broadcast_action", _svc_broadcast_action)
+
     # Schema for notify service (domain: ha_mqtt_dash, service: notify)
     _NOTIFY_SCHEMA = vol.Schema({
         vol.Optional("device_id"): cv.string,  # direct mqttdash device id
@@ -223,6 +294,11 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    # The Store helper outlives entry reloads; forget it once the entry is gone
+    drop_storage_helper(hass, entry)
+
+
 async def async_remove_config_entry_device(hass: HomeAssistant, entry: ConfigEntry, device) -> bool:
     """Support HA 'Delete device' from the device page.
 
@@ -240,25 +316,8 @@ async def async_remove_config_entry_device(hass: HomeAssistant, entry: ConfigEnt
         bridge: MqttBridge | None = hass.data.get(DOMAIN, {}).get(entry.entry_id)
         if not bridge:
             return False
-        # Best-effort capture GUID from options/devices
-        try:
-            opts = dict(entry.options or {})
-            devs = list(opts.get("devices", []) or [])
-            guid = None
-            for d in devs:
-                if d.get("device_id") == dev_id:
-                    guid = d.get("guid")
-                    break
-            # Persist a purged marker to HA Store to prevent auto-recreation on hello
-            try:
-                helper = StorageHelper(hass, entry)
-                await helper.async_init()
-                await helper.add_purged(device_id=dev_id, guid=(guid if isinstance(guid, str) else None))
-            except Exception:
-                _LOGGER.debug("async_remove_config_entry_device: could not persist purged marker", exc_info=True)
-        except Exception:
-            _LOGGER.debug("async_remove_config_entry_device: failed while extracting guid", exc_info=True)
-        await bridge.async_purge_device(dev_id)
+        # Purged markers (device_id and GUID) keep a later hello from recreating it
+        await bridge.async_remove_device(dev_id)
         return True
     except Exception:
         _LOGGER.exception("async_remove_config_entry_device failed")
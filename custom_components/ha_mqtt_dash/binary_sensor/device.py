@@ -1,6 +1,6 @@
 from __future__ import annotations
 from ..const import DOMAIN, CONF_DEVICES
-from ..entities.binary_sensors import ChargingBinarySensor, OnlineBinarySensor
+from ..entities.binary_sensors import ChargingBinarySensor, ConfigConvergedBinarySensor, OnlineBinarySensor
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
@@ -13,4 +13,5 @@ async def async_setup_entry(hass, entry, async_add_entities):
             continue
         ents.append(ChargingBinarySensor(hass, entry, dev_id))
         ents.append(OnlineBinarySensor(hass, entry, dev_id))
+        ents.append(ConfigConvergedBinarySensor(hass, entry, dev_id))
     async_add_entities(ents, update_before_add=False)
@@ -0,0 +1,243 @@
+"""Single-writer command queue for bridge mutations.
+
+Hello handling, options updates, republish timers, settings writes and
+service calls all change the device list, the Store and entry options. Rather
+than each path reloading the Store and republishing on its own, they are
+queued here and run one at a time on a single task. Whatever is queued when
+the worker wakes up is one batch. The Store is refreshed at most once before
+a batch, and configs are republished at most once after it.
+
+Calls made from inside a running command (e.g. a service that purges several
+devices) run inline instead of being queued, so commands can call each other
+without deadlocking.
+
+Stopping lets the batch in flight finish (up to ``STOP_TIMEOUT``) and cancels
+whatever is still queued, so no caller is left waiting on a command that will
+never run.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant  # type: ignore
+
+_LOGGER = logging.getLogger(__name__)
+
+# Republish levels, ordered so the strongest request in a batch wins
+REPUBLISH_NONE = 0
+REPUBLISH_PUBLISH = 1
+REPUBLISH_RELOAD = 2
+
+# Seconds async_stop waits for the batch in flight before cancelling it
+STOP_TIMEOUT = 10.0
+
+
+class _Command:
+    __slots__ = ("name", "func", "refresh", "republish", "future")
+
+    def __init__(self, name: str, func: Optional[Callable[[], Awaitable[Any]]], refresh: bool, republish: int, future: asyncio.Future) -> None:
+        self.name = name
+        self.func = func
+        self.refresh = refresh
+        self.republish = republish
+        self.future = future
+
+
+class CommandQueue:
+    """Serialize and batch mutations; see module docstring."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        *,
+        before_batch: Callable[[], Awaitable[None]],
+        after_batch: Callable[[int], Awaitable[None]],
+    ) -> None:
+        self.hass = hass
+        self._before_batch = before_batch
+        self._after_batch = after_batch
+        self._queue: "asyncio.Queue[_Command]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # Task currently applying a batch (the worker, or a caller while the worker is stopped)
+        self._owner: Optional[asyncio.Task] = None
+        # Republish level requested by commands of the batch being applied
+        self._batch_republish = REPUBLISH_NONE
+        # Set by async_stop: no new posts; a worker stopped from inside a command skips the rest of its batch
+        self._stopping = False
+        self._halted = False
+        # Counters for diagnostics: batches run, commands applied, Store refreshes and republishes
+        self.stats = {"batches": 0, "commands": 0, "refreshes": 0, "republishes": 0}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = self._halted = False
+            self._task = self.hass.async_create_background_task(self._run(), "ha_mqtt_dash command queue")
+
+    async def async_stop(self) -> None:
+        """Stop accepting commands, let the batch in flight finish and cancel the queued ones."""
+        task, self._task = self._task, None
+        self._stopping = True
+        if task is asyncio.current_task():
+            # Stopped from inside a command (e.g. an entry reload it triggered): never cancel ourselves.
+            # The worker exits once the current command returns; the rest of its batch is cancelled
+            self._halted = True
+        elif task is not None and self._owner is not task:
+            # Idle worker: nothing in flight
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        elif task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                _LOGGER.warning("command_queue: batch still running after %.0fs, cancelling it", STOP_TIMEOUT)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._cancel_queued()
+
+    def _cancel_queued(self) -> None:
+        while not self._queue.empty():
+            cmd = self._queue.get_nowait()
+            if not cmd.future.done():
+                cmd.future.cancel()
+
+    def in_worker(self) -> bool:
+        return self._owner is not None and asyncio.current_task() is self._owner
+
+    async def submit(
+        self,
+        name: str,
+        func: Optional[Callable[[], Awaitable[Any]]] = None,
+        *,
+        refresh: bool = False,
+        republish: int = REPUBLISH_NONE,
+    ) -> Any:
+        """Queue a command and wait until its batch (including the batch republish) has finished.
+
+        Runs inline when called from inside a command, and as a batch of its own
+        in the caller's task when the worker is not running (before setup, after unload).
+        """
+        if self.in_worker():
+            self.request_republish(republish)
+            return await func() if func is not None else None
+        if self._task is None:
+            fut = self._new_future()
+            await self._apply([_Command(name, func, refresh, republish, fut)])
+            return await fut
+        return await self.post(name, func, refresh=refresh, republish=republish)
+
+    def post(
+        self,
+        name: str,
+        func: Optional[Callable[[], Awaitable[Any]]] = None,
+        *,
+        refresh: bool = False,
+        republish: int = REPUBLISH_NONE,
+    ) -> asyncio.Future:
+        """Queue a command without waiting for it (cancelled right away once the queue is stopped)."""
+        fut = self._new_future()
+        if self._stopping:
+            fut.cancel()
+            return fut
+        self._queue.put_nowait(_Command(name, func, refresh, republish, fut))
+        return fut
+
+    @staticmethod
+    def _new_future() -> asyncio.Future:
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        # Failures are logged when applied; don't warn again for fire-and-forget posts
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return fut
+
+    def request_republish(self, level: int = REPUBLISH_PUBLISH) -> None:
+        """Ask for a republish once the current batch is done (queues one if no batch is running)."""
+        if level <= REPUBLISH_NONE:
+            return
+        if self.in_worker():
+            self._batch_republish = max(self._batch_republish, level)
+        elif self._task is not None:
+            self.post("republish", republish=level)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            batch: List[_Command] = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._apply(batch)
+        self._halted = False
+        self._cancel_queued()
+
+    async def _apply(self, batch: List[_Command]) -> None:
+        self._owner = asyncio.current_task()
+        try:
+            await self._apply_batch(batch)
+        finally:
+            self._owner = None
+
+    async def _apply_batch(self, batch: List[_Command]) -> None:
+        self.stats["batches"] += 1
+        self._batch_republish = max(c.republish for c in batch)
+        _LOGGER.debug(
+            "command_queue: batch of %d (%s)", len(batch), ", ".join(c.name for c in batch),
+        )
+        try:
+            await self._apply_commands(batch)
+        finally:
+            # Cancelled mid-batch (stop timed out) or halted by a stop from inside a command:
+            # never leave a submitter waiting on a command that won't run
+            for cmd in batch:
+                if not cmd.future.done():
+                    cmd.future.cancel()
+
+    async def _apply_commands(self, batch: List[_Command]) -> None:
+        if any(c.refresh for c in batch):
+            self.stats["refreshes"] += 1
+            try:
+                await self._before_batch()
+            except Exception:
+                _LOGGER.exception("command_queue: state refresh failed")
+        results: List[Tuple[_Command, Any, Optional[BaseException]]] = []
+        for cmd in batch:
+            if cmd.future.cancelled() or self._halted:
+                continue
+            self.stats["commands"] += 1
+            try:
+                res = await cmd.func() if cmd.func is not None else None
+                results.append((cmd, res, None))
+            except Exception as err:  # surfaced to the submitter
+                _LOGGER.exception("command_queue: %s failed", cmd.name)
+                results.append((cmd, None, err))
+        level, self._batch_republish = self._batch_republish, REPUBLISH_NONE
+        if level > REPUBLISH_NONE and not self._halted:
+            self.stats["republishes"] += 1
+            try:
+                await self._after_batch(level)
+            except Exception:
+                _LOGGER.exception("command_queue: republish failed")
+        for cmd, res, err in results:
+            if cmd.future.done():
+                continue
+            if err is not None:
+                cmd.future.set_exception(err)
+            else:
+                cmd.future.set_result(res)
+
+
+def serialized(*, refresh: bool = False, republish: int = REPUBLISH_NONE) -> Callable:
+    """Run a bridge coroutine method through the bridge's ``_commands`` queue."""
+
+    def deco(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            return await self._commands.submit(
+                func.__name__,
+                functools.partial(func, self, *args, **kwargs),
+                refresh=refresh,
+                republish=republish,
+            )
+
+        return wrapper
+
+    return deco
@@ -0,0 +1,1203 @@
+"""Pure config compilation for mqttdash devices.
+
+Everything in this module works on plain dicts and returns plain dicts or bytes.
+Nothing here touches ``hass`` or the MQTT client, so the build-and-encode work
+can run on the event loop, in HA's thread executor, or in a worker process.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import zlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .const import (
+    CAP_BROADCAST,
+    CAP_CHUNKED,
+    CAP_DELTA,
+    CAP_FRAMES,
+    CAP_GROUPS,
+    CAP_PAGES,
+    CAP_STYLES,
+    CAP_ZLIB,
+    FIXED_BROADCAST_TOPIC,
+    FIXED_COMMAND_BASE,
+    FIXED_CONFIG_BASE,
+    FIXED_DEVICE_BASE,
+    FIXED_GROUP_BASE,
+    FIXED_STATESTREAM_BASE,
+)
+from .frames import apply_frames
+from .json_delta import make_patch, merge_patch
+
+_LOGGER = logging.getLogger(__name__)
+
+# Max compressed bytes per retained chunk topic (stays well under common broker packet limits)
+CONFIG_CHUNK_BYTES = 32 * 1024
+
+# Every encoded config starts with this; _stamp_rev swaps in the real revision
+_REV_PLACEHOLDER = b'{"rev":0,'
+
+# Bump whenever normalize_profile output changes; stored artifacts from older versions are recompiled
+COMPILER_VERSION = 2
+
+# Config schema for styles-capable clients: repeated widget formats live in a top-level "styles" table
+STYLES_SCHEMA_VERSION = 2
+
+_WIDGET_ENTITY_FIELDS = (
+    "entity_id", "entity", "eid",
+    # Printer widget
+    "nozzle_entity", "bed_entity", "progress_entity", "status_entity",
+    # Sous vide widget
+    "temp_entity", "target_entity",
+    # Appliance / printer / sous vide shared
+    "time_entity",
+    # Generic program name sensor
+    "program_entity",
+)
+
+
+def widget_entities(w: Any) -> Set[str]:
+    """Lower-cased entity IDs a single widget dict references (entity fields and camera overlay)."""
+    found: Set[str] = set()
+    if not isinstance(w, dict):
+        return found
+    for field in _WIDGET_ENTITY_FIELDS:
+        v = w.get(field)
+        if isinstance(v, str) and "." in v:
+            found.add(v.strip().lower())
+    # Camera overlay button entity
+    ob = w.get("overlay_button")
+    if isinstance(ob, dict):
+        v = ob.get("entity_id")
+        if isinstance(v, str) and "." in v:
+            found.add(v.strip().lower())
+    return found
+
+
+def _extract_entities_from_profiles(profiles: Dict[str, Any]) -> List[str]:
+    """Return sorted unique entity IDs referenced across all profile widget and layout definitions."""
+    entities: set = set()
+
+    def _scan_widget(w: dict) -> None:
+        """Extract all entity IDs from a single widget dict."""
+        entities.update(widget_entities(w))
+
+    def _collect_widgets(src: dict) -> None:
+        """Recursively collect widgets from a profile/ui/page dict."""
+        if not isinstance(src, dict):
+            return
+        # Flat widgets list
+        if isinstance(src.get("widgets"), list):
+            for w in src["widgets"]:
+                _scan_widget(w)
+        # Pages array — each page may have its own widgets list
+        if isinstance(src.get("pages"), list):
+            for page in src["pages"]:
+                if isinstance(page, dict):
+                    _collect_widgets(page)
+        # Layout shorthand: ["light.kitchen", "sensor.temp(2x1)", ...]
+        if isinstance(src.get("layout"), list):
+            for row in src["layout"]:
+                items = row if isinstance(row, list) else ([row] if isinstance(row, str) else [])
+                for item in items:
+                    if isinstance(item, str):
+                        ent = item.split("(")[0].strip().lower()
+                        if "." in ent and ent not in ("spacer",):
+                            entities.add(ent)
+
+    for prof in (profiles or {}).values():
+        if not isinstance(prof, dict):
+            continue
+        # Unwrap single-key wrapper (e.g. {"main_panel": {...}})
+        if len(prof) == 1:
+            only = next(iter(prof.values()))
+            if isinstance(only, dict) and any(k in only for k in ("widgets", "ui", "pages", "layout", "dashboard")):
+                prof = only
+        # Scan top-level and ui/dashboard sub-dicts
+        _collect_widgets(prof)
+        for key in ("ui", "dashboard"):
+            sub = prof.get(key)
+            if isinstance(sub, dict):
+                _collect_widgets(sub)
+
+    return sorted(entities)
+
+
+def resolve_profile_key(
+    dev: Dict[str, Any],
+    profiles: Dict[str, Any],
+    groups: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Optional[str]:
+    """Key of the profile a device renders, or None when it gets the unassigned placeholder.
+
+    Order: the group's profile (when ``groups`` is given and the device is in a
+    known group), the profile keyed by device_id, the device's ``profile`` name,
+    the only profile when there is exactly one, then ``default``.
+    """
+    profiles = profiles or {}
+    group = dev.get("group") or ""
+    gdef = (groups or {}).get(group) if group else None
+    if isinstance(gdef, dict):
+        gkey = gdef.get("profile") or group
+        return gkey if profiles.get(gkey) else None
+    device_id = dev.get("device_id") or ""
+    if profiles.get(device_id):
+        return device_id
+    profile_name = dev.get("profile") or ""
+    if profile_name and profiles.get(profile_name):
+        return profile_name
+    # Harden: if no profile assigned but exactly one profile exists, auto-assign it
+    if len(profiles) == 1:
+        only_name = next(iter(profiles))
+        if profiles.get(only_name):
+            return only_name
+    # Or use a profile named "default" if present
+    if profiles.get("default"):
+        return "default"
+    return None
+
+
+def build_config_for_device(
+    dev: Dict[str, Any],
+    profiles: Dict[str, Any],
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Build the retained config document for one device record from the profiles dict.
+
+    ``artifacts`` maps profile keys to precompiled profile artifacts known to
+    match the profiles (see ``usable_artifacts``); those skip normalization.
+    """
+    device_id = dev.get("device_id") or ""
+    profiles = profiles or {}
+    key = resolve_profile_key(dev, profiles)
+    prof = profiles.get(key) if key is not None else None
+    try:
+        _LOGGER.debug(
+            "build_config: device=%s profile_key=%s found=%s", device_id, key, bool(prof)
+        )
+    except Exception:
+        pass
+    base_dev = FIXED_DEVICE_BASE
+
+    if not prof:
+        _LOGGER.debug("build_config: no profile -> publishing unassigned placeholder for %s", device_id)
+        return {
+            "device_id": device_id,
+            # Device settings are not part of profile config anymore; app receives only UI + topics
+            "ui": { "widgets": [], "banner": f"unassigned: set profile in HA for {device_id}" },
+            "topics": {
+                "settings": f"{base_dev}/{device_id}/settings",
+                "hello":    f"{base_dev}/{device_id}/hello",
+                "status":   f"{base_dev}/{device_id}/status",
+            },
+        }
+
+    compiled = None
+    if artifacts is not None and key is not None:
+        art = artifacts.get(key)
+        if isinstance(art, dict) and art.get("compiler") == COMPILER_VERSION:
+            compiled = art
+    if compiled is None:
+        compiled = normalize_profile(prof, device_id)
+    ui = compiled["ui"]
+
+    # Topics (settings/hello/status)
+    topics = dict(compiled.get("topics") or {})
+    topics.setdefault("settings", f"{base_dev}/{device_id}/settings")
+    topics.setdefault("hello",    f"{base_dev}/{device_id}/hello")
+    topics.setdefault("status",   f"{base_dev}/{device_id}/status")
+
+    # Device settings are moved to HA entities; config now contains only UI and topics
+    device = {}
+    # Attach last-known screen info if present on the device record (helps client layout decisions)
+    if isinstance(dev.get("screen"), dict):
+        device.setdefault("screen", dev.get("screen"))
+
+    # Compose final document
+    doc: Dict[str, Any] = {
+        "version": 1,
+        "device_id": device_id,
+        # Device bucket may include screen info. keep_awake/brightness/orientation are controlled via HA entities
+        "device": device or {},
+        "ui": ui,
+        "topics": topics,
+    }
+
+    try:
+        _LOGGER.debug(
+            "build_config: device=%s norm_widgets=%d base_dev=%s base_cmd=%s base_stream=%s",
+            device_id, len(ui.get("widgets", [])),
+            base_dev,
+            FIXED_COMMAND_BASE,
+            FIXED_STATESTREAM_BASE,
+        )
+    except Exception:
+        pass
+    return doc
+
+def normalize_profile(prof: Dict[str, Any], label: str = "") -> Dict[str, Any]:
+    """Device-independent part of a config: ``{"ui": normalized ui, "topics": profile topics}``.
+
+    This is the expensive step of ``build_config_for_device``; its output is what
+    profile artifacts store (see ``build_profile_artifact``). ``label`` only
+    appears in debug logs.
+    """
+    device_id = label
+    # Normalize profile -> app config schema expected by iOS client
+    # App expects: { device_id, device:{...}, ui:{ widgets:[], grid?, ... }, topics:{...} }
+    raw = dict(prof)
+    # If profile is wrapped in a single top-level key (e.g., {"main_panel": {...}}), unwrap it
+    try:
+        if isinstance(raw, dict) and len(raw.keys()) == 1:
+            only_key = next(iter(raw.keys()))
+            inner = raw.get(only_key)
+            # Heuristic: if inner looks like a profile body, unwrap
+            if isinstance(inner, dict) and ("widgets" in inner or "ui" in inner or "grid" in inner or "dashboard" in inner):
+                _LOGGER.debug("build_config: unwrapping single-key profile '%s' for device=%s", only_key, device_id)
+                raw = dict(inner)
+    except Exception:
+        pass
+
+    # Build UI bucket and move widgets/grid-like keys under ui
+    ui: Dict[str, Any] = {}
+    if isinstance(raw.get("ui"), dict):
+        ui = dict(raw.get("ui") or {})
+    # Move known layout keys from top-level if present
+    for k in ("grid", "rowHeight", "gutter", "padding", "cols", "rows"):
+        if k in raw and k not in ui:
+            ui[k] = raw.pop(k)
+    # Widgets can be top-level or inside ui; normalize to ui.widgets
+    widgets = None
+    if isinstance(raw.get("widgets"), list):
+        widgets = list(raw.get("widgets") or [])
+    elif isinstance(ui.get("widgets"), list):
+        widgets = list(ui.get("widgets") or [])
+    else:
+        widgets = []
+    try:
+        _LOGGER.debug("build_config: device=%s initial_widgets=%d (pre-layout)", device_id, len(widgets or []))
+    except Exception:
+        pass
+
+    # HADashboard-like layout support (starter):
+    # If profile defines grid columns and a layout array of rows with entries like
+    #   "light.kitchen", "sensor.temp", "light.living(2x1)", "spacer", ""
+    # we translate them into concrete widget defs with x,y,w,h and topics.
+    try:
+        dash = raw.get("dashboard") if isinstance(raw.get("dashboard"), dict) else raw
+        cols = None
+        layout = None
+        dash_src = dash if isinstance(dash, dict) else {}
+        if isinstance(dash_src, dict):
+            cols = dash_src.get("columns") or dash_src.get("cols") or ui.get("columns")
+            layout = dash_src.get("layout") or ui.get("layout")
+        if isinstance(cols, int) and cols > 0 and isinstance(layout, list):
+            # Adopt widget_dimensions and margins if present
+            wd = dash_src.get("widget_dimensions") or ui.get("widget_dimensions") or [120, 120]
+            wm = dash_src.get("widget_margins") or ui.get("widget_margins") or [5, 5]
+            ws = dash_src.get("widget_size") or ui.get("widget_size") or [1, 1]
+            ui["grid"] = {
+                "columns": cols,
+                "widget_dimensions": wd,
+                "widget_margins": wm,
+                "widget_size": ws,
+            }
+            base_stream = FIXED_STATESTREAM_BASE
+            base_cmd = FIXED_COMMAND_BASE
+
+            def _parse_size(s: str):
+                # looks for "(WxH)"
+                if not isinstance(s, str):
+                    return (ws[0], ws[1])
+                i = s.find("(")
+                j = s.find(")", i+1) if i >= 0 else -1
+                if i >= 0 and j > i:
+                    try:
+                        inner = s[i+1:j]
+                        if "x" in inner:
+                            a, b = inner.split("x", 1)
+                            return (int(a), int(b))
+                    except Exception:
+                        return (ws[0], ws[1])
+                return (ws[0], ws[1])
+
+            def _strip_size(s: str):
+                if not isinstance(s, str):
+                    return s
+                i = s.find("(")
+                return s[:i].strip() if i > 0 else s.strip()
+
+            def _mk_widget(entity: str, x: int, y: int, w: int, h: int) -> Optional[Dict[str, Any]]:
+                if not entity:
+                    return None
+                ent = entity.strip()
+                if ent.lower() in ("spacer",):
+                    return None
+                if "." not in ent and ent.lower() not in ("clock", "weather"):
+                    # Skip unknown non-entity widgets for now
+                    return None
+                label = ent
+                cmd_topic = None
+                state_topic = None
+                wtype = "value"
+                dom = None
+                obj = None
+                if "." in ent:
+                    dom, obj = ent.split(".", 1)
+                    state_topic = f"{base_stream}/{dom}/{obj}/state"
+                    if dom == "light":
+                        wtype = "light"
+                        cmd_topic = f"{base_cmd}/{ent}"
+                    elif dom in ("switch", "input_boolean"):
+                        wtype = "switch"
+                        cmd_topic = f"{base_cmd}/{ent}"
+                    elif dom == "scene":
+                        wtype = "scene"
+                        cmd_topic = f"{base_cmd}/{ent}"
+                    elif dom in ("script", "button"):
+                        wtype = "button"
+                        cmd_topic = f"{base_cmd}/{ent}"
+                    else:
+                        wtype = "sensor"
+                else:
+                    # non-entity simple widgets placeholder -> sensor-like for now
+                    wtype = "sensor"
+                wdict = {
+                    "id": f"g:{x},{y}:{ent}",
+                    "type": wtype,
+                    "entity_id": ent if "." in ent else "",
+                    "state_topic": state_topic or "",
+                    "command_topic": cmd_topic or None,
+                    "label": label,
+                    "x": x, "y": y, "w": w, "h": h,
+                }
+                # Provide attr_topic for brightness on lights to support UI brightness controls
+                if dom == "light" and obj:
+                    wdict["attr_topic"] = f"{base_stream}/{dom}/{obj}/attributes/brightness"
+                return wdict
+
+            widgets_from_layout: List[Dict[str, Any]] = []
+            y = 0
+            for row in layout:
+                # each row can be a string with comma separated entries or an array
+                if isinstance(row, str):
+                    parts = [p.strip() for p in row.split(",")]
+                elif isinstance(row, list):
+                    parts = row
+                elif isinstance(row, dict) and "empty" in row:
+                    try:
+                        nraw = row.get("empty")
+                        nempty = int(nraw) if nraw is not None else 1
+                    except Exception:
+                        nempty = 1
+                    y += max(0, nempty)
+                    continue
+                else:
+                    y += 1
+                    continue
+
+                x = 0
+                for item in parts:
+                    if not item or item.lower() == "spacer":
+                        x += 1
+                        continue
+                    w_cells, h_cells = _parse_size(item)
+                    name = _strip_size(item)
+                    wdef = _mk_widget(name, x, y, w_cells, h_cells)
+                    if wdef:
+                        widgets_from_layout.append(wdef)
+                    x += max(1, int(w_cells))
+                y += 1
+
+            # Merge: explicit widgets (if any) first, then append layout-generated
+            widgets.extend(widgets_from_layout)
+    except Exception:
+        _LOGGER.exception("Failed to parse dashboard layout")
+
+    # At this point, widgets may contain raw profile-defined dicts. Profiles should NOT
+    # include MQTT topics; generate them here based on entity_id and type. Also accept
+    # user-friendly aliases for coordinates: row/col/rowspan/colspan.
+    norm_widgets: List[Dict[str, Any]] = []
+    base_stream = FIXED_STATESTREAM_BASE
+    base_cmd = FIXED_COMMAND_BASE
+
+    # Widget types that don't require an entity_id (use specialized entity fields instead)
+    _NO_ENTITY_TYPES = ("label", "clock", "timer", "camera", "webpage", "mealie", "printer")
+
+    def _coerce_int(v: Any, default: int) -> int:
+        try:
+            if isinstance(v, bool):
+                return default
+            return int(v)
+        except Exception:
+            return default
+
+    def _normalize_one(it: Any, idx: int) -> Optional[Dict[str, Any]]:
+        """Normalize one widget dict — generate MQTT topics from entity refs."""
+        if not isinstance(it, dict):
+            return None
+        wdef = dict(it)
+        ent = wdef.get("entity_id") or wdef.get("entity") or wdef.get("eid") or ""
+        if isinstance(ent, str):
+            ent = ent.strip()
+        else:
+            ent = ""
+        wtype = (wdef.get("type") or "").strip().lower() if isinstance(wdef.get("type"), str) else ""
+        if wtype == "spacer":
+            return None
+        if not ent and wtype not in _NO_ENTITY_TYPES:
+            return None
+
+        # Position aliases; negative positions are clamped to the grid edge (grid and frames do the same)
+        xi = max(0, _coerce_int(wdef.get("x", wdef.get("col")), 0))
+        yi = max(0, _coerce_int(wdef.get("y", wdef.get("row")), 0))
+        wi = max(1, _coerce_int(wdef.get("w", wdef.get("colspan")), 1))
+        hi = max(1, _coerce_int(wdef.get("h", wdef.get("rowspan")), 1))
+
+        dom = None
+        obj = None
+        if "." in ent:
+            try:
+                dom, obj = ent.split(".", 1)
+            except Exception:
+                pass
+        if not wtype:
+            if dom == "light": wtype = "light"
+            elif dom in ("switch", "input_boolean"): wtype = "switch"
+            elif dom == "scene": wtype = "scene"
+            elif dom in ("script", "button"): wtype = "button"
+            elif dom == "person": wtype = "person"
+            else: wtype = "sensor"
+
+        state_topic = f"{base_stream}/{dom}/{obj}/state" if dom and obj else ""
+        cmd_topic = None
+        if wtype in ("light", "switch", "button", "scene", "climate", "mediaplayer") and ent and "." in ent:
+            cmd_topic = f"{base_cmd}/{ent}"
+        # Local-only widgets have no MQTT state
+        if wtype in _NO_ENTITY_TYPES:
+            state_topic = ""
+
+        out: Dict[str, Any] = {
+            "id": wdef.get("id") or f"p:{idx}:{ent or wtype}",
+            "type": wtype,
+            "entity_id": ent,
+            "label": (wdef.get("label") or wdef.get("lbl") or ent or wtype),
+            "x": xi, "y": yi, "w": wi, "h": hi,
+            "state_topic": state_topic,
+        }
+        if cmd_topic:
+            out["command_topic"] = cmd_topic
+        p = wdef.get("protected")
+        if isinstance(p, (bool, int)):
+            out["protected"] = bool(p)
+        u = wdef.get("unit")
+        if isinstance(u, str) and u.strip():
+            out["unit"] = u.strip()
+        fmt = wdef.get("format")
+        if isinstance(fmt, dict) and fmt:
+            allowed = {
+                "align", "vAlign", "textSize", "textColor", "bgColor",
+                "onTextColor", "offTextColor", "onBgColor", "offBgColor",
+                "wrap", "maxLines",
+            }
+            sanitized = {k: v for k, v in fmt.items() if k in allowed and isinstance(v, (str, int, float))}
+            if sanitized:
+                out["format"] = sanitized
+
+        # Light: brightness attribute topic (skipped when dimmable is explicitly False)
+        if wtype == "light" and dom == "light" and obj:
+            _dimmable = wdef.get("dimmable")
+            if _dimmable is False:
+                out["dimmable"] = False
+            else:
+                out["attr_topic"] = f"{base_stream}/{dom}/{obj}/attributes/brightness"
+
+        # Label: text field
+        if wtype == "label":
+            txt = wdef.get("text")
+            if isinstance(txt, str):
+                out["text"] = txt
+
+        # Clock: time_pattern
+        if wtype == "clock":
+            pat = wdef.get("time_pattern")
+            if isinstance(pat, str) and pat.strip():
+                out["time_pattern"] = pat.strip()
+
+        # Timer: default_seconds, configurable
+        if wtype == "timer":
+            ds = wdef.get("default_seconds")
+            if isinstance(ds, (int, float)):
+                out["default_seconds"] = int(ds)
+            c = wdef.get("configurable")
+            if isinstance(c, bool):
+                out["configurable"] = c
+
+        # Climate: attr_base for temperatures, modes, state_formats
+        if wtype == "climate":
+            if dom and obj:
+                out["attr_base"] = f"{base_stream}/{dom}/{obj}/attributes"
+            modes = wdef.get("modes")
+            if isinstance(modes, list):
+                out["modes"] = modes
+            sf = wdef.get("state_formats")
+            if isinstance(sf, dict):
+                out["state_formats"] = sf
+
+        # Weather: attr_base, attrs, attr_units
+        if wtype == "weather" and dom == "weather" and obj:
+            out["attr_base"] = f"{base_stream}/{dom}/{obj}/attributes"
+            attrs = wdef.get("attrs")
+            if isinstance(attrs, list) and attrs:
+                out["attrs"] = [a for a in attrs if isinstance(a, str)]
+            attr_units = wdef.get("attr_units")
+            if isinstance(attr_units, dict) and attr_units:
+                out["attr_units"] = {k: v for k, v in attr_units.items() if isinstance(k, str) and isinstance(v, str)}
+
+        # Helper: entity field → statestream topic
+        def _ent_t(field: str, key: str) -> None:
+            e = wdef.get(field)
+            if isinstance(e, str) and "." in e:
+                ed, eo = e.split(".", 1)
+                out[key] = f"{base_stream}/{ed}/{eo}/state"
+
+        # Printer: per-sensor topics
+        if wtype == "printer":
+            _ent_t("nozzle_entity", "nozzle_topic")
+            _ent_t("bed_entity", "bed_topic")
+            _ent_t("time_entity", "time_topic")
+            _ent_t("progress_entity", "progress_topic")
+            _ent_t("status_entity", "status_topic")
+            pu = wdef.get("progress_unit")
+            if isinstance(pu, str):
+                out["progress_unit"] = pu
+            vr = wdef.get("visible_rows")
+            if isinstance(vr, list):
+                out["visible_rows"] = vr
+
+        # Sous vide: temp/target/time topics
+        if wtype == "sousvide":
+            _ent_t("temp_entity", "temp_topic")
+            _ent_t("target_entity", "target_topic")
+            _ent_t("time_entity", "time_topic")
+
+        # Appliance: time/program topics
+        if wtype == "appliance":
+            _ent_t("time_entity", "time_topic")
+            _ent_t("program_entity", "program_topic")
+
+        # Media player: inject per-attribute statestream topics
+        if wtype == "mediaplayer" and dom and obj:
+            attr_base = f"{base_stream}/{dom}/{obj}/attributes"
+            out["title_topic"]    = f"{attr_base}/media_title"
+            out["artist_topic"]   = f"{attr_base}/media_artist"
+            out["position_topic"] = f"{attr_base}/media_position"
+            out["duration_topic"] = f"{attr_base}/media_duration"
+
+        # Camera: stream_url, scale_mode, overlay_button with topics
+        if wtype == "camera":
+            su = wdef.get("stream_url")
+            if isinstance(su, str) and su.strip():
+                out["stream_url"] = su.strip()
+            sm = wdef.get("scale_mode")
+            if isinstance(sm, str):
+                out["scale_mode"] = sm
+            ob = wdef.get("overlay_button")
+            if isinstance(ob, dict):
+                ob_ent = ob.get("entity_id")
+                ob_out: Dict[str, Any] = {}
+                if isinstance(ob_ent, str) and "." in ob_ent:
+                    ob_d, ob_o = ob_ent.split(".", 1)
+                    ob_out["entity_id"] = ob_ent
+                    ob_out["state_topic"] = f"{base_stream}/{ob_d}/{ob_o}/state"
+                    ob_out["command_topic"] = f"{base_cmd}/{ob_ent}"
+                for k in ("label", "action"):
+                    v = ob.get(k)
+                    if isinstance(v, str):
+                        ob_out[k] = v
+                if ob_out:
+                    out["overlay"] = ob_out
+
+        # Webpage: stream_url / url
+        if wtype == "webpage":
+            su = wdef.get("stream_url") or wdef.get("url")
+            if isinstance(su, str) and su.strip():
+                out["stream_url"] = su.strip()
+
+        # Mealie: pass through widget-specific fields
+        if wtype == "mealie":
+            for field in ("mealie_url", "mealie_api_key", "visible_section"):
+                v = wdef.get(field)
+                if isinstance(v, str):
+                    out[field] = v
+
+        return out
+
+    for idx, it in enumerate(widgets or []):
+        nw = _normalize_one(it, idx)
+        if nw is not None:
+            norm_widgets.append(nw)
+
+    ui["widgets"] = norm_widgets
+
+    # Normalize pages widgets (multi-page profiles: ui.pages[*].widgets)
+    if isinstance(ui.get("pages"), list):
+        normed_pages = []
+        for page in ui["pages"]:
+            if not isinstance(page, dict):
+                normed_pages.append(page)
+                continue
+            page_norm = []
+            for pidx, pw in enumerate(list(page.get("widgets") or [])):
+                nw = _normalize_one(pw, pidx)
+                if nw is not None:
+                    page_norm.append(nw)
+            pg = dict(page)
+            pg["widgets"] = page_norm
+            normed_pages.append(pg)
+        ui["pages"] = normed_pages
+    try:
+        _LOGGER.debug("build_config: device=%s normalized_widgets=%d", device_id, len(norm_widgets))
+    except Exception:
+        pass
+
+    return {"ui": ui, "topics": dict(raw.get("topics") or {})}
+
+
+def profile_digest(prof: Any) -> Tuple[str, int]:
+    """(``profile_hash``, canonical JSON size in bytes) of a raw profile."""
+    raw = json.dumps(prof, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest(), len(raw)
+
+
+def profile_hash(prof: Any) -> str:
+    """sha256 of a raw profile's canonical JSON; ties an artifact to the profile it was compiled from."""
+    return profile_digest(prof)[0]
+
+
+def fleet_hash(hashes: Dict[str, str]) -> str:
+    """Merkle root over per-profile hashes (leaves sorted by profile key).
+
+    Changes whenever any profile is added, removed, renamed or edited, but only
+    needs the per-profile hashes, which are recomputed for changed profiles only.
+    """
+    level = [
+        hashlib.sha256(f"{key}\0{digest}".encode("utf-8")).digest()
+        for key, digest in sorted((hashes or {}).items())
+    ]
+    if not level:
+        return hashlib.sha256(b"").hexdigest()
+    while len(level) > 1:
+        nxt = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+
+def build_profile_artifact(key: str, prof: Dict[str, Any], digest: Optional[str] = None) -> Dict[str, Any]:
+    """Precompiled, device-independent form of one profile, as stored next to it in the Store.
+
+    ``{"compiler", "hash", "ui", "topics", "entities"}``: ``ui`` is the normalized
+    UI (widgets with topics, layout expanded, pages normalized), ``entities`` the
+    entity IDs it references.
+    """
+    compiled = normalize_profile(prof, f"profile:{key}")
+    return {
+        "compiler": COMPILER_VERSION,
+        "hash": digest or profile_hash(prof),
+        "ui": compiled["ui"],
+        "topics": compiled["topics"],
+        # From the normalized ui, so layout shorthand is already expanded into widgets
+        "entities": _extract_entities_from_profiles({key: compiled["ui"]}),
+    }
+
+
+def refresh_artifacts(
+    profiles: Dict[str, Any],
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+    hashes: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Return (artifacts for ``profiles``, keys that were (re)compiled).
+
+    Existing artifacts are kept when their compiler version and profile hash
+    still match; artifacts of removed profiles are dropped. ``hashes`` are
+    known-current ``profile_hash`` values, which saves rehashing those profiles.
+    """
+    artifacts = artifacts or {}
+    hashes = hashes or {}
+    out: Dict[str, Dict[str, Any]] = {}
+    compiled: List[str] = []
+    for key, prof in (profiles or {}).items():
+        if not isinstance(prof, dict) or not prof:
+            continue
+        digest = hashes.get(key) or profile_hash(prof)
+        art = artifacts.get(key)
+        if isinstance(art, dict) and art.get("compiler") == COMPILER_VERSION and art.get("hash") == digest:
+            out[key] = art
+            continue
+        try:
+            out[key] = build_profile_artifact(key, prof, digest)
+            compiled.append(key)
+        except Exception:
+            _LOGGER.warning("profile artifact: compile failed for %s", key, exc_info=True)
+    return out, compiled
+
+
+def usable_artifacts(
+    profiles: Dict[str, Any],
+    artifacts: Optional[Dict[str, Dict[str, Any]]],
+    stored_profiles: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Artifacts that are current for ``profiles``; anything else gets compiled on the fly.
+
+    A profile that is the very object the artifacts were saved with
+    (``stored_profiles``) is trusted without hashing.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    for key, art in (artifacts or {}).items():
+        prof = (profiles or {}).get(key)
+        if not prof or not isinstance(art, dict) or art.get("compiler") != COMPILER_VERSION:
+            continue
+        if stored_profiles is not None and stored_profiles.get(key) is prof:
+            out[key] = art
+        elif art.get("hash") == profile_hash(prof):
+            out[key] = art
+    return out
+
+
+def group_config_topic(group: str) -> str:
+    """Retained topic shared by every member of a device group."""
+    return f"{FIXED_CONFIG_BASE}/group/{group}/config"
+
+
+def group_state_key(group: str) -> str:
+    """Key for a group in per-config state maps (device ids never contain '/')."""
+    return f"group/{group}"
+
+
+def _default_topics(device_id: str) -> Dict[str, str]:
+    base_dev = FIXED_DEVICE_BASE
+    return {
+        "settings": f"{base_dev}/{device_id}/settings",
+        "hello":    f"{base_dev}/{device_id}/hello",
+        "status":   f"{base_dev}/{device_id}/status",
+    }
+
+
+def group_request_topic(group: str) -> str:
+    """Broadcast request topic for every member of a device group."""
+    return f"{FIXED_GROUP_BASE}/{group}/request"
+
+
+def _with_broadcast_topics(doc: Dict[str, Any], caps: Set[str], group: Optional[str]) -> Dict[str, Any]:
+    """Tell broadcast-capable clients which fleet/group request topics to subscribe to."""
+    if CAP_BROADCAST not in caps or not isinstance(doc.get("topics"), dict):
+        return doc
+    topics = dict(doc["topics"])
+    topics["broadcast"] = FIXED_BROADCAST_TOPIC
+    if group:
+        topics["group_broadcast"] = group_request_topic(group)
+    out = dict(doc)
+    out["topics"] = topics
+    return out
+
+
+def build_group_config(
+    group: str,
+    group_def: Dict[str, Any],
+    profiles: Dict[str, Any],
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Build the device-independent config shared by a group: ``{"version", "group", "ui"}``.
+
+    The group's profile is normalized exactly like a device profile; the
+    per-device parts (``device_id``, ``device``, ``topics``) are left to each
+    member's own document.
+    """
+    profile_key = (group_def or {}).get("profile") or group
+    doc = build_config_for_device({"device_id": "", "profile": profile_key}, profiles, artifacts)
+    return {"version": 1, "group": group, "ui": doc.get("ui") or {"widgets": []}}
+
+
+def _with_frames(doc: Dict[str, Any], dev: Dict[str, Any], caps: Set[str]) -> Dict[str, Any]:
+    """Add precomputed per-orientation widget frames to ``doc["ui"]`` for ``frames``-capable devices."""
+    if CAP_FRAMES not in caps or not isinstance(doc.get("ui"), dict):
+        return doc
+    ui = apply_frames(doc["ui"], dev.get("screen"))
+    if ui is doc["ui"]:
+        return doc
+    return {**doc, "ui": ui}
+
+
+def intern_styles(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Return ``doc`` with repeated widget ``format`` dicts moved into a top-level ``styles`` table.
+
+    Widgets (main grid and pages) sharing an identical format get ``"style": "<key>"``
+    instead of an inline copy; formats used once stay inline. Keys are ``s0``,
+    ``s1``, ... in order of first use, so unchanged profiles keep their keys and
+    deltas stay small. The document is marked ``STYLES_SCHEMA_VERSION``; it is
+    returned unchanged when nothing repeats. The input is not mutated.
+    """
+    ui = doc.get("ui")
+    if not isinstance(ui, dict):
+        return doc
+    pages = ui.get("pages") if isinstance(ui.get("pages"), list) else []
+    grids = [ui.get("widgets")] + [p.get("widgets") for p in pages if isinstance(p, dict)]
+    counts: Dict[str, int] = {}
+    for widgets in grids:
+        for w in widgets if isinstance(widgets, list) else []:
+            if isinstance(w, dict) and isinstance(w.get("format"), dict) and w["format"]:
+                sig = json.dumps(w["format"], sort_keys=True, separators=(",", ":"))
+                counts[sig] = counts.get(sig, 0) + 1
+    if not any(n > 1 for n in counts.values()):
+        return doc
+    keys: Dict[str, str] = {}
+    styles: Dict[str, Any] = {}
+
+    def _widgets(widgets: Any) -> Any:
+        if not isinstance(widgets, list):
+            return widgets
+        out = []
+        for w in widgets:
+            fmt = w.get("format") if isinstance(w, dict) else None
+            sig = json.dumps(fmt, sort_keys=True, separators=(",", ":")) if isinstance(fmt, dict) and fmt else None
+            if sig is None or counts.get(sig, 0) < 2:
+                out.append(w)
+                continue
+            if sig not in keys:
+                keys[sig] = f"s{len(keys)}"
+                styles[keys[sig]] = fmt
+            w = {k: v for k, v in w.items() if k != "format"}
+            w["style"] = keys[sig]
+            out.append(w)
+        return out
+
+    new_ui = dict(ui)
+    if "widgets" in ui:
+        new_ui["widgets"] = _widgets(ui["widgets"])
+    if pages:
+        new_ui["pages"] = [{**p, "widgets": _widgets(p.get("widgets"))} if isinstance(p, dict) else p for p in pages]
+    return {**doc, "version": STYLES_SCHEMA_VERSION, "styles": styles, "ui": new_ui}
+
+
+def _with_styles(doc: Dict[str, Any], caps: Set[str]) -> Dict[str, Any]:
+    return intern_styles(doc) if CAP_STYLES in caps else doc
+
+
+def build_device_doc(
+    dev: Dict[str, Any],
+    profiles: Dict[str, Any],
+    groups: Optional[Dict[str, Dict[str, Any]]] = None,
+    overlays: Optional[Dict[str, Dict[str, Any]]] = None,
+    group_cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Config document for one device record, honouring device group membership.
+
+    Members of a known group that advertise ``groups`` get a small document
+    pointing at the group topic and carrying their overlay (an RFC 7386 merge
+    patch the client applies on top of the group config). Other members get the
+    group config with the overlay already applied. ``group_cache`` lets a batch
+    build each group config once. Full documents for ``styles``-capable devices
+    have their widget formats interned (see ``intern_styles``).
+    """
+    group = dev.get("group") or ""
+    group_def = (groups or {}).get(group) if group else None
+    caps = device_caps(dev)
+    if not isinstance(group_def, dict):
+        doc = _with_frames(build_config_for_device(dev, profiles, artifacts), dev, caps)
+        return _with_broadcast_topics(_with_styles(doc, caps), caps, None)
+    device_id = dev.get("device_id") or ""
+    overlay = (overlays or {}).get(device_id)
+    overlay = overlay if isinstance(overlay, dict) else {}
+    device: Dict[str, Any] = {}
+    if isinstance(dev.get("screen"), dict):
+        device["screen"] = dev.get("screen")
+    cache = group_cache if group_cache is not None else {}
+    if CAP_GROUPS in caps:
+        doc = {
+            "version": 1,
+            "device_id": device_id,
+            "device": device,
+            "group": group,
+            "group_topic": group_config_topic(group),
+            "overlay": overlay,
+            "topics": _default_topics(device_id),
+        }
+        if CAP_FRAMES in caps:
+            # Frames depend on this member's screen and overlay, so they ride in its own document
+            if group not in cache:
+                cache[group] = build_group_config(group, group_def, profiles, artifacts)
+            merged = merge_patch({"ui": cache[group]["ui"]}, overlay) if overlay else {"ui": cache[group]["ui"]}
+            framed = _with_frames(merged, dev, caps)["ui"]
+            if isinstance(framed, dict):
+                if framed.get("frames"):
+                    doc["frames"] = framed["frames"]
+                page_frames = [p.get("frames") for p in framed.get("pages") or [] if isinstance(p, dict)]
+                if any(page_frames):
+                    doc["page_frames"] = page_frames
+        return _with_broadcast_topics(doc, caps, group)
+    if group not in cache:
+        cache[group] = build_group_config(group, group_def, profiles, artifacts)
+    doc = {
+        "version": 1,
+        "device_id": device_id,
+        "device": device,
+        "ui": cache[group]["ui"],
+        "topics": _default_topics(device_id),
+    }
+    doc = merge_patch(doc, overlay) if overlay else doc
+    return _with_broadcast_topics(_with_styles(_with_frames(doc, dev, caps), caps), caps, group)
+
+
+def encode_config(doc: Dict[str, Any]) -> bytes:
+    """Serialize a config document to the compact UTF-8 JSON published on MQTT."""
+    return json.dumps(doc, separators=(",", ":")).encode("utf-8")
+
+
+def device_caps(dev: Dict[str, Any]) -> Set[str]:
+    """Return the capability set a device advertised in its last hello."""
+    caps = dev.get("caps")
+    if not isinstance(caps, (list, tuple, set)):
+        return set()
+    return {c.strip().lower() for c in caps if isinstance(c, str) and c.strip()}
+
+
+def encode_for_device(payload: bytes, caps: Set[str]) -> Dict[str, Any]:
+    """Pick the wire encoding for an encoded config based on device capabilities.
+
+    Devices advertising ``zlib`` get a compressed payload split into chunks of at
+    most ``CONFIG_CHUNK_BYTES`` (a single chunk unless they also advertise
+    ``chunked``). Everyone else gets the plain JSON bytes.
+    """
+    if CAP_ZLIB not in caps:
+        return {"encoding": None, "chunks": []}
+    packed = zlib.compress(payload, 9)
+    if CAP_CHUNKED in caps and len(packed) > CONFIG_CHUNK_BYTES:
+        chunks = [packed[i:i + CONFIG_CHUNK_BYTES] for i in range(0, len(packed), CONFIG_CHUNK_BYTES)]
+    else:
+        chunks = [packed]
+    return {"encoding": CAP_ZLIB, "chunks": chunks}
+
+
+def split_pages(doc: Dict[str, Any], device_id: str, compress: bool) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Split ``ui.pages`` out of a config into per-page payloads plus a small index.
+
+    The returned document keeps everything except page widgets; each ``ui.pages``
+    entry becomes ``{..page keys.., "widgets": <count>, "hash", "topic"}``. Page
+    payloads are ``{"index", "payload", "hash"}`` where ``hash`` is the sha256 of
+    the plain page JSON and ``payload`` is zlib-compressed when ``compress``.
+    Documents without pages are returned unchanged with no page payloads.
+    """
+    ui = doc.get("ui")
+    src_pages = ui.get("pages") if isinstance(ui, dict) else None
+    if not isinstance(src_pages, list) or not src_pages:
+        return doc, []
+    index: List[Dict[str, Any]] = []
+    pages: List[Dict[str, Any]] = []
+    for n, page in enumerate(src_pages):
+        body = page if isinstance(page, dict) else {"widgets": []}
+        raw = encode_config(body)
+        phash = hashlib.sha256(raw).hexdigest()
+        entry = {k: v for k, v in body.items() if k != "widgets"}
+        entry["widgets"] = len(body.get("widgets") or [])
+        entry["hash"] = phash
+        entry["topic"] = f"{FIXED_CONFIG_BASE}/{device_id}/page/{n}"
+        if compress:
+            entry["encoding"] = CAP_ZLIB
+        index.append(entry)
+        pages.append({"index": n, "payload": zlib.compress(raw, 9) if compress else raw, "hash": phash})
+    out = dict(doc)
+    out["ui"] = dict(ui)
+    out["ui"]["pages"] = index
+    return out, pages
+
+
+def _with_rev_placeholder(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """``doc`` with ``rev`` 0 as its first key; a ``rev`` coming from a profile or overlay is dropped."""
+    return {"rev": 0, **{k: v for k, v in doc.items() if k != "rev"}}
+
+
+def _stamp_rev(payload: bytes, doc: Dict[str, Any], rev: int) -> bytes:
+    """``payload`` (the encoding of ``doc``) carrying the real revision.
+
+    Swaps the leading ``"rev":0`` placeholder when it is there, and re-encodes
+    ``doc`` otherwise.
+    """
+    if payload.startswith(_REV_PLACEHOLDER):
+        return b'{"rev":%d,' % rev + payload[len(_REV_PLACEHOLDER):]
+    return encode_config({**doc, "rev": rev})
+
+
+def _make_delta(prev_payload: Optional[bytes], doc: Dict[str, Any], rev: int, payload: bytes) -> Optional[bytes]:
+    """Encoded delta message from the previous document, or None when a full reload is cheaper."""
+    if not prev_payload:
+        return None
+    try:
+        old = json.loads(prev_payload)
+        new = dict(doc)
+        new["rev"] = rev
+        ops = make_patch(old, new)
+        msg = {"from": old.get("rev"), "rev": rev, "hash": hashlib.sha256(payload).hexdigest(), "ops": ops}
+        encoded = json.dumps(msg, separators=(",", ":")).encode("utf-8")
+    except Exception:
+        _LOGGER.debug("config delta failed; falling back to full reload", exc_info=True)
+        return None
+    if len(encoded) * 2 > len(payload):
+        return None
+    return encoded
+
+
+def compile_device_configs(
+    devices: List[Dict[str, Any]],
+    profiles: Dict[str, Any],
+    prev_state: Optional[Dict[str, Dict[str, Any]]] = None,
+    groups: Optional[Dict[str, Dict[str, Any]]] = None,
+    overlays: Optional[Dict[str, Dict[str, Any]]] = None,
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """Build and encode configs for a batch of device records.
+
+    ``prev_state`` maps device_id to what was last published for it
+    (``{"rev", "content_hash", "payload"?}``). It drives the per-device revision
+    counter and, for devices advertising ``delta``, the JSON-Patch delta.
+
+    Returns one result dict per device, in input order::
+
+        {"device_id", "payload", "hash", "content_hash", "rev", "changed",
+         "delta", "encoding", "chunks", "pages"}
+
+    ``payload`` is the plain JSON bytes (``None`` when encoding failed; the caller
+    skips those devices) and ``hash`` its sha256. ``content_hash`` ignores ``rev``;
+    ``rev`` only moves when it changes. ``encoding``/``chunks`` come from
+    ``encode_for_device``. ``pages`` is non-empty only for ``pages``-capable
+    devices, whose ``payload`` is then the page index (see ``split_pages``).
+    ``groups``/``overlays`` are the Store's device groups and per-device overlays
+    (see ``build_device_doc``). ``artifacts`` are precompiled profiles (see
+    ``usable_artifacts``); profiles without one are normalized here. Runs
+    unchanged in a worker thread or process.
+    """
+    prev_state = prev_state or {}
+    results: List[Dict[str, Any]] = []
+    group_cache: Dict[str, Dict[str, Any]] = {}
+    for dev in devices:
+        device_id = (dev.get("device_id") or "").strip()
+        if not device_id:
+            continue
+        caps = device_caps(dev)
+        doc = _with_rev_placeholder(build_device_doc(dev, profiles, groups, overlays, group_cache, artifacts))
+        pages: List[Dict[str, Any]] = []
+        try:
+            if CAP_PAGES in caps:
+                doc, pages = split_pages(doc, device_id, CAP_ZLIB in caps)
+            unstamped = encode_config(doc)
+        except Exception as ex:
+            _LOGGER.warning("config JSON encode failed for %s: %s", device_id, ex)
+            results.append({"device_id": device_id, "payload": None, "hash": "", "encoding": None, "chunks": [], "pages": []})
+            continue
+        content_hash = hashlib.sha256(unstamped).hexdigest()
+        prev = prev_state.get(device_id) or {}
+        prev_rev = int(prev.get("rev") or 0)
+        changed = content_hash != prev.get("content_hash")
+        rev = prev_rev + 1 if changed else max(prev_rev, 1)
+        payload = _stamp_rev(unstamped, doc, rev)
+        delta = None
+        if changed and CAP_DELTA in caps:
+            delta = _make_delta(prev.get("payload"), doc, rev, payload)
+        res = {
+            "device_id": device_id,
+            "payload": payload,
+            "hash": hashlib.sha256(payload).hexdigest(),
+            "content_hash": content_hash,
+            "rev": rev,
+            "changed": changed,
+            "delta": delta,
+            "pages": pages,
+        }
+        res.update(encode_for_device(payload, caps))
+        results.append(res)
+    return results
+
+
+def compile_group_configs(
+    groups: Dict[str, Dict[str, Any]],
+    profiles: Dict[str, Any],
+    prev_state: Optional[Dict[str, Dict[str, Any]]] = None,
+    artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """Build and encode one shared config per device group.
+
+    ``prev_state`` is keyed by ``group_state_key``. Returns
+    ``{"group", "payload", "hash", "content_hash", "rev", "changed"}`` per group,
+    with the same revision rules as ``compile_device_configs``. Group configs are
+    always plain JSON: members differ in which encodings they accept.
+    """
+    prev_state = prev_state or {}
+    results: List[Dict[str, Any]] = []
+    for group, group_def in sorted((groups or {}).items()):
+        if not isinstance(group_def, dict):
+            continue
+        try:
+            doc = _with_rev_placeholder(build_group_config(group, group_def, profiles, artifacts))
+            unstamped = encode_config(doc)
+        except Exception as ex:
+            _LOGGER.warning("group config encode failed for %s: %s", group, ex)
+            continue
+        content_hash = hashlib.sha256(unstamped).hexdigest()
+        prev = prev_state.get(group_state_key(group)) or {}
+        prev_rev = int(prev.get("rev") or 0)
+        changed = content_hash != prev.get("content_hash")
+        rev = prev_rev + 1 if changed else max(prev_rev, 1)
+        payload = _stamp_rev(unstamped, doc, rev)
+        results.append({
+            "group": group,
+            "payload": payload,
+            "hash": hashlib.sha256(payload).hexdigest(),
+            "content_hash": content_hash,
+            "rev": rev,
+            "changed": changed,
+        })
+    return results
+
+
+def build_manifest(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Manifest published next to chunked configs so clients can reassemble and verify them."""
+    chunks = result.get("chunks") or []
+    return {
+        "encoding": result.get("encoding"),
+        "chunks": len(chunks),
+        "bytes": sum(len(c) for c in chunks),
+        "raw_bytes": len(result.get("payload") or b""),
+        "hash": result.get("hash") or "",
+    }
+
+
+def estimate_build_cost(devices: List[Dict[str, Any]], profiles: Dict[str, Any]) -> int:
+    """Cheap estimate of compile work: widgets that would be normalized across all devices."""
+    per_profile: Dict[str, int] = {}
+    for key, prof in (profiles or {}).items():
+        n = 0
+        if isinstance(prof, dict):
+            stack: List[Any] = [prof]
+            while stack:
+                node = stack.pop()
+                if not isinstance(node, dict):
+                    continue
+                for k in ("widgets", "layout"):
+                    if isinstance(node.get(k), list):
+                        n += len(node[k])
+                if isinstance(node.get("pages"), list):
+                    stack.extend(node["pages"])
+                for k in ("ui", "dashboard"):
+                    if isinstance(node.get(k), dict):
+                        stack.append(node[k])
+        per_profile[key] = n
+    default = per_profile.get("default", max(per_profile.values(), default=0))
+    total = 0
+    for dev in devices:
+        did = dev.get("device_id") or ""
+        total += per_profile.get(did, per_profile.get(dev.get("profile") or "", default)) or 1
+    return total
@@ -6,7 +6,8 @@ import voluptuous as vol  # type: ignore
 from homeassistant import config_entries  # type: ignore
 from homeassistant.core import callback # type: ignore
 from homeassistant.helpers import selector # type: ignore
-from .storage import StorageHelper
+from .storage import get_storage_helper
+from .grid import find_widget_overlaps
 from .const import (
     DOMAIN,
     CONF_DEVICES, CONF_PROFILES,
@@ -14,6 +15,11 @@ from .const import (
     CONF_MIRROR_AUTO,
     CONF_API_ENABLED,
     CONF_API_UNTIL_KEY,
+    CONF_COMPILE_MODE,
+    CONF_PROFILE_INDEX_ONLY,
+    CONF_PROFILE_LAZY,
+    COMPILE_MODE_AUTO,
+    COMPILE_MODES,
 )
 
 STEP_USER = vol.Schema({
@@ -78,11 +84,17 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         self._profiles: dict = self._data.get(CONF_PROFILES, {})
         self._devices: list = self._data.get(CONF_DEVICES, [])
         self._mirror_entities = list(self._data.get(CONF_MIRROR_ENTITIES, []))
+        # Profile key the editor showed as the device's own (lone-profile migration); pruned on save if unused
+        self._migrated_profile = None
         logging.getLogger(__name__).debug(
             "options_flow:init devices=%d profiles=%d mirror=%d",
             len(self._devices or []), len(self._profiles or {}), len(self._mirror_entities or []),
         )
 
+    def _options_data(self) -> dict:
+        # In index-only mode the saved options carry just the profile index; bodies stay in the Store
+        return get_storage_helper(self.hass, self._entry).options_view(self._data)
+
     def _refresh_from_entry(self):
         # Helper to rehydrate local caches from latest entry state
         self._data = {**self._entry.data, **self._entry.options}
@@ -91,11 +103,11 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None):
         logging.getLogger(__name__).debug("options_flow:init menu opened")
-        # Refresh canonical profiles from Store on menu open
+        # Refresh canonical profiles from Store on menu open (with lazy loading, the editor steps load them)
         try:
-            helper = StorageHelper(self.hass, self._entry)
+            helper = get_storage_helper(self.hass, self._entry)
             await helper.async_init()
-            store_profiles = dict(helper.storage.get(CONF_PROFILES) or {})
+            store_profiles = {} if helper.lazy else await helper.async_get_profiles()
             if store_profiles:
                 self._profiles = store_profiles
                 self._data[CONF_PROFILES] = self._profiles
@@ -109,6 +121,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 "mirror",
                 "entity_list",
                 "api_access",
+                "performance",
             ],
         )
 
@@ -117,20 +130,10 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         _LOGGER = logging.getLogger(__name__)
         # Rehydrate local snapshot from latest entry in case other steps changed it
         self._refresh_from_entry()
-        # Always refresh profiles from HA Store so the editor shows latest canonical content
-        try:
-            helper = StorageHelper(self.hass, self._entry)
-            await helper.async_init()
-            store_profiles = dict(helper.storage.get(CONF_PROFILES) or {})
-            if store_profiles:
-                self._profiles = store_profiles
-                self._data[CONF_PROFILES] = self._profiles
-        except Exception:
-            logging.getLogger(__name__).exception("profiles_device: failed to load profiles from Store")
-
         ids = [d.get("device_id") for d in self._devices if d.get("device_id")]
         if not ids:
             return self.async_abort(reason="no_devices")
+        helper = get_storage_helper(self.hass, self._entry)
 
         def _schema_with_defaults(dev_id: str, text: str):
             return vol.Schema({
@@ -145,36 +148,42 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         if user_input is None:
             _LOGGER.debug("profiles_device: presenting form for %d device(s)", len(ids))
             dev_id = ids[0]
+            # Load just the bodies this form can show (the device's own and its assigned one), not every shard
+            assigned = None
+            for d in (self._devices or []):
+                if d.get("device_id") == dev_id:
+                    assigned = d.get("profile")
+                    break
+            keys: list[str] = list(self._profiles.keys())
+            try:
+                await helper.async_init()
+                keys = helper.profile_keys()
+                self._profiles = dict(await helper.async_get_profiles([k for k in (dev_id, assigned) if k]))
+            except Exception:
+                logging.getLogger(__name__).exception("profiles_device: failed to load profiles from Store")
             # Enforce device=profile; migrate lone non-matching profile key to device_id
             prof = self._profiles.get(dev_id)
             if not prof:
                 # If device has an assigned profile different from device_id and it exists, migrate it
-                assigned = None
-                for d in (self._devices or []):
-                    if d.get("device_id") == dev_id:
-                        assigned = d.get("profile")
-                        break
                 if assigned and assigned != dev_id and assigned in self._profiles:
-                    self._profiles[dev_id] = self._profiles.pop(assigned)
-                    self._data[CONF_PROFILES] = self._profiles
-                    prof = self._profiles.get(dev_id) or {}
+                    prof = self._profiles.get(assigned) or {}
                     logging.getLogger(__name__).debug("profiles_device: migrated assigned profile '%s' -> '%s'", assigned, dev_id)
                 else:
-                    # Otherwise if there is exactly one non-device key, migrate it
-                    keys = list(self._profiles.keys())
+                    # Otherwise if there is exactly one non-device key, migrate it (removed on save if unreferenced)
                     non_dev_keys = [k for k in keys if k != dev_id]
+                    prof = {}
                     if len(non_dev_keys) == 1:
                         moved = non_dev_keys[0]
-                        self._profiles[dev_id] = self._profiles.pop(moved)
-                        self._data[CONF_PROFILES] = self._profiles
-                        prof = self._profiles.get(dev_id) or {}
-                        logging.getLogger(__name__).debug("profiles_device: migrated lone profile '%s' -> '%s'", moved, dev_id)
-                    else:
-                        prof = {}
+                        try:
+                            prof = (await helper.async_get_profiles([moved])).get(moved) or {}
+                            self._migrated_profile = moved
+                            logging.getLogger(__name__).debug("profiles_device: migrated lone profile '%s' -> '%s'", moved, dev_id)
+                        except Exception:
+                            logging.getLogger(__name__).exception("profiles_device: failed to load profile %s from Store", moved)
             prof_name = dev_id
             _LOGGER.debug(
                 "profiles_device: selected device=%s profile_key=%s have_profiles=%s keys=%s",
-                dev_id, prof_name, bool(self._profiles), list(self._profiles.keys()),
+                dev_id, prof_name, bool(keys), keys,
             )
             current = json.dumps(prof, indent=2, ensure_ascii=False)
             help_txt = (
@@ -197,7 +206,18 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             "profiles_device: submit device=%s profile_key=%s keys=%s profile_len=%s",
             dev_id, prof_name, list(user_input.keys()), (len(txt) if isinstance(txt, str) else None),
         )
-        existing = self._profiles.get(prof_name) or {}
+        # Read the Store before saving; if that fails nothing is saved (a partial view must not replace it)
+        try:
+            await helper.async_init()
+            keys = helper.profile_keys()
+            existing = (await helper.async_get_profiles([prof_name])).get(prof_name) or {}
+        except Exception:
+            _LOGGER.exception("profiles_device: failed to read Store before saving %s", dev_id)
+            return self.async_show_form(
+                step_id="profiles_device",
+                errors={"base": "store_unavailable"},
+                data_schema=_schema_with_defaults(dev_id, txt),
+            )
         try:
             # If field missing or empty, keep existing profile to avoid accidental wipe
             if not has_profile_field:
@@ -238,32 +258,8 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             prof_name = dev_id
         # Detect overlapping widgets prior to saving; if overlaps, re-present form with warning.
         overlaps: list[str] = []
-        norm = []  # keep for later debug
         try:
-            widgets_list = []
-            if isinstance(parsed.get("widgets"), list):
-                widgets_list = list(parsed.get("widgets") or [])
-            elif isinstance(parsed.get("ui"), dict) and isinstance(parsed.get("ui", {}).get("widgets"), list):
-                widgets_list = list(parsed.get("ui", {}).get("widgets") or [])
-            for w in widgets_list:
-                if not isinstance(w, dict):
-                    continue
-                ent = (w.get("entity_id") or w.get("entity") or "").strip()
-                x = w.get("x", w.get("col", 0))
-                y = w.get("y", w.get("row", 0))
-                w_cells = w.get("w", w.get("colspan", 1))
-                h_cells = w.get("h", w.get("rowspan", 1))
-                try:
-                    xi = int(x); yi = int(y); wi = max(1, int(w_cells)); hi = max(1, int(h_cells))
-                except Exception:
-                    continue
-                norm.append({"id": w.get("id") or ent or f"idx:{len(norm)}", "x": xi, "y": yi, "w": wi, "h": hi})
-            for i in range(len(norm)):
-                a = norm[i]; ax2 = a["x"] + a["w"]; ay2 = a["y"] + a["h"]
-                for j in range(i+1, len(norm)):
-                    b = norm[j]; bx2 = b["x"] + b["w"]; by2 = b["y"] + b["h"]
-                    if not (ax2 <= b["x"] or bx2 <= a["x"] or ay2 <= b["y"] or by2 <= a["y"]):
-                        overlaps.append(f"{a['id']} ↔ {b['id']}")
+            overlaps = find_widget_overlaps(parsed)
         except Exception:
             logging.getLogger(__name__).exception("profiles_device: overlap detection failed for %s", dev_id)
 
@@ -277,16 +273,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 data_schema=_schema_with_defaults(dev_id, restored_txt),
                 description_placeholders={"desc": warn + "\n\nFix overlaps and submit again."},
             )
-        # Merge into latest Store snapshot before persisting
-        base_profiles = {}
-        try:
-            helper = StorageHelper(self.hass, self._entry)
-            await helper.async_init()
-            base_profiles = dict(helper.storage.get(CONF_PROFILES) or {})
-        except Exception:
-            logging.getLogger(__name__).exception("profiles_device: failed to reload Store before save")
-        base_profiles[prof_name] = parsed
-        self._profiles = base_profiles
+        self._profiles = {**self._profiles, prof_name: parsed}
         self._data[CONF_PROFILES] = self._profiles
 
         devs = list(self._data.get(CONF_DEVICES, []) or [])
@@ -311,10 +298,9 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 referenced.add(d.get("device_id"))
         # Prune obvious stray keys like 'main_panel' or previous assigned key if unreferenced
         to_prune: list[str] = []
-        if prev_assigned and prev_assigned != dev_id and prev_assigned in self._profiles and prev_assigned not in referenced:
-            to_prune.append(prev_assigned)
-        if "main_panel" in self._profiles and "main_panel" not in referenced:
-            to_prune.append("main_panel")
+        for k in (prev_assigned, self._migrated_profile, "main_panel"):
+            if k and k != dev_id and k in keys and k not in referenced and k not in to_prune:
+                to_prune.append(k)
         for k in to_prune:
             try:
                 self._profiles.pop(k, None)
@@ -325,17 +311,16 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         self._data[CONF_DEVICES] = devs
         _LOGGER.debug(
             "profiles_device: saved device=%s profile_key=%s decision=%s profiles_count=%d devices_count=%d",
-            dev_id, prof_name, locals().get("decided", "unknown"), len(self._profiles or {}), len(devs),
+            dev_id, prof_name, locals().get("decided", "unknown"),
+            len(set(keys) - set(to_prune) | {prof_name}), len(devs),
         )
         if not overlaps:
-            _LOGGER.debug("profiles_device: no overlaps for device=%s (widgets=%d)", dev_id, len(norm))
-        # Persist directly to HA Store so edits survive reloads regardless of options listener timing
+            _LOGGER.debug("profiles_device: no overlaps for device=%s", dev_id)
+        # Persist directly to HA Store so edits survive reloads regardless of options listener timing.
+        # Only this profile and the pruned keys change; the other profiles are left alone
         try:
-            helper = StorageHelper(self.hass, self._entry)
-            # Load existing store (defensive) then persist merged profiles (mirrors to options)
-            await helper.async_init()
-            await helper.persist_profiles(dict(self._profiles))
-            _LOGGER.debug("profiles_device: persisted profiles to Store (keys=%s)", list(self._profiles.keys()))
+            await helper.async_update_profiles({prof_name: parsed}, removed=to_prune)
+            _LOGGER.debug("profiles_device: persisted profile %s to Store (pruned=%s)", prof_name, to_prune)
         except Exception:
             _LOGGER.exception("profiles_device: failed to persist profiles to Store for %s", dev_id)
         # Immediately publish updated config & reload device so UI refreshes without manual button
@@ -350,7 +335,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 _LOGGER.debug("profiles_device: scheduled debounced publish+reload for %s", dev_id)
         except Exception:
             _LOGGER.exception("profiles_device: scheduling publish+reload failed for %s", dev_id)
-        return self.async_create_entry(title="", data=self._data)
+        return self.async_create_entry(title="", data=self._options_data())
 
     # Devices: add device
     async def async_step_devices_add(self, user_input=None):
@@ -368,6 +353,14 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         if dev_id not in (self._profiles or {}):
             self._profiles[dev_id] = {"grid": {"columns": 4}, "widgets": []}
             self._data[CONF_PROFILES] = self._profiles
+            # Store first: in index-only mode options don't carry profile bodies
+            try:
+                helper = get_storage_helper(self.hass, self._entry)
+                await helper.async_init()
+                if dev_id not in helper.profile_keys():
+                    await helper.async_update_profiles({dev_id: self._profiles[dev_id]})
+            except Exception:
+                logging.getLogger(__name__).exception("devices_add: failed to persist profile for %s", dev_id)
         # Schedule republish+reload so the device gets a retained config immediately
         try:
             bridge = None
@@ -379,7 +372,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                 bridge.schedule_republish_reload("devices_add")
         except Exception:
             logging.getLogger(__name__).exception("devices_add: could not schedule republish")
-        return self.async_create_entry(title="", data=self._data)
+        return self.async_create_entry(title="", data=self._options_data())
 
     def _device_profile(self, device_id: str) -> str:
         for d in self._devices:
@@ -410,7 +403,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         self._data.pop("mirror_attributes", None)
         self._data[CONF_MIRROR_AUTO] = mirror_auto
         self._data[CONF_MIRROR_ENTITIES] = ents
-        return self.async_create_entry(title="", data=self._data)
+        return self.async_create_entry(title="", data=self._options_data())
 
     # (Topics step removed; all base topics fixed to mqttdash/*)
 
@@ -422,7 +415,7 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
 
         # Extract entity IDs referenced in profile widgets
         try:
-            from .mqtt_bridge import _extract_entities_from_profiles
+            from .config_builder import _extract_entities_from_profiles
             profs = dict(self._profiles or {})
             profile_ents = _extract_entities_from_profiles(profs)
         except Exception:
@@ -491,4 +484,28 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             "api_access: api_until set to %s",
             "now+10min" if api_until else "disabled",
         )
-        return self.async_create_entry(title="", data=self._data)
+        return self.async_create_entry(title="", data=self._options_data())
+
+    # Performance: where retained configs are compiled
+    async def async_step_performance(self, user_input=None):
+        logging.getLogger(__name__).debug("options_flow:performance opened")
+        schema = vol.Schema({
+            vol.Optional(CONF_COMPILE_MODE, default=self._data.get(CONF_COMPILE_MODE, COMPILE_MODE_AUTO)): selector.SelectSelector(
+                selector.SelectSelectorConfig(options=COMPILE_MODES, mode="dropdown", translation_key=CONF_COMPILE_MODE)
+            ),
+            vol.Optional(CONF_PROFILE_INDEX_ONLY, default=bool(self._data.get(CONF_PROFILE_INDEX_ONLY, False))): selector.BooleanSelector(),
+            vol.Optional(CONF_PROFILE_LAZY, default=bool(self._data.get(CONF_PROFILE_LAZY, False))): selector.BooleanSelector(),
+        })
+        if user_input is None:
+            return self.async_show_form(step_id="performance", data_schema=schema)
+        mode = user_input.get(CONF_COMPILE_MODE) or COMPILE_MODE_AUTO
+        if mode not in COMPILE_MODES:
+            mode = COMPILE_MODE_AUTO
+        self._data[CONF_COMPILE_MODE] = mode
+        self._data[CONF_PROFILE_INDEX_ONLY] = bool(user_input.get(CONF_PROFILE_INDEX_ONLY, False))
+        self._data[CONF_PROFILE_LAZY] = bool(user_input.get(CONF_PROFILE_LAZY, False))
+        logging.getLogger(__name__).debug(
+            "options_flow:performance saving compile_mode=%s profile_index_only=%s profile_lazy=%s",
+            mode, self._data[CONF_PROFILE_INDEX_ONLY], self._data[CONF_PROFILE_LAZY],
+        )
+        return self.async_create_entry(title="", data=self._options_data())
@@ -13,13 +13,41 @@ CONF_API_UNTIL_KEY = f"{DOMAIN}_api_until"
 
 # Dispatcher signal names
 SIGNAL_DEVICE_SETTINGS_UPDATED = f"{DOMAIN}_device_settings_updated"
+# Dispatched with the device_id when its published or applied (config_status) config changes
+SIGNAL_CONFIG_STATUS_UPDATED = f"{DOMAIN}_config_status_updated"
 
 # Fixed mqttdash namespace (replaces legacy 'ha/*' topics). User configuration of bases removed.
 FIXED_CONFIG_BASE = "mqttdash/config"
 FIXED_DEVICE_BASE = "mqttdash/dev"
 FIXED_COMMAND_BASE = "mqttdash/cmd"
 FIXED_STATESTREAM_BASE = "mqttdash/statestream"
+# Broadcast requests (same payloads as mqttdash/dev/<id>/request) for broadcast-capable clients
+FIXED_BROADCAST_TOPIC = "mqttdash/all/request"
+FIXED_GROUP_BASE = "mqttdash/group"  # mqttdash/group/<group>/request
 
 # Persistent storage (HA Store)
 STORAGE_VERSION = 1
-STORAGE_KEY = f"{DOMAIN}.store"
\ No newline at end of file
+STORAGE_KEY = f"{DOMAIN}.store"
+# Options keep only {profile_key: {"hash", "size"}} under CONF_PROFILE_INDEX; bodies live in the Store only
+CONF_PROFILE_INDEX_ONLY = "profile_index_only"  # bool
+CONF_PROFILE_INDEX = "profile_index"
+# Load profile bodies on demand (bounded in-memory cache) instead of all at startup; implies index-only options
+CONF_PROFILE_LAZY = "profile_lazy"  # bool
+
+# Config compilation: where build+encode of retained configs runs
+CONF_COMPILE_MODE = "compile_mode"  # str — one of COMPILE_MODES
+COMPILE_MODE_AUTO = "auto"  # thread pool for small fleets, process pool for large ones
+COMPILE_MODE_INLINE = "inline"  # on the event loop (legacy behaviour)
+COMPILE_MODE_THREAD = "thread"
+COMPILE_MODE_PROCESS = "process"
+COMPILE_MODES = [COMPILE_MODE_AUTO, COMPILE_MODE_INLINE, COMPILE_MODE_THREAD, COMPILE_MODE_PROCESS]
+
+# Client capabilities advertised in the hello payload ("caps": [...])
+CAP_ZLIB = "zlib"  # accepts zlib-compressed configs via manifest + chunk topics
+CAP_CHUNKED = "chunked"  # accepts configs split across several chunk topics
+CAP_DELTA = "delta"  # applies JSON-Patch deltas from mqttdash/config/<id>/delta without a reload
+CAP_PAGES = "pages"  # loads multi-page configs lazily from mqttdash/config/<id>/page/<n>
+CAP_GROUPS = "groups"  # assembles its config from mqttdash/config/group/<group>/config plus a per-device overlay
+CAP_BROADCAST = "broadcast"  # subscribes to mqttdash/all/request and its group request topic
+CAP_FRAMES = "frames"  # renders from precomputed per-orientation widget frames instead of laying out the grid
+CAP_STYLES = "styles"  # resolves widget "style" keys against the config's top-level "styles" table (schema v2)
@@ -0,0 +1,221 @@
+"""In-memory device directory.
+
+Device records live in the Store. ``DeviceDirectory`` keeps them in memory
+indexed by device_id and by GUID, next to the purge markers (held as sets), so
+hello handling, purges, renames and lookups don't rebuild or scan the device
+list.
+
+Records are replaced, never edited in place: runtime snapshots share the
+dicts, so an edit has to produce a new dict to register as a change. ``dirty``
+is set by any change not yet handed to the Store; ``directory_dirty`` only when
+the part entry options hold (see ``device_directory``) changed. ``generation``
+moves whenever the records do (purge markers aside), so runtime snapshots can
+tell the device list changed without comparing it.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+# Device fields mirrored to entry options (platform setup and the options flow need no more)
+_DIRECTORY_FIELDS = ("device_id", "profile", "guid")
+
+
+def device_directory(devices: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Slim ``{device_id, profile, guid}`` records of ``devices``, as kept in entry options."""
+    out: List[Dict[str, Any]] = []
+    for d in devices or []:
+        if isinstance(d, dict) and d.get("device_id"):
+            out.append({k: d[k] for k in _DIRECTORY_FIELDS if d.get(k)})
+    return out
+
+
+def _slim(rec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: rec[k] for k in _DIRECTORY_FIELDS if rec.get(k)}
+
+
+def _score(rec: Dict[str, Any]) -> int:
+    return (1 if rec.get("guid") else 0) + (1 if rec.get("profile") else 0)
+
+
+def _merged(rec: Dict[str, Any], fields: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    out = dict(rec)
+    for k, v in (fields or {}).items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = v
+    return out
+
+
+class DeviceDirectory:
+    """Device records by device_id and GUID, plus purge markers; see module docstring."""
+
+    def __init__(self) -> None:
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        # guid -> device_id (the last record carrying a GUID wins)
+        self._by_guid: Dict[str, str] = {}
+        self._records: Optional[List[Dict[str, Any]]] = None
+        self.purged_ids: Set[str] = set()
+        self.purged_guids: Set[str] = set()
+        self.dirty = False
+        self.directory_dirty = False
+        self.generation = 0
+
+    def load(self, devices: Iterable[Any], purged_ids: Iterable[Any] = (), purged_guids: Iterable[Any] = ()) -> None:
+        """Replace the contents with stored state; not a change, so the dirty flags are cleared."""
+        self._fill(devices, {})
+        self.generation += 1
+        self.purged_ids = {x for x in purged_ids or () if isinstance(x, str) and x}
+        self.purged_guids = {x for x in purged_guids or () if isinstance(x, str) and x}
+        self.dirty = self.directory_dirty = False
+
+    def _fill(self, devices: Iterable[Any], previous: Dict[str, Dict[str, Any]]) -> None:
+        # Unique by device_id: a later duplicate wins unless it has less (GUID, profile) than the earlier one.
+        # Records equal to the previous ones keep their dicts
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for d in devices or []:
+            did = (d.get("device_id") or "").strip() if isinstance(d, dict) else ""
+            if not did:
+                continue
+            prev = by_id.get(did)
+            if prev is None or _score(d) >= _score(prev):
+                cur = previous.get(did)
+                by_id[did] = cur if cur is not None and cur == d else dict(d)
+        self._by_id = by_id
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._by_guid = {rec["guid"]: did for did, rec in self._by_id.items() if rec.get("guid")}
+        self._records = None
+
+    def _changed(self, prev: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        self._records = None
+        self.generation += 1
+        self.dirty = True
+        if prev is None or new is None or _slim(prev) != _slim(new):
+            self.directory_dirty = True
+
+    # Lookups
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, device_id: Any) -> bool:
+        return device_id in self._by_id
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.records())
+
+    def get(self, device_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(device_id) if device_id else None
+
+    def by_guid(self, guid: Optional[str]) -> Optional[Dict[str, Any]]:
+        did = self._by_guid.get(guid) if guid else None
+        return self._by_id.get(did) if did is not None else None
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Every record in order (shared, like the records themselves; don't edit)."""
+        if self._records is None:
+            self._records = list(self._by_id.values())
+        return self._records
+
+    # Edits
+    def put(self, rec: Dict[str, Any]) -> bool:
+        """Add ``rec`` or replace the record with its device_id; True if anything changed."""
+        did = rec.get("device_id")
+        if not isinstance(did, str) or not did:
+            return False
+        prev = self._by_id.get(did)
+        if prev == rec:
+            return False
+        new = self._by_id[did] = dict(rec)
+        if prev is not None and prev.get("guid") and self._by_guid.get(prev["guid"]) == did:
+            del self._by_guid[prev["guid"]]
+        if new.get("guid"):
+            self._by_guid[new["guid"]] = did
+        self._changed(prev, new)
+        return True
+
+    def update(self, device_id: str, fields: Dict[str, Any]) -> bool:
+        """Set ``fields`` on a record (None removes a field); True if anything changed."""
+        prev = self._by_id.get(device_id)
+        if prev is None:
+            return False
+        return self.put(_merged(prev, fields))
+
+    def remove(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a record; returns it, or None if there was none."""
+        prev = self._by_id.pop(device_id, None)
+        if prev is not None:
+            guid = prev.get("guid")
+            if guid and self._by_guid.get(guid) == device_id:
+                del self._by_guid[guid]
+            self._changed(prev, None)
+        return prev
+
+    def rename(self, old_id: str, new_id: str, fields: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Move ``old_id``'s record to ``new_id`` (keeping its place) and set ``fields`` on it.
+
+        A record already using ``new_id`` is dropped. Returns the new record,
+        or None if ``old_id`` is unknown.
+        """
+        prev = self._by_id.get(old_id)
+        if prev is None:
+            return None
+        new = _merged(prev, fields)
+        new["device_id"] = new_id
+        self._by_id = {
+            (new_id if did == old_id else did): (new if did == old_id else rec)
+            for did, rec in self._by_id.items()
+            if did != new_id or old_id == new_id
+        }
+        self._reindex()
+        self._changed(prev, new)
+        return new
+
+    def replace(self, devices: Iterable[Any]) -> bool:
+        """Set the whole device list (e.g. edited in the options flow); True if anything changed."""
+        previous = self._by_id
+        self._fill(devices, previous)
+        if list(previous.items()) == list(self._by_id.items()):
+            self._by_id = previous
+            self._reindex()
+            return False
+        self.generation += 1
+        self.dirty = True
+        if device_directory(previous.values()) != device_directory(self._by_id.values()):
+            self.directory_dirty = True
+        return True
+
+    # Purge markers
+    def is_purged(self, *, device_id: Optional[str] = None, guid: Optional[str] = None) -> bool:
+        return bool(device_id and device_id in self.purged_ids) or bool(guid and guid in self.purged_guids)
+
+    def add_purged(self, *, device_id: Optional[str] = None, guid: Optional[str] = None) -> bool:
+        changed = False
+        if device_id and device_id not in self.purged_ids:
+            self.purged_ids.add(device_id)
+            changed = True
+        if guid and guid not in self.purged_guids:
+            self.purged_guids.add(guid)
+            changed = True
+        self.dirty = self.dirty or changed
+        return changed
+
+    def remove_purged(self, *, device_id: Optional[str] = None, guid: Optional[str] = None) -> bool:
+        changed = False
+        if device_id and device_id in self.purged_ids:
+            self.purged_ids.discard(device_id)
+            changed = True
+        if guid and guid in self.purged_guids:
+            self.purged_guids.discard(guid)
+            changed = True
+        self.dirty = self.dirty or changed
+        return changed
+
+    def as_store(self) -> Dict[str, Any]:
+        """The Store sections this directory holds."""
+        return {
+            "devices": list(self.records()),
+            "purged_devices": sorted(self.purged_ids),
+            "purged_guids": sorted(self.purged_guids),
+        }
@@ -2,7 +2,9 @@ from __future__ import annotations
 from homeassistant.components.binary_sensor import BinarySensorEntity, BinarySensorDeviceClass  # type: ignore
 from homeassistant.core import callback  # type: ignore
 from homeassistant.helpers.entity import DeviceInfo  # type: ignore
-from ..const import DOMAIN
+from homeassistant.helpers.dispatcher import async_dispatcher_connect  # type: ignore
+from homeassistant.const import EntityCategory  # type: ignore
+from ..const import DOMAIN, SIGNAL_CONFIG_STATUS_UPDATED
 from homeassistant.components import mqtt  # type: ignore
 from typing import Optional, Callable
 
@@ -103,3 +105,57 @@ class OnlineBinarySensor(BinarySensorEntity):
                 self._unsub()
             finally:
                 self._unsub = None
+
+
+class ConfigConvergedBinarySensor(BinarySensorEntity):
+    """On when the device reports (config_status) the config currently published for it."""
+
+    _attr_has_entity_name = True
+    _attr_name = "Config converged"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+
+    def __init__(self, hass, entry, device_id: str) -> None:
+        self._hass = hass
+        self._entry = entry
+        self._device_id = device_id
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, device_id)}, name=f"{device_id}")
+        self._unsub: Optional[Callable[[], None]] = None
+
+    @property
+    def device_info(self) -> DeviceInfo:  # type: ignore[override]
+        return DeviceInfo(identifiers={(DOMAIN, self._device_id)}, name=f"{self._device_id}")
+
+    @property
+    def unique_id(self) -> str:
+        return f"{DOMAIN}:{self._device_id}:config_converged"
+
+    def _status(self) -> dict:
+        bridge = self._hass.data.get(DOMAIN, {}).get(self._entry.entry_id)
+        return bridge.get_config_status(self._device_id) if bridge else {}
+
+    @property
+    def is_on(self) -> bool | None:
+        return self._status().get("converged")
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        st = self._status()
+        return {"rev": st.get("rev"), "applied_rev": st.get("applied_rev")}
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+
+        @callback
+        def _on_status(device_id: str) -> None:
+            if device_id == self._device_id:
+                self.async_write_ha_state()
+
+        self._unsub = async_dispatcher_connect(self._hass, SIGNAL_CONFIG_STATUS_UPDATED, _on_status)
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._unsub:
+            try:
+                self._unsub()
+            finally:
+                self._unsub = None
@@ -1,8 +1,11 @@
 from __future__ import annotations
 from typing import Any
 from homeassistant.components.sensor import SensorEntity, SensorDeviceClass  # type: ignore
+from homeassistant.core import callback  # type: ignore
+from homeassistant.const import EntityCategory  # type: ignore
 from homeassistant.helpers.entity import DeviceInfo  # type: ignore
-from ..const import DOMAIN
+from homeassistant.helpers.dispatcher import async_dispatcher_connect  # type: ignore
+from ..const import DOMAIN, SIGNAL_CONFIG_STATUS_UPDATED
 
 
 class _BaseDeviceEntity(SensorEntity):
@@ -32,3 +35,43 @@ class BatteryLevelSensor(_BaseDeviceEntity):
         # Filled via telemetry that bridge caches in hass.data[DOMAIN]["telemetry"]
         st = self._hass.data.get(DOMAIN, {}).get("telemetry", {}).get(self._device_id, {})
         return st.get("battery")
+
+
+class ConfigConvergeTimeSensor(_BaseDeviceEntity):
+    """Seconds between publishing the current config and the device confirming it."""
+
+    _attr_name = "Config converge time"
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = "s"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+
+    def __init__(self, hass, entry, device_id: str) -> None:
+        super().__init__(hass, entry, device_id)
+        self._unsub = None
+
+    @property
+    def unique_id(self) -> str:
+        return f"{DOMAIN}:{self._device_id}:config_converge_time"
+
+    @property
+    def native_value(self) -> Any:
+        bridge = self._hass.data.get(DOMAIN, {}).get(self._entry.entry_id)
+        return bridge.get_config_status(self._device_id).get("converge_seconds") if bridge else None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+
+        @callback
+        def _on_status(device_id: str) -> None:
+            if device_id == self._device_id:
+                self.async_write_ha_state()
+
+        self._unsub = async_dispatcher_connect(self._hass, SIGNAL_CONFIG_STATUS_UPDATED, _on_status)
+
+    async def async_will_remove_from_hass(self) -> None:
+        if self._unsub:
+            try:
+                self._unsub()
+            finally:
+                self._unsub = None
@@ -0,0 +1,247 @@
+"""Reverse index from entity IDs to the profile widgets that reference them.
+
+Each profile is indexed on its own and re-indexed only when that profile
+changes, so the auto-mirror set, per-device snapshots and entity-rename
+handling never need a scan over every profile.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config_builder import _WIDGET_ENTITY_FIELDS, widget_entities
+from .grid import _layout_items
+
+# (profile_key, page index or None for the main grid, widget id)
+WidgetRef = Tuple[str, Optional[int], str]
+
+
+def _profile_body(prof: Dict[str, Any]) -> Dict[str, Any]:
+    # Unwrap single-key wrapper (e.g. {"main_panel": {...}})
+    if len(prof) == 1:
+        only = next(iter(prof.values()))
+        if isinstance(only, dict) and any(k in only for k in ("widgets", "ui", "pages", "layout", "dashboard", "grid")):
+            return only
+    return prof
+
+
+def _widget_id(w: Dict[str, Any], idx: int) -> str:
+    # Same fallback id as config_builder's widget normalization
+    ent = w.get("entity_id") or w.get("entity") or w.get("eid") or ""
+    ent = ent.strip() if isinstance(ent, str) else ""
+    wtype = w.get("type").strip().lower() if isinstance(w.get("type"), str) else ""
+    return str(w.get("id") or f"p:{idx}:{ent or wtype}")
+
+
+def scan_profile(prof: Any) -> Dict[str, Set[Tuple[Optional[int], str]]]:
+    """Map each entity in one profile to the (page, widget_id) places that use it."""
+    out: Dict[str, Set[Tuple[Optional[int], str]]] = {}
+    if not isinstance(prof, dict):
+        return out
+    body = _profile_body(prof)
+
+    def _add(ent: str, page: Optional[int], wid: str) -> None:
+        out.setdefault(ent, set()).add((page, wid))
+
+    def _widgets(widgets: Any, page: Optional[int]) -> None:
+        for idx, w in enumerate(widgets if isinstance(widgets, list) else []):
+            if isinstance(w, dict):
+                wid = _widget_id(w, idx)
+                for ent in widget_entities(w):
+                    _add(ent, page, wid)
+
+    scopes = [body] + [body[k] for k in ("ui", "dashboard") if isinstance(body.get(k), dict)]
+    for src in scopes:
+        _widgets(src.get("widgets"), None)
+        if isinstance(src.get("pages"), list):
+            for i, page in enumerate(src["pages"]):
+                if isinstance(page, dict):
+                    _widgets(page.get("widgets"), i)
+        if isinstance(src.get("layout"), list):
+            for name, x, y, _w, _h in _layout_items(src["layout"], src.get("widget_size") or [1, 1]):
+                ent = name.strip().lower()
+                if "." in ent:
+                    _add(ent, None, f"g:{x},{y}:{name}")
+    return out
+
+
+def rename_entity_in_profile(prof: Any, old: str, new: str) -> Tuple[Any, bool]:
+    """Return (profile, changed) with every widget/layout reference to ``old`` replaced by ``new``.
+
+    Only entity fields, camera overlay buttons and layout items are rewritten;
+    the input is not mutated.
+    """
+    old_l = old.lower()
+    changed = False
+
+    def _same(v: Any) -> bool:
+        return isinstance(v, str) and v.strip().lower() == old_l
+
+    def _widget(w: Any) -> Any:
+        nonlocal changed
+        if not isinstance(w, dict):
+            return w
+        out = w
+        for field in _WIDGET_ENTITY_FIELDS:
+            if _same(w.get(field)):
+                out = dict(out) if out is w else out
+                out[field] = new
+        ob = w.get("overlay_button")
+        if isinstance(ob, dict) and _same(ob.get("entity_id")):
+            out = dict(out) if out is w else out
+            out["overlay_button"] = {**ob, "entity_id": new}
+        if out is not w:
+            changed = True
+        return out
+
+    def _layout_item(item: Any) -> Any:
+        nonlocal changed
+        if not isinstance(item, str):
+            return item
+        i = item.find("(")
+        name = item[:i] if i > 0 else item
+        if _same(name):
+            changed = True
+            return new + (item[i:] if i > 0 else "")
+        return item
+
+    def _layout_row(row: Any) -> Any:
+        if isinstance(row, str):
+            parts = [p.strip() for p in row.split(",")]
+            renamed = [_layout_item(p) for p in parts]
+            return ", ".join(renamed) if renamed != parts else row
+        if isinstance(row, list):
+            return [_layout_item(p) for p in row]
+        return row
+
+    def _walk(node: Any) -> Any:
+        if not isinstance(node, dict):
+            return node
+        out = dict(node)
+        if isinstance(node.get("widgets"), list):
+            out["widgets"] = [_widget(w) for w in node["widgets"]]
+        if isinstance(node.get("pages"), list):
+            out["pages"] = [_walk(p) for p in node["pages"]]
+        if isinstance(node.get("layout"), list):
+            out["layout"] = [_layout_row(r) for r in node["layout"]]
+        for k in ("ui", "dashboard"):
+            if isinstance(node.get(k), dict):
+                out[k] = _walk(node[k])
+        return out
+
+    if not isinstance(prof, dict):
+        return prof, False
+    body = _profile_body(prof)
+    if body is prof:
+        result = _walk(prof)
+    else:
+        key = next(iter(prof))
+        result = {key: _walk(body)}
+    return (result, True) if changed else (prof, False)
+
+
+class EntityIndex:
+    """Incremental entity → {(profile_key, page, widget_id)} index over the profiles dict."""
+
+    def __init__(self) -> None:
+        self._by_profile: Dict[str, Dict[str, Set[Tuple[Optional[int], str]]]] = {}
+        self._fingerprint: Dict[str, Tuple[int, str]] = {}
+        self._profile_objs: Dict[str, Any] = {}
+        self._refs: Dict[str, Set[WidgetRef]] = {}
+
+    @staticmethod
+    def _hash(prof: Any) -> str:
+        try:
+            raw = json.dumps(prof, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        except (TypeError, ValueError):
+            raw = repr(prof)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def sync(self, profiles: Dict[str, Any]) -> Set[str]:
+        """Bring the index in line with ``profiles``; returns the keys that were (re)indexed or dropped.
+
+        Profiles that are the same object as last time are skipped outright;
+        others are re-scanned only if their content hash changed.
+        """
+        changed: Set[str] = set()
+        profiles = profiles or {}
+        for key in list(self._by_profile):
+            if key not in profiles:
+                self._drop(key)
+                changed.add(key)
+        for key, prof in profiles.items():
+            if self._profile_objs.get(key) is prof and key in self._by_profile:
+                continue
+            digest = self._hash(prof)
+            self._profile_objs[key] = prof
+            if key in self._by_profile and self._fingerprint.get(key, (0, ""))[1] == digest:
+                continue
+            self.set_profile(key, prof, digest=digest)
+            changed.add(key)
+        return changed
+
+    def sync_entities(self, entity_sets: Dict[str, List[str]]) -> Set[str]:
+        """Like ``sync``, from precomputed per-profile entity lists instead of bodies (lazy profile loading).
+
+        Widget places aren't known this way, so each reference is recorded as
+        ``(profile_key, None, "")``. A list that is the same object as last time is skipped.
+        """
+        changed: Set[str] = set()
+        for key in list(self._by_profile):
+            if key not in entity_sets:
+                self._drop(key)
+                changed.add(key)
+        for key, ents in entity_sets.items():
+            if self._profile_objs.get(key) is ents and key in self._by_profile:
+                continue
+            self._drop(key)
+            entries = {e: {(None, "")} for e in ents}
+            self._by_profile[key] = entries
+            self._fingerprint[key] = (len(entries), "")
+            self._profile_objs[key] = ents
+            for ent in entries:
+                self._refs.setdefault(ent, set()).add((key, None, ""))
+            changed.add(key)
+        return changed
+
+    def set_profile(self, key: str, prof: Any, *, digest: Optional[str] = None) -> None:
+        """(Re)index one profile."""
+        self._drop(key)
+        entries = scan_profile(prof)
+        self._by_profile[key] = entries
+        self._fingerprint[key] = (len(entries), digest or self._hash(prof))
+        self._profile_objs[key] = prof
+        for ent, places in entries.items():
+            refs = self._refs.setdefault(ent, set())
+            for page, wid in places:
+                refs.add((key, page, wid))
+
+    def _drop(self, key: str) -> None:
+        entries = self._by_profile.pop(key, None) or {}
+        self._fingerprint.pop(key, None)
+        self._profile_objs.pop(key, None)
+        for ent in entries:
+            refs = self._refs.get(ent)
+            if refs is None:
+                continue
+            refs.difference_update({r for r in refs if r[0] == key})
+            if not refs:
+                self._refs.pop(ent, None)
+
+    def entities(self) -> List[str]:
+        """Sorted entity IDs referenced by any indexed profile (the auto-mirror set)."""
+        return sorted(self._refs)
+
+    def refs(self, entity_id: str) -> Set[WidgetRef]:
+        return set(self._refs.get(entity_id.lower(), ()))
+
+    def profiles_using(self, entity_ids: Iterable[str]) -> Set[str]:
+        return {ref[0] for e in entity_ids for ref in self._refs.get(e.lower(), ())}
+
+    def profile_entities(self, key: str) -> Set[str]:
+        return set(self._by_profile.get(key, {}))
+
+    def profile_places(self, key: str, entity_id: str) -> Set[Tuple[Optional[int], str]]:
+        """(page, widget_id) places in one profile that use ``entity_id``."""
+        return set(self._by_profile.get(key, {}).get(entity_id.lower(), ()))
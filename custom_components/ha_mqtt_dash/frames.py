@@ -0,0 +1,152 @@
+"""Precomputed widget frames for clients that advertise ``frames``.
+
+Older iPads recompute grid geometry on every render. For devices that report
+their screen in hello and advertise the ``frames`` capability, the config
+carries absolute frames ``[left, top, width, height]`` (in the screen units the
+client reported, i.e. points) for every widget, for both orientations.
+
+Geometry follows the grid settings in the profile. A cell is
+``widget_dimensions`` (default 120x120). It is shrunk, keeping its aspect ratio,
+when the columns plus ``widget_margins`` (default 5x5) would not fit the screen
+width. The column count is ``grid.columns`` / ``columns`` / ``cols``, or else
+the widest widget extent. A widget at x,y spanning w,h cells starts at
+``margin + x * (cell + margin)`` and covers ``w * cell + (w - 1) * margin``.
+
+Results are cached per (grid geometry, screen) pair, so devices sharing a
+profile and screen size reuse one computation. The key is the widget
+positions, not the whole profile, so label or entity edits keep the cache warm.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+_DEFAULT_DIMENSIONS = (120.0, 120.0)
+_DEFAULT_MARGINS = (5.0, 5.0)
+_CACHE_MAX = 256
+
+_Signature = Tuple[Tuple[str, int, int, int, int], ...]
+_cache: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()
+# Configs may be compiled in executor threads
+_cache_lock = threading.Lock()
+
+
+def screen_key(screen: Any) -> Optional[Tuple[int, int]]:
+    """(short side, long side) of a hello ``screen`` dict, or None when unusable."""
+    if not isinstance(screen, dict):
+        return None
+    try:
+        w = int(float(screen.get("width")))
+        h = int(float(screen.get("height")))
+    except (TypeError, ValueError):
+        return None
+    if w <= 0 or h <= 0:
+        return None
+    return (min(w, h), max(w, h))
+
+
+def _pair(v: Any, default: Tuple[float, float]) -> Tuple[float, float]:
+    try:
+        a, b = float(v[0]), float(v[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        return default
+    return (a, b) if a > 0 and b >= 0 else default
+
+
+def _grid_params(ui: Dict[str, Any]) -> Tuple[Optional[int], Tuple[float, float], Tuple[float, float]]:
+    grid = ui.get("grid") if isinstance(ui.get("grid"), dict) else {}
+    cols = grid.get("columns") or ui.get("columns") or ui.get("cols")
+    cols = cols if isinstance(cols, int) and not isinstance(cols, bool) and cols > 0 else None
+    dims = _pair(grid.get("widget_dimensions") or ui.get("widget_dimensions"), _DEFAULT_DIMENSIONS)
+    margins = _pair(grid.get("widget_margins") or ui.get("widget_margins"), _DEFAULT_MARGINS)
+    return cols, dims, margins
+
+
+def _signature(widgets: Any) -> _Signature:
+    sig: List[Tuple[str, int, int, int, int]] = []
+    for w in widgets if isinstance(widgets, list) else []:
+        if not isinstance(w, dict) or not w.get("id"):
+            continue
+        try:
+            # Negative positions are clamped to the grid edge, as in config_builder and grid
+            sig.append((
+                str(w["id"]), max(0, int(w.get("x", 0))), max(0, int(w.get("y", 0))),
+                max(1, int(w.get("w", 1))), max(1, int(w.get("h", 1))),
+            ))
+        except (TypeError, ValueError):
+            continue
+    return tuple(sig)
+
+
+def _layout(
+    sig: _Signature, cols: int, dims: Tuple[float, float], margins: Tuple[float, float], width: int,
+) -> Dict[str, Any]:
+    mx, my = margins
+    cw, ch = dims
+    fit = (width - mx * (cols + 1)) / cols
+    if 0 < fit < cw:
+        ch = ch * fit / cw
+        cw = fit
+    frames = {
+        wid: [
+            round(mx + x * (cw + mx)),
+            round(my + y * (ch + my)),
+            round(w * cw + (w - 1) * mx),
+            round(h * ch + (h - 1) * my),
+        ]
+        for wid, x, y, w, h in sig
+    }
+    return {"cell": [round(cw, 2), round(ch, 2)], "widgets": frames}
+
+
+def grid_frames(ui: Dict[str, Any], widgets: Any, screen: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """``{"portrait": {...}, "landscape": {...}}`` frames for one grid (main or page), or None if empty."""
+    sig = _signature(widgets)
+    if not sig:
+        return None
+    cols, dims, margins = _grid_params(ui)
+    if cols is None:
+        cols = max(1, max(x + w for _id, x, _y, w, _h in sig))
+    key = (sig, cols, dims, margins, screen)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    short, long_ = screen
+    out = {
+        "portrait": _layout(sig, cols, dims, margins, short),
+        "landscape": _layout(sig, cols, dims, margins, long_),
+    }
+    with _cache_lock:
+        _cache[key] = out
+        if len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return out
+
+
+def apply_frames(ui: Dict[str, Any], screen: Any) -> Dict[str, Any]:
+    """Return a copy of a normalized ``ui`` with ``frames`` on it and on each page.
+
+    Returns ``ui`` unchanged when the screen is unknown. Cached results are
+    shared between documents; they are only ever serialized, never edited.
+    """
+    key = screen_key(screen)
+    if key is None or not isinstance(ui, dict):
+        return ui
+    out = dict(ui)
+    main = grid_frames(ui, ui.get("widgets"), key)
+    if main is not None:
+        out["frames"] = main
+    if isinstance(ui.get("pages"), list):
+        pages = []
+        for page in ui["pages"]:
+            if isinstance(page, dict):
+                pf = grid_frames(ui, page.get("widgets"), key)
+                if pf is not None:
+                    page = {**page, "frames": pf}
+            pages.append(page)
+        out["pages"] = pages
+    return out
+
@@ -0,0 +1,142 @@
+"""Grid occupancy checks for dashboard profiles.
+
+Widgets are marked cell by cell in a per-grid occupancy map, so finding every
+overlapping pair costs O(total cells) instead of comparing all widget pairs.
+Each page is its own grid; the flat ``widgets`` list and the layout shorthand
+share the main grid, matching how ``config_builder`` lays them out.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Larger spans are clamped: keeps a hostile w/h from turning validation into a memory bomb
+_MAX_SPAN = 64
+
+_Item = Tuple[str, int, int, int, int]  # (label, x, y, w, h)
+
+
+def _as_int(v: Any, default: int) -> Optional[int]:
+    if v is None:
+        return default
+    if isinstance(v, bool):
+        return None
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _widget_items(widgets: Any) -> List[_Item]:
+    items: List[_Item] = []
+    for idx, w in enumerate(widgets if isinstance(widgets, list) else []):
+        if not isinstance(w, dict):
+            continue
+        wtype = w.get("type")
+        if isinstance(wtype, str) and wtype.strip().lower() == "spacer":
+            continue
+        # Unusable values fall back to the defaults, as config_builder does
+        x = _as_int(w.get("x", w.get("col")), 0) or 0
+        y = _as_int(w.get("y", w.get("row")), 0) or 0
+        wi = _as_int(w.get("w", w.get("colspan")), 1) or 1
+        hi = _as_int(w.get("h", w.get("rowspan")), 1) or 1
+        ent = w.get("entity_id") or w.get("entity") or ""
+        label = str(w.get("id") or (ent.strip() if isinstance(ent, str) else "") or f"idx:{idx}")
+        # Negative positions are clamped to the grid edge, where config_builder and frames place them
+        items.append((label, max(0, x), max(0, y), min(max(1, wi), _MAX_SPAN), min(max(1, hi), _MAX_SPAN)))
+    return items
+
+
+def _layout_items(layout: Any, default_size: Any) -> List[_Item]:
+    """Positions generated by the ``layout`` shorthand (rows of "entity(WxH)" items)."""
+    try:
+        dw, dh = int(default_size[0]), int(default_size[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        dw, dh = 1, 1
+    items: List[_Item] = []
+    y = 0
+    for row in layout if isinstance(layout, list) else []:
+        if isinstance(row, str):
+            parts = [p.strip() for p in row.split(",")]
+        elif isinstance(row, list):
+            parts = row
+        elif isinstance(row, dict) and "empty" in row:
+            n = _as_int(row.get("empty"), 1)
+            y += max(0, n if n is not None else 1)
+            continue
+        else:
+            y += 1
+            continue
+        x = 0
+        for item in parts:
+            if not isinstance(item, str) or not item or item.lower() == "spacer":
+                x += 1
+                continue
+            w, h = dw, dh
+            name = item.strip()
+            i = item.find("(")
+            j = item.find(")", i + 1) if i >= 0 else -1
+            if i >= 0 and j > i:
+                inner = item[i + 1:j]
+                if "x" in inner:
+                    a, b = inner.split("x", 1)
+                    try:
+                        w, h = int(a), int(b)
+                    except ValueError:
+                        pass
+                if i > 0:
+                    name = item[:i].strip()
+            items.append((name, x, y, min(max(1, w), _MAX_SPAN), min(max(1, h), _MAX_SPAN)))
+            x += max(1, w)
+        y += 1
+    return items
+
+
+def _grid_overlaps(items: List[_Item], scope: str, out: List[str]) -> None:
+    occupied: Dict[Tuple[int, int], List[int]] = {}
+    for n, (label, x, y, w, h) in enumerate(items):
+        hits: List[int] = []
+        for cy in range(y, y + h):
+            for cx in range(x, x + w):
+                owners = occupied.setdefault((cx, cy), [])
+                for other in owners:
+                    if other not in hits:
+                        hits.append(other)
+                owners.append(n)
+        for other in hits:
+            pair = f"{items[other][0]} ↔ {label}"
+            out.append(f"{scope}: {pair}" if scope else pair)
+
+
+def find_widget_overlaps(profile: Dict[str, Any]) -> List[str]:
+    """Return "a ↔ b" descriptions of overlapping widgets; page overlaps are prefixed with their page path.
+
+    Accepts the same profile shapes as ``build_config_for_device``: a single-key
+    wrapper, top-level or ``ui`` widgets, ``ui``/top-level ``pages`` and the
+    ``dashboard``/``layout`` shorthand.
+    """
+    if not isinstance(profile, dict):
+        return []
+    prof = profile
+    if len(prof) == 1:
+        inner = next(iter(prof.values()))
+        if isinstance(inner, dict) and any(k in inner for k in ("widgets", "ui", "grid", "dashboard")):
+            prof = inner
+    ui = prof.get("ui") if isinstance(prof.get("ui"), dict) else {}
+    out: List[str] = []
+
+    widgets = prof.get("widgets") if isinstance(prof.get("widgets"), list) else ui.get("widgets")
+    main = _widget_items(widgets)
+    dash = prof.get("dashboard") if isinstance(prof.get("dashboard"), dict) else prof
+    layout = dash.get("layout") or ui.get("layout")
+    if isinstance(layout, list):
+        size = dash.get("widget_size") or ui.get("widget_size") or [1, 1]
+        main.extend(_layout_items(layout, size))
+    _grid_overlaps(main, "", out)
+
+    for key, pages in (("pages", prof.get("pages")), ("ui.pages", ui.get("pages"))):
+        if not isinstance(pages, list):
+            continue
+        for i, page in enumerate(pages):
+            if isinstance(page, dict):
+                _grid_overlaps(_widget_items(page.get("widgets")), f"{key}[{i}]", out)
+    return out
@@ -0,0 +1,129 @@
+"""Minimal JSON-Patch (RFC 6902 subset) diff/apply for config documents.
+
+Only ``add``, ``remove`` and ``replace`` are produced. Dicts are diffed key by key
+and lists index by index, which keeps edits such as a changed widget label down to
+a single ``replace`` op. ``merge_patch`` implements RFC 7386 merge patches, used
+for per-device overlays on group configs. Pure functions; safe to call from worker
+threads/processes.
+"""
+from __future__ import annotations
+
+import copy
+from typing import Any, Dict, List
+
+
+def _esc(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unesc(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _same(a: Any, b: Any) -> bool:
+    # True == 1 and 1 == 1.0 in Python, but they serialize differently
+    return type(a) is type(b) and a == b
+
+
+def _diff(a: Any, b: Any, path: str, ops: List[Dict[str, Any]]) -> None:
+    if isinstance(a, dict) and isinstance(b, dict):
+        for k in a:
+            if k not in b:
+                ops.append({"op": "remove", "path": f"{path}/{_esc(k)}"})
+        for k, v in b.items():
+            if k not in a:
+                ops.append({"op": "add", "path": f"{path}/{_esc(k)}", "value": v})
+            else:
+                _diff(a[k], v, f"{path}/{_esc(k)}", ops)
+        return
+    if isinstance(a, list) and isinstance(b, list):
+        common = min(len(a), len(b))
+        for i in range(common):
+            _diff(a[i], b[i], f"{path}/{i}", ops)
+        # Remove from the end backwards so earlier indexes stay valid
+        for i in range(len(a) - 1, common - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        for i in range(common, len(b)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": b[i]})
+        return
+    if not _same(a, b):
+        ops.append({"op": "replace", "path": path, "value": b})
+
+
+def make_patch(old: Any, new: Any) -> List[Dict[str, Any]]:
+    """Return the ops that turn ``old`` into ``new``."""
+    ops: List[Dict[str, Any]] = []
+    _diff(old, new, "", ops)
+    return ops
+
+
+def apply_patch(doc: Any, ops: List[Dict[str, Any]]) -> Any:
+    """Apply ``ops`` to a deep copy of ``doc`` and return the result.
+
+    Raises ValueError when an op does not fit the document.
+    """
+    out = copy.deepcopy(doc)
+    for op in ops or []:
+        kind = op.get("op")
+        path = op.get("path")
+        if not isinstance(path, str) or (path and not path.startswith("/")):
+            raise ValueError(f"invalid patch path: {path!r}")
+        if path == "":
+            if kind not in ("add", "replace"):
+                raise ValueError(f"unsupported root op: {kind!r}")
+            out = copy.deepcopy(op.get("value"))
+            continue
+        tokens = [_unesc(t) for t in path[1:].split("/")]
+        parent = out
+        try:
+            for t in tokens[:-1]:
+                parent = parent[int(t)] if isinstance(parent, list) else parent[t]
+        except (KeyError, IndexError, ValueError, TypeError) as exc:
+            raise ValueError(f"patch path not found: {path}") from exc
+        last = tokens[-1]
+        value = copy.deepcopy(op.get("value"))
+        if isinstance(parent, list):
+            try:
+                idx = len(parent) if last == "-" else int(last)
+                if kind == "add":
+                    if idx > len(parent):
+                        raise IndexError(idx)
+                    parent.insert(idx, value)
+                elif kind == "replace":
+                    parent[idx] = value
+                elif kind == "remove":
+                    del parent[idx]
+                else:
+                    raise ValueError(f"unsupported op: {kind!r}")
+            except IndexError as exc:
+                raise ValueError(f"patch index out of range: {path}") from exc
+        elif isinstance(parent, dict):
+            if kind in ("add", "replace"):
+                parent[last] = value
+            elif kind == "remove":
+                if last not in parent:
+                    raise ValueError(f"patch path not found: {path}")
+                del parent[last]
+            else:
+                raise ValueError(f"unsupported op: {kind!r}")
+        else:
+            raise ValueError(f"patch path not found: {path}")
+    return out
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply an RFC 7386 JSON Merge Patch and return the result.
+
+    ``null`` values delete keys, dicts merge recursively and anything else
+    (lists included) replaces. Neither input is mutated; untouched subtrees of
+    ``target`` are shared with the result.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    out = dict(target) if isinstance(target, dict) else {}
+    for k, v in patch.items():
+        if v is None:
+            out.pop(k, None)
+        else:
+            out[k] = merge_patch(out.get(k), v)
+    return out
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import multiprocessing
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, List, Optional, Set
 from homeassistant.helpers.storage import Store  # type: ignore
 from homeassistant.core import HomeAssistant, Event  # type: ignore
@@ -22,15 +26,44 @@ from .const import (
     CONF_PROFILES,
     CONF_MIRROR_ENTITIES,
     CONF_MIRROR_AUTO,
+    CONF_COMPILE_MODE,
+    COMPILE_MODE_AUTO, COMPILE_MODE_INLINE, COMPILE_MODE_THREAD, COMPILE_MODE_PROCESS,
+    CAP_BROADCAST,
+    CAP_DELTA,
     DOMAIN,
+    SIGNAL_CONFIG_STATUS_UPDATED,
     SIGNAL_DEVICE_SETTINGS_UPDATED,
     FIXED_CONFIG_BASE, FIXED_DEVICE_BASE, FIXED_COMMAND_BASE, FIXED_STATESTREAM_BASE,
+    FIXED_BROADCAST_TOPIC,
 )
-from .storage import StorageHelper
+from .storage import PROFILE_CACHE_SIZE, device_directory, get_storage_helper
+from .config_builder import (
+    build_device_doc,
+    build_manifest,
+    compile_device_configs,
+    compile_group_configs,
+    device_caps,
+    estimate_build_cost,
+    group_config_topic,
+    group_request_topic,
+    group_state_key,
+    resolve_profile_key,
+    usable_artifacts,
+)
+from .entity_index import EntityIndex, rename_entity_in_profile, scan_profile
+from .runtime import RuntimeSnapshot
+from .command_queue import REPUBLISH_PUBLISH, REPUBLISH_RELOAD, CommandQueue, serialized
 
 # Fixed mqttdash namespace (replaces legacy 'ha/*' topics). User configuration of bases removed.
 _LOGGER = logging.getLogger(__name__)
 
+# Auto compile mode: estimated widget builds per publish above which a process pool is used
+_PROCESS_POOL_MIN_WIDGETS = 20000
+_PROCESS_POOL_WORKERS = max(1, min(4, (os.cpu_count() or 1)))
+
+# Actions async_broadcast_action accepts
+_BROADCAST_ACTIONS = ("reload", "snapshot", "offboard")
+
 def _payload_to_str(msg) -> str:
     """Return payload as text, whether it's bytes, str, or None."""
     try:
@@ -48,77 +81,16 @@ def _payload_to_str(msg) -> str:
     # HA often gives str already
     return str(p)
 
-_WIDGET_ENTITY_FIELDS = (
-    "entity_id", "entity", "eid",
-    # Printer widget
-    "nozzle_entity", "bed_entity", "progress_entity", "status_entity",
-    # Sous vide widget
-    "temp_entity", "target_entity",
-    # Appliance / printer / sous vide shared
-    "time_entity",
-    # Generic program name sensor
-    "program_entity",
-)
+def _valid_group_name(group: str) -> bool:
+    """Group names become an MQTT topic level: non-empty, no separators or wildcards."""
+    return bool(group) and not any(c in group for c in "/+#")
 
 
-def _extract_entities_from_profiles(profiles: Dict[str, Any]) -> List[str]:
-    """Return sorted unique entity IDs referenced across all profile widget and layout definitions."""
-    entities: set = set()
-
-    def _scan_widget(w: dict) -> None:
-        """Extract all entity IDs from a single widget dict."""
-        if not isinstance(w, dict):
-            return
-        for field in _WIDGET_ENTITY_FIELDS:
-            v = w.get(field)
-            if isinstance(v, str) and "." in v:
-                entities.add(v.strip().lower())
-        # Camera overlay button entity
-        ob = w.get("overlay_button")
-        if isinstance(ob, dict):
-            v = ob.get("entity_id")
-            if isinstance(v, str) and "." in v:
-                entities.add(v.strip().lower())
-
-    def _collect_widgets(src: dict) -> None:
-        """Recursively collect widgets from a profile/ui/page dict."""
-        if not isinstance(src, dict):
-            return
-        # Flat widgets list
-        if isinstance(src.get("widgets"), list):
-            for w in src["widgets"]:
-                _scan_widget(w)
-        # Pages array — each page may have its own widgets list
-        if isinstance(src.get("pages"), list):
-            for page in src["pages"]:
-                if isinstance(page, dict):
-                    _collect_widgets(page)
-        # Layout shorthand: ["light.kitchen", "sensor.temp(2x1)", ...]
-        if isinstance(src.get("layout"), list):
-            for row in src["layout"]:
-                items = row if isinstance(row, list) else ([row] if isinstance(row, str) else [])
-                for item in items:
-                    if isinstance(item, str):
-                        ent = item.split("(")[0].strip().lower()
-                        if "." in ent and ent not in ("spacer",):
-                            entities.add(ent)
-
-    for prof in (profiles or {}).values():
-        if not isinstance(prof, dict):
-            continue
-        # Unwrap single-key wrapper (e.g. {"main_panel": {...}})
-        if len(prof) == 1:
-            only = next(iter(prof.values()))
-            if isinstance(only, dict) and any(k in only for k in ("widgets", "ui", "pages", "layout", "dashboard")):
-                prof = only
-        # Scan top-level and ui/dashboard sub-dicts
-        _collect_widgets(prof)
-        for key in ("ui", "dashboard"):
-            sub = prof.get(key)
-            if isinstance(sub, dict):
-                _collect_widgets(sub)
-
-    return sorted(entities)
+def _parse_caps(raw: Any) -> Optional[List[str]]:
+    """Normalize the hello 'caps' field to a sorted list; None if the client sent none."""
+    if not isinstance(raw, list):
+        return None
+    return sorted({c.strip().lower() for c in raw if isinstance(c, str) and c.strip()})
 
 
 class MqttBridge:
@@ -130,11 +102,23 @@ class MqttBridge:
         # Raw persisted config entry data/options snapshots
         self._data: Dict[str, Any] = dict(entry.data or {})
         self._opts: Dict[str, Any] = dict(entry.options or {})
-        # Public merged view used during runtime
-        self.cfg: Dict[str, Any] = {**self._data, **self._opts}
+        # (profiles, devices) generations _opts was built from by _store_options; None for raw entry options
+        self._opts_versions: Optional[tuple] = None
+        # Public merged view used during runtime; rebuilt only through _refresh_runtime()
+        self._runtime: RuntimeSnapshot = RuntimeSnapshot.build(self._data, self._opts)
+        # Shared HA Store helper for persistent data (profiles, device_settings)
+        self._storage_helper = get_storage_helper(self.hass, self.entry)
+        # Options written by the helper (profile mirror) must not come back as a user options change
+        self._storage_helper.on_options_mirror = self._on_options_mirrored
+        # Device records by device_id / GUID and purge markers; all device lookups and edits go here
+        self._directory = self._storage_helper.directory
 
         # Debounce delay for republish+reload operations (short for responsive UI saves)
         self._debounce_seconds: float = 0.25
+        # Single writer for device list / Store / options mutations; one refresh + republish per batch
+        self._commands = CommandQueue(
+            hass, before_batch=self._async_refresh_state, after_batch=self._async_batch_republish,
+        )
 
         # Subscription handles / timers
         self._unsubs: List[Any] = []
@@ -142,10 +126,11 @@ class MqttBridge:
 
         # Mirror tracking
         self._mirror_wanted: List[str] = []  # effective entity list (auto-derived or manual)
+        # entity -> {(profile, page, widget_id)}; re-indexes only profiles that changed
+        self._entity_index = EntityIndex()
+        self._entity_index_generation = 0  # profiles_generation the index was last synced at
         if self.cfg.get(CONF_MIRROR_AUTO):
-            self._last_mirror_set = set(_extract_entities_from_profiles(
-                dict(self.cfg.get(CONF_PROFILES, {}) or {})
-            ))
+            self._last_mirror_set = set(self._profile_entities())
         else:
             self._last_mirror_set = set(self.cfg.get(CONF_MIRROR_ENTITIES, []) or [])
         # Track last-published state and attributes per entity for proper retained dedupe/purge
@@ -156,7 +141,7 @@ class MqttBridge:
 
         # Track prior device id set to detect removals (for retained purge)
         self._last_device_ids = set(
-            [d.get("device_id") for d in self.cfg.get(CONF_DEVICES, []) or [] if d.get("device_id")]
+            [d.get("device_id") for d in self.cfg.devices if d.get("device_id")]
         )
 
         # Telemetry cache (per device)
@@ -169,11 +154,39 @@ class MqttBridge:
         # Debounced entry reload to make new/renamed devices appear immediately
         self._entry_reload_handle = None
         self._entry_reload_debounce_seconds: float = 0.25
-        # HA Store helper for persistent data (profiles, device_settings)
-        self._storage_helper = StorageHelper(self.hass, self.entry)
         self._storage = {"profiles": {}, "device_settings": {}}
         self._in_options_migration = False
         self._setup_complete = False
+        # Last published config per device: {"rev", "content_hash", "payload"?}. rev/hash persist in Store
+        self._config_state: Dict[str, Dict[str, Any]] = {}
+        # Wire encoding / chunk count last published per device (to clear stale retained variants)
+        self._published_encoding: Dict[str, Optional[str]] = {}
+        self._published_chunks: Dict[str, int] = {}
+        # Split-mode page hashes last published per device: {device_id: {page_index: sha256}}
+        self._published_pages: Dict[str, Dict[int, str]] = {}
+        # Applied-config reports from clients (config_status): {device_id: {"rev", "hash", "group_rev"?, "at"}}
+        self._applied: Dict[str, Dict[str, Any]] = {}
+        # Config hash published this session per device, when it went out, and seconds until the client confirmed it
+        self._published_hash: Dict[str, str] = {}
+        self._config_published_at: Dict[str, float] = {}
+        self._converge_seconds: Dict[str, float] = {}
+        # Device groups whose shared config is currently retained
+        self._published_groups: Set[str] = set()
+        # Lazily created worker processes for large-fleet config compilation
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def cfg(self) -> RuntimeSnapshot:
+        """Current immutable runtime snapshot (merged entry data + options); never copy or mutate it."""
+        return self._runtime
+
+    def _refresh_runtime(self) -> RuntimeSnapshot:
+        """Rebuild the runtime snapshot from _data/_opts; keeps the current one if nothing changed."""
+        prev = self._runtime
+        self._runtime = RuntimeSnapshot.build(self._data, self._opts, prev, self._opts_versions)
+        if self._runtime is not prev:
+            _LOGGER.debug("runtime snapshot: generation %d -> %d", prev.generation, self._runtime.generation)
+        return self._runtime
 
     def schedule_republish_reload(self, reason: str = "") -> None:
         """Debounce multiple rapid requests to republish configs & reload all devices."""
@@ -191,48 +204,85 @@ class MqttBridge:
         _LOGGER.debug("schedule_republish_reload: scheduled in %.2fs (%s)", self._debounce_seconds, reason)
 
     async def _do_republish_reload(self, reason: str = "") -> None:
-        import time
         self._republish_reload_handle = None
         if not self._republish_reload_pending:
             return
         self._republish_reload_pending = False
+        # Reload (non-retained) goes out before the new retained configs so devices clear first;
+        # delta-capable devices patch live instead. Batched with any other queued mutations.
+        await self._commands.submit(f"republish_reload:{reason}", refresh=True, republish=REPUBLISH_RELOAD)
+        _LOGGER.debug("republish_reload: completed for %d device(s) (%s)", len(self.cfg.devices), reason)
+
+    def _on_options_mirrored(self) -> None:
+        self._in_options_migration = True
+
+    def _store_options(self) -> Dict[str, Any]:
+        """Entry options with profiles and devices from the Store (canonical; options may hold less).
+
+        With lazy profile loading the profiles are ``{"hash", "size"}`` placeholders;
+        ``_profiles_for`` loads the bodies a compile needs. Sections whose Store
+        generation the snapshot already has are taken from the snapshot, not copied.
+        """
+        helper = self._storage_helper
+        versions = (helper.profiles_generation, helper.directory.generation)
+        runtime = self._runtime
+        opts = dict(self.entry.options or {})
+        if versions[0] == runtime.profiles_version:
+            opts[CONF_PROFILES] = runtime.profiles
+        else:
+            opts[CONF_PROFILES] = helper.profile_index() if helper.lazy else dict(helper.storage.get("profiles") or {})
+        if versions[1] == runtime.devices_version:
+            opts[CONF_DEVICES] = runtime.devices
+        else:
+            opts[CONF_DEVICES] = list(helper.get_devices())
+        self._opts_versions = versions
+        return opts
+
+    async def _profiles_for(
+        self, devices: List[Dict[str, Any]], groups: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """Profiles to compile ``devices`` (and ``groups``) with.
+
+        The snapshot's profiles, except in lazy mode, where the bodies these
+        devices and groups resolve to are loaded over the placeholders. The keys
+        stay the same, so profile resolution doesn't change.
+        """
+        profiles = self.cfg.profiles
+        helper = self._storage_helper
+        if not helper.lazy:
+            # A plain dict: the snapshot's read-only view can't be sent to the compile process pool
+            return dict(profiles)
+        all_groups = helper.get_groups()
+        keys = {resolve_profile_key(d, profiles, all_groups) for d in devices}
+        keys.update((gdef.get("profile") or name) for name, gdef in (groups or {}).items())
+        keys.discard(None)
+        return {**profiles, **await helper.async_get_profiles(keys)}
+
+    async def _async_refresh_state(self) -> None:
+        """Re-sync the Store mirror and rebuild the runtime snapshot from the entry (once per command batch)."""
         try:
-            # Refresh runtime config from latest entry and Store just before publishing
-            try:
-                # Reload HA Store to pick up any external writes (e.g., from options flow or services)
-                try:
-                    self._in_options_migration = True  # suppress listener reactions to mirror writes
-                    await self._storage_helper.async_init()
-                    self._storage = dict(self._storage_helper.storage)
-                finally:
-                    self._in_options_migration = False
-                latest_data = dict(self.entry.data or {})
-                latest_opts = dict(self.entry.options or {})
-                # Always source profiles from Store (canonical)
-                store_profs = dict(self._storage_helper.storage.get("profiles") or {})
-                latest_opts[CONF_PROFILES] = store_profs
-                self._data = latest_data
-                self._opts = latest_opts
-                self.cfg = {**self._data, **self._opts}
-                _LOGGER.debug(
-                    "republish_reload: refreshed cfg before publish (devices=%d profiles=%d)",
-                    len(self.cfg.get(CONF_DEVICES, []) or []),
-                    len((self.cfg.get(CONF_PROFILES, {}) or {}).keys()),
-                )
-            except Exception:
-                _LOGGER.exception("republish_reload: cfg refresh failed")
-            devices: List[Dict[str, Any]] = list(self.cfg.get(CONF_DEVICES, []) or [])
-                # First: send reload to devices (non-retained) so they clear and expect a new config
-            for d in devices:
-                did = (d.get("device_id") or "").strip()
-                if did:
-                    await self.async_publish_device_action(did, action="reload")
-            # Then: publish updated configs so subscribers receive the new retained payloads
-            await self.async_publish_all_configs()
-            self._last_republish_reload_sec = time.time()
-            _LOGGER.debug("republish_reload: completed for %d device(s) (%s)", len(devices), reason)
+            # The helper is shared with the options flow and services, so this reads memory, not disk.
+            # A mirror write it makes flags itself (see _on_options_mirrored)
+            await self._storage_helper.async_init()
+            self._storage = dict(self._storage_helper.storage)
+            # Always source profiles and devices from Store (canonical)
+            self._data = dict(self.entry.data or {})
+            self._opts = self._store_options()
+            self._refresh_runtime()
+            _LOGGER.debug(
+                "refresh_state: refreshed cfg (devices=%d profiles=%d)",
+                len(self.cfg.devices),
+                len(self.cfg.profiles),
+            )
         except Exception:
-            _LOGGER.exception("republish_reload: failure (%s)", reason)
+            _LOGGER.exception("refresh_state: cfg refresh failed")
+
+    async def _async_batch_republish(self, level: int) -> None:
+        """Single republish for a command batch; level REPUBLISH_RELOAD also sends reloads."""
+        reload = level >= REPUBLISH_RELOAD
+        await self.async_publish_all_configs(reload=reload)
+        if reload:
+            self._last_republish_reload_sec = time.time()
 
     def schedule_entry_reload(self, reason: str = "") -> None:
         """Debounce and reload the config entry to update HA devices/entities immediately."""
@@ -252,20 +302,27 @@ class MqttBridge:
     # ---------- lifecycle ----------
     async def async_setup(self) -> None:
         _LOGGER.debug("mqtt_bridge.setup: subscribing fixed bases cmd=%s dev=%s", FIXED_COMMAND_BASE, FIXED_DEVICE_BASE)
+        self._commands.start()
         self._unsubs.append(await mqtt.async_subscribe(self.hass, f"{FIXED_COMMAND_BASE}/#", self._on_cmd))
         self._unsubs.append(await mqtt.async_subscribe(self.hass, f"{FIXED_DEVICE_BASE}/+/request", self._on_device_request))
         self._unsubs.append(await mqtt.async_subscribe(self.hass, f"{FIXED_DEVICE_BASE}/+/hello", self._on_device_hello))
         self._unsubs.append(await mqtt.async_subscribe(self.hass, f"{FIXED_DEVICE_BASE}/+/telemetry/#", self._on_device_telemetry))
+        self._unsubs.append(await mqtt.async_subscribe(self.hass, f"{FIXED_DEVICE_BASE}/+/config_status", self._on_device_config_status))
+        # Follow entity renames so profiles keep pointing at the same entities
+        self._unsubs.append(self.hass.bus.async_listen(er.EVENT_ENTITY_REGISTRY_UPDATED, self._on_entity_registry_updated))
         # Initialize HA storage and migrate legacy options before first publish
         try:
             # Suppress options-updated reactions while Store mirrors to options during init
             self._in_options_migration = True
             await self._storage_helper.async_init()
             self._storage = dict(self._storage_helper.storage)
+            # Continue per-device config revisions from the last run
+            self._config_state = self._storage_helper.get_config_revs()
+            # Groups published by the last run, so ones deleted since get cleared
+            self._published_groups = {k.split("/", 1)[1] for k in self._config_state if k.startswith("group/")}
             # If Store has no profiles but the entry has initial profiles (e.g., from onboarding), seed the Store
             try:
-                profs_store = dict(self._storage.get("profiles") or {})
-                if not profs_store:
+                if not self._storage_helper.profile_keys():
                     initial_profiles = {}
                     try:
                         initial_profiles = dict((self.entry.data or {}).get(CONF_PROFILES) or {})
@@ -281,17 +338,15 @@ class MqttBridge:
                 _LOGGER.exception("mqtt_bridge.setup: failed to seed Store from entry profiles")
             # After storage init, ensure runtime cfg reflects canonical Store profiles
             try:
-                profs_store = dict(self._storage.get("profiles") or {})
-                self._opts = dict(self.entry.options or {})
-                # Always override profiles with Store copy for runtime
-                self._opts[CONF_PROFILES] = profs_store
-                _LOGGER.debug("mqtt_bridge.setup: using Store profiles for runtime (%d)", len(profs_store))
+                # Always override profiles and devices with the Store copy for runtime
+                self._opts = self._store_options()
+                _LOGGER.debug("mqtt_bridge.setup: using Store profiles for runtime (%d)", len(self._opts[CONF_PROFILES]))
                 self._data = dict(self.entry.data or {})
-                self.cfg = {**self._data, **self._opts}
+                self._refresh_runtime()
                 _LOGGER.debug(
                     "mqtt_bridge.setup: runtime cfg ready (devices=%d profiles=%d)",
-                    len(self.cfg.get(CONF_DEVICES, []) or []),
-                    len((self.cfg.get(CONF_PROFILES, {}) or {}).keys()),
+                    len(self.cfg.devices),
+                    len(self.cfg.profiles),
                 )
             except Exception:
                 _LOGGER.exception("post-storage init cfg merge failed")
@@ -305,9 +360,12 @@ class MqttBridge:
         self._setup_complete = True
         # After HA startup, publish a full snapshot to ensure devices get initial states
         async def _on_started(_event):
+            await self._commands.submit("startup", _startup)
+
+        async def _startup():
             try:
                 _LOGGER.debug("mqtt_bridge: HA started -> refreshing Store and publishing configs")
-                # Reload Store to ensure final state after startup
+                # Re-sync Store state after startup (in memory; the Store was loaded in setup)
                 try:
                     await self._storage_helper.async_init()
                     self._storage = dict(self._storage_helper.storage)
@@ -315,15 +373,13 @@ class MqttBridge:
                     _LOGGER.exception("startup: storage re-init failed")
                 # Rebuild runtime cfg strictly from Store and publish configs
                 try:
-                    profs_store = dict(self._storage.get("profiles") or {})
-                    self._opts = dict(self.entry.options or {})
-                    self._opts[CONF_PROFILES] = profs_store
+                    self._opts = self._store_options()
                     self._data = dict(self.entry.data or {})
-                    self.cfg = {**self._data, **self._opts}
+                    self._refresh_runtime()
                     _LOGGER.debug(
                         "startup: runtime cfg built from Store (devices=%d profiles=%d)",
-                        len(self.cfg.get(CONF_DEVICES, []) or []),
-                        len((self.cfg.get(CONF_PROFILES, {}) or {}).keys()),
+                        len(self.cfg.devices),
+                        len(self.cfg.profiles),
                     )
                 except Exception:
                     _LOGGER.exception("startup: cfg rebuild failed")
@@ -344,16 +400,22 @@ class MqttBridge:
         """
         try:
             data = dict(self._storage_helper.storage or {})
+            data.update(self._directory.as_store())
         except Exception:
             data = {"profiles": {}, "device_settings": {}}
-        profiles = data.get("profiles") or {}
         dev_settings = data.get("device_settings") or {}
-        pkeys = list(profiles.keys()) if isinstance(profiles, dict) else []
+        # Every key, including profiles not loaded in lazy mode
+        pkeys = self._storage_helper.profile_keys()
         dkeys = list(dev_settings.keys()) if isinstance(dev_settings, dict) else []
         _LOGGER.info(
             "dump_store: profiles=%d keys=%s device_settings=%d device_ids=%s",
             (len(pkeys) if isinstance(pkeys, list) else 0), pkeys, (len(dkeys) if isinstance(dkeys, list) else 0), dkeys,
         )
+        _LOGGER.info(
+            "dump_store: store writes requested=%d performed=%d; command batches=%s",
+            self._storage_helper.stats["writes_requested"], self._storage_helper.stats["writes_performed"],
+            self._commands.stats,
+        )
         # Pretty JSON (truncate in logs); full content if publishing
         try:
             pretty = json.dumps(data, indent=2, ensure_ascii=False)
@@ -372,10 +434,57 @@ class MqttBridge:
             except Exception:
                 _LOGGER.exception("dump_store: publish failed")
 
+    @serialized()
+    async def async_export_store(self, path: str) -> Dict[str, int]:
+        """Stream the Store to a JSON Lines file (gzip when ``path`` ends in .gz)."""
+        return await self._storage_helper.async_export(path)
+
+    @serialized()
+    async def async_import_store(self, path: str, *, replace: bool = False) -> Dict[str, int]:
+        """Load a Store export, then republish and reload devices."""
+        counts = await self._storage_helper.async_import(path, replace=replace)
+        self.schedule_republish_reload("import_store")
+        return counts
+
+    @serialized()
+    async def async_rollback_profile(self, profile: str, steps: int = 1) -> bool:
+        """Restore a profile from its revision history, then republish and reload devices."""
+        history = await self._storage_helper.async_get_profile_history(profile)
+        _LOGGER.debug("rollback_profile: %s has %d revision(s): %s", profile, len(history), history)
+        if await self._storage_helper.async_rollback_profile(profile, steps) is None:
+            return False
+        self.schedule_republish_reload("rollback_profile")
+        return True
+
+    @serialized()
+    async def async_set_device_profile(self, device_id: str, profile: Dict[str, Any]) -> None:
+        """Store ``profile`` under the device's id (canonical Store, mirrored to options), then republish and reload."""
+        try:
+            await self._storage_helper.async_update_profiles({device_id: profile})
+            _LOGGER.debug("set_device_profile: persisted to Store for %s (keys=%s)", device_id, self._storage_helper.profile_keys())
+        except Exception:
+            _LOGGER.exception("set_device_profile: failed to persist Store for %s", device_id)
+        # Republish+reload so the device sees the change quickly
+        self.schedule_republish_reload("set_device_profile")
+
+    @serialized(refresh=True, republish=REPUBLISH_PUBLISH)
+    async def async_push_config(self) -> None:
+        """Republish every device's retained config once the current command batch is done."""
+
+    @serialized(refresh=True)
+    async def async_remove_device(self, device_id: str) -> None:
+        """HA 'Delete device': mark the device (and its GUID) purged so a hello can't recreate it, then purge it."""
+        guid = (self._directory.get(device_id) or {}).get("guid")
+        try:
+            await self._storage_helper.add_purged(device_id=device_id, guid=(guid if isinstance(guid, str) else None))
+        except Exception:
+            _LOGGER.debug("remove_device: could not persist purged marker for %s", device_id, exc_info=True)
+        await self.async_purge_device(device_id)
+
     async def async_dump_runtime_cfg(self, publish: bool = False, topic: Optional[str] = None) -> None:
         """Log current merged runtime configuration (self.cfg). Optionally publish as JSON."""
         try:
-            cfg_now = dict(self.cfg or {})
+            cfg_now = self.cfg.as_dict()
         except Exception:
             cfg_now = {}
         # Summaries
@@ -434,6 +543,7 @@ class MqttBridge:
         return
 
     async def async_unload(self) -> None:
+        await self._commands.async_stop()
         for u in self._unsubs:
             try: u()
             except Exception: pass
@@ -442,7 +552,10 @@ class MqttBridge:
             try: self._mirror_unsub()
             except Exception: pass
             self._mirror_unsub = None
+        self._shutdown_process_pool()
+        await self._storage_helper.async_flush()
 
+    @serialized()
     async def async_options_updated(self, updated_entry: ConfigEntry) -> None:
         # Avoid re-entrant loops when we update options internally to mirror Store
         if getattr(self, "_in_options_migration", False):
@@ -453,6 +566,7 @@ class MqttBridge:
         # Always merge data+options; never drop existing profiles/devices on partial updates
         self._data = dict(updated_entry.data or {})
         self._opts = dict(updated_entry.options or {})
+        self._opts_versions = None
         # Persist incoming profiles (if any) to Store; runtime will always use Store thereafter
         try:
             incoming_profiles = self._opts.get(CONF_PROFILES)
@@ -461,26 +575,32 @@ class MqttBridge:
                 self._storage = dict(self._storage_helper.storage)
         except Exception:
             _LOGGER.exception("options_updated: persist to store failed")
-        # Force runtime profiles to Store copy
+        # Device edits (options flow) arrive as directory entries; merge them into the Store records
+        try:
+            incoming_devices = {**self._data, **self._opts}.get(CONF_DEVICES)
+            if isinstance(incoming_devices, list):
+                self._storage_helper.set_devices(self._storage_helper.merge_device_directory(incoming_devices))
+        except Exception:
+            _LOGGER.exception("options_updated: persist devices to store failed")
+        # Force runtime profiles and devices to Store copy
         try:
-            store_profs = dict(self._storage_helper.storage.get("profiles") or {})
-            self._opts[CONF_PROFILES] = store_profs
+            self._opts = self._store_options()
         except Exception:
             _LOGGER.exception("options_updated: load store profiles failed")
-        self.cfg = {**self._data, **self._opts}
+        self._refresh_runtime()
         _LOGGER.debug(
             "options_updated: merged keys data=%s options=%s",
             list((updated_entry.data or {}).keys()), list((updated_entry.options or {}).keys()),
         )
         _LOGGER.debug(
             "mqtt_bridge.options_updated: devices=%d profiles=%d mirror=%d",
-            len(self.cfg.get(CONF_DEVICES, []) or []),
-            len((self.cfg.get(CONF_PROFILES, {}) or {}).keys()),
+            len(self.cfg.devices),
+            len(self.cfg.profiles),
             len(self.cfg.get(CONF_MIRROR_ENTITIES, []) or []),
         )
 
         if self.cfg.get(CONF_MIRROR_AUTO):
-            new_mirror = set(_extract_entities_from_profiles(dict(self.cfg.get(CONF_PROFILES, {}) or {})))
+            new_mirror = set(self._profile_entities())
         else:
             new_mirror = set(self.cfg.get(CONF_MIRROR_ENTITIES, []) or [])
         removed_mirror = self._last_mirror_set - new_mirror
@@ -490,7 +610,7 @@ class MqttBridge:
         self._last_mirror_set = new_mirror
 
         # Purge configs for devices removed from options
-        current_ids: Set[str] = set([d.get("device_id") for d in self.cfg.get(CONF_DEVICES, []) or [] if d.get("device_id")])
+        current_ids: Set[str] = set([d.get("device_id") for d in self.cfg.devices if d.get("device_id")])
         removed_devices = self._last_device_ids - current_ids
         added_devices = current_ids - self._last_device_ids
         # Respect user option for placeholder behavior; default False to avoid ghosts
@@ -504,23 +624,12 @@ class MqttBridge:
 
         # Cleanup unused profiles to avoid stale/unreferenced keys lingering
         try:
-            # Use helper to prune unused profiles in Store and mirror to options
-            profs = dict(self._storage_helper.storage.get("profiles") or {})
-            devs = list(self.cfg.get(CONF_DEVICES, []) or [])
-            remaining = await self._storage_helper.prune_unused_profiles(profs, devs)
+            # Use helper to prune unused profiles in Store; it also mirrors the rest (or their index) to options
+            await self._storage_helper.prune_unused_profiles(list(self.cfg.devices))
             # Update local caches
             self._storage = dict(self._storage_helper.storage)
-            # Mirror newest Store profiles back to options for UI, without triggering loops
-            try:
-                self._in_options_migration = True
-                new_opts = {**(self.entry.options or {})}
-                new_opts[CONF_PROFILES] = dict(remaining)
-                self.hass.config_entries.async_update_entry(self.entry, options=new_opts)
-                self._opts = dict(new_opts)
-                self._opts[CONF_PROFILES] = dict(remaining)
-                self.cfg = {**self._data, **self._opts}
-            except Exception:
-                _LOGGER.exception("mirror to options failed")
+            self._opts = self._store_options()
+            self._refresh_runtime()
         except Exception:
             _LOGGER.exception("profile prune failed")
         # Always republish configs on any options change (profiles, devices, topics)
@@ -528,47 +637,288 @@ class MqttBridge:
         # Mirror subscriptions may have changed
         await self._maybe_start_mirror(publish_snapshot=False)
         # Profiles already persisted above (if provided); ensure runtime uses Store copy
-        # Trigger immediate republish using the refreshed cfg
-        self._republish_reload_pending = True
-        await self._do_republish_reload("options_updated")
+        # Republish using the refreshed cfg once this command batch is applied
+        self._commands.request_republish(REPUBLISH_RELOAD)
 
     # ---------- retained config ----------
-    async def async_publish_all_configs(self) -> None:
-        # Use latest merged in-memory config (self.cfg) so we include any disk-loaded profiles
-        # even before ConfigEntry.options round-trips through HA.
-        cfg_now: Dict[str, Any] = dict(self.cfg or {})
+    async def async_publish_all_configs(
+        self, *, reload: bool = False, device_ids: Optional[List[str]] = None
+    ) -> None:
+        """Compile and publish retained configs for every device (or only ``device_ids``).
+
+        With ``reload=True`` devices are sent a transient ``reload`` first, except
+        those that can apply the change live (a delta was published) or whose
+        delta-capable client already holds the current revision.
+        """
+        # Use the latest runtime snapshot so we include any disk-loaded profiles
+        # even before ConfigEntry.options round-trips through HA. Shared, not copied.
+        snap = self.cfg
         base_cfg = FIXED_CONFIG_BASE
-        devices: List[Dict[str, Any]] = list(cfg_now.get(CONF_DEVICES, []) or [])
-        _LOGGER.debug("publishing configs: %d device(s) to fixed base %s", len(devices), base_cfg)
-        for dev in devices:
-            device_id = (dev.get("device_id") or "").strip()
-            if not device_id:
-                continue
-            doc = self._build_config_for_device(dev, cfg_now)
-            try:
-                payload = json.dumps(doc, separators=(",", ":"))
-            except Exception as ex:
-                _LOGGER.warning("config JSON encode failed for %s: %s", device_id, ex)
+        devices: List[Dict[str, Any]] = list(snap.devices)
+        if device_ids is not None:
+            wanted_ids = set(device_ids)
+            devices = [d for d in devices if d.get("device_id") in wanted_ids]
+        groups = self._storage_helper.get_groups()
+        overlays = self._storage_helper.get_group_overlays()
+        lazy = self._storage_helper.lazy
+        _LOGGER.debug(
+            "publishing configs: %d device(s) %d group(s) to fixed base %s (%d profiles%s)",
+            len(devices), len(groups), base_cfg, len(snap.profiles), ", loaded on demand" if lazy else "",
+        )
+        # Build+encode off the loop (per compile mode); publish from the loop afterwards.
+        # With lazy profiles, devices compile a cache-full at a time so only their profiles get loaded
+        profiles = await self._profiles_for([], groups)
+        group_results = await self._async_compile_group_configs(groups, profiles, self._usable_artifacts(profiles))
+        results: List[Dict[str, Any]] = []
+        step = PROFILE_CACHE_SIZE if lazy else max(1, len(devices))
+        for i in range(0, len(devices), step):
+            chunk = devices[i:i + step]
+            profiles = await self._profiles_for(chunk)
+            artifacts = self._usable_artifacts(profiles)
+            results.extend(await self._async_compile_configs(chunk, profiles, groups, overlays, artifacts))
+        if reload:
+            caps_by_id = {(d.get("device_id") or "").strip(): device_caps(d) for d in devices}
+            to_reload: List[str] = []
+            for res in results:
+                live = res.get("delta") is not None or (
+                    not res.get("changed") and CAP_DELTA in caps_by_id.get(res["device_id"], set())
+                ) or self._applied_hash(res["device_id"]) == res.get("hash")
+                if not live:
+                    to_reload.append(res["device_id"])
+            await self._async_send_action("reload", to_reload)
+        # Group configs go first so member documents never point at a missing group topic
+        revs_changed = await self._publish_group_configs(group_results)
+        republished: List[str] = []
+        for res in results:
+            if res.get("payload") is None:
                 continue
+            did = res["device_id"]
+            # Skip devices that confirmed this exact document after we published it this session
+            if not (self._published_hash.get(did) == res["hash"] and self._applied_hash(did) == res["hash"]):
+                await self._publish_compiled_config(res)
+            prev = self._config_state.get(did) or {}
+            if prev.get("rev") != res["rev"] or prev.get("content_hash") != res["content_hash"]:
+                revs_changed = True
+            self._config_state[did] = {
+                "rev": res["rev"], "content_hash": res["content_hash"], "hash": res["hash"], "payload": res["payload"],
+            }
+            if self._published_hash.get(did) != res["hash"]:
+                # New document for this device: restart its convergence clock
+                self._published_hash[did] = res["hash"]
+                self._config_published_at[did] = time.time()
+                self._converge_seconds.pop(did, None)
+                republished.append(did)
+        for did in republished:
+            async_dispatcher_send(self.hass, SIGNAL_CONFIG_STATUS_UPDATED, did)
+        if revs_changed:
             try:
-                import hashlib
-                phash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+                await self._storage_helper.set_config_revs({
+                    did: {"rev": st["rev"], "content_hash": st["content_hash"]}
+                    for did, st in self._config_state.items()
+                })
             except Exception:
-                phash = ""
+                _LOGGER.debug("config revs persist failed", exc_info=True)
+
+    async def _publish_group_configs(self, group_results: List[Dict[str, Any]]) -> bool:
+        """Publish changed group configs and clear groups that no longer exist.
+
+        Returns True when the stored revision state changed.
+        """
+        changed = False
+        now = {res["group"] for res in group_results}
+        for res in group_results:
+            key = group_state_key(res["group"])
+            prev = self._config_state.get(key) or {}
+            if prev.get("content_hash") == res["content_hash"] and res["group"] in self._published_groups:
+                continue
+            topic = group_config_topic(res["group"])
+            _LOGGER.debug("mqtt_bridge.publish_config: %s rev=%s bytes=%d", topic, res["rev"], len(res["payload"]))
+            await mqtt.async_publish(self.hass, topic, res["payload"], qos=0, retain=True)
+            self._config_state[key] = {"rev": res["rev"], "content_hash": res["content_hash"]}
+            changed = changed or prev.get("rev") != res["rev"] or prev.get("content_hash") != res["content_hash"]
+        for group in list(self._published_groups - now):
+            await mqtt.async_publish(self.hass, group_config_topic(group), "", qos=0, retain=True)
+            self._config_state.pop(group_state_key(group), None)
+            changed = True
+        self._published_groups = now
+        return changed
+
+    async def _publish_compiled_config(self, res: Dict[str, Any]) -> None:
+        """Publish one compiled config using the encoding negotiated with the device."""
+        base_cfg = FIXED_CONFIG_BASE
+        device_id = res["device_id"]
+        phash = res.get("hash") or ""
+        prev_encoding = self._published_encoding.get(device_id)
+        prev_chunks = self._published_chunks.get(device_id, 0)
+        await self._publish_config_pages(device_id, res.get("pages") or [])
+        if res.get("delta") is not None:
+            # Live patch for connected clients; the retained full document below serves cold starts
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/delta", res["delta"], qos=0, retain=False)
+            _LOGGER.debug("mqtt_bridge.publish_config: %s/%s/delta rev=%s bytes=%d", base_cfg, device_id, res.get("rev"), len(res["delta"]))
+        if not res.get("encoding"):
+            payload = res["payload"]
             topic = f"{base_cfg}/{device_id}/config"
             _LOGGER.debug("mqtt_bridge.publish_config: %s bytes=%d hash=%s", topic, len(payload), phash[:12])
-            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/config", payload, qos=0, retain=True)
+            await mqtt.async_publish(self.hass, topic, payload, qos=0, retain=True)
+            if prev_encoding:
+                # Device dropped compression support: clear the compressed variant
+                await self._clear_chunked_config(device_id, prev_chunks)
+            self._published_encoding[device_id] = None
+            return
+        chunks: List[bytes] = list(res.get("chunks") or [])
+        manifest = build_manifest(res)
+        for i, chunk in enumerate(chunks):
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/chunk/{i}", chunk, qos=0, retain=True)
+        # Stale trailing chunks from a previously larger config
+        for i in range(len(chunks), prev_chunks):
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/chunk/{i}", "", qos=0, retain=True)
+        # Manifest last so a client reacting to it finds every chunk already retained
+        await mqtt.async_publish(
+            self.hass, f"{base_cfg}/{device_id}/manifest", json.dumps(manifest, separators=(",", ":")), qos=0, retain=True,
+        )
+        _LOGGER.debug(
+            "mqtt_bridge.publish_config: %s/%s/manifest encoding=%s chunks=%d bytes=%d raw=%d hash=%s",
+            base_cfg, device_id, manifest["encoding"], manifest["chunks"], manifest["bytes"], manifest["raw_bytes"], phash[:12],
+        )
+        if prev_encoding != res.get("encoding"):
+            # First compressed publish for this device: drop the stale plain retained config
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/config", "", qos=0, retain=True)
+        self._published_encoding[device_id] = res.get("encoding")
+        self._published_chunks[device_id] = len(chunks)
+
+    async def _publish_config_pages(self, device_id: str, pages: List[Dict[str, Any]]) -> None:
+        """Publish split pages whose content changed; clear pages that no longer exist.
+
+        Runs before the index is published so every page it lists is already retained.
+        """
+        base_cfg = FIXED_CONFIG_BASE
+        prev: Dict[int, str] = self._published_pages.get(device_id, {})
+        now: Dict[int, str] = {}
+        for page in pages:
+            n = page["index"]
+            now[n] = page["hash"]
+            if prev.get(n) == page["hash"]:
+                continue
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/page/{n}", page["payload"], qos=0, retain=True)
+            _LOGGER.debug("mqtt_bridge.publish_config: %s/%s/page/%d bytes=%d", base_cfg, device_id, n, len(page["payload"]))
+        for n in prev:
+            if n not in now:
+                await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/page/{n}", "", qos=0, retain=True)
+        if now:
+            self._published_pages[device_id] = now
+        else:
+            self._published_pages.pop(device_id, None)
+
+    async def _clear_chunked_config(self, device_id: str, chunks: int) -> None:
+        base_cfg = FIXED_CONFIG_BASE
+        await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/manifest", "", qos=0, retain=True)
+        for i in range(max(1, chunks)):
+            await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/chunk/{i}", "", qos=0, retain=True)
+        self._published_chunks.pop(device_id, None)
+
+    def _resolve_compile_mode(self, devices: List[Dict[str, Any]], profiles: Dict[str, Any]) -> str:
+        mode = self.cfg.get(CONF_COMPILE_MODE) or COMPILE_MODE_AUTO
+        if mode != COMPILE_MODE_AUTO:
+            return mode
+        cost = estimate_build_cost(devices, profiles)
+        return COMPILE_MODE_PROCESS if cost >= _PROCESS_POOL_MIN_WIDGETS else COMPILE_MODE_THREAD
+
+    def _usable_artifacts(self, profiles: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Stored profile artifacts that still match ``profiles`` (the rest compile on the fly)."""
+        storage = self._storage_helper.storage
+        return usable_artifacts(profiles, self._storage_helper.get_artifacts(), storage.get("profiles") or {})
+
+    async def _async_compile_group_configs(
+        self,
+        groups: Dict[str, Dict[str, Any]],
+        profiles: Dict[str, Any],
+        artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Compile one shared config per group (one build per group, so never worth a process)."""
+        if not groups:
+            return []
+        prev_state = {group_state_key(g): dict(self._config_state[group_state_key(g)])
+                      for g in groups if group_state_key(g) in self._config_state}
+        if (self.cfg.get(CONF_COMPILE_MODE) or COMPILE_MODE_AUTO) == COMPILE_MODE_INLINE:
+            return compile_group_configs(groups, profiles, prev_state, artifacts)
+        return await self.hass.async_add_executor_job(compile_group_configs, groups, profiles, prev_state, artifacts)
+
+    async def _async_compile_configs(
+        self,
+        devices: List[Dict[str, Any]],
+        profiles: Dict[str, Any],
+        groups: Optional[Dict[str, Dict[str, Any]]] = None,
+        overlays: Optional[Dict[str, Dict[str, Any]]] = None,
+        artifacts: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run compile_device_configs according to the configured compile mode."""
+        if not devices:
+            return []
+        mode = self._resolve_compile_mode(devices, profiles)
+        _LOGGER.debug("compile_configs: mode=%s devices=%d", mode, len(devices))
+        if mode == COMPILE_MODE_PROCESS:
+            try:
+                pool = self._get_process_pool()
+                loop = asyncio.get_running_loop()
+                # One slice per worker keeps profile pickling to once per worker
+                n = max(1, min(len(devices), _PROCESS_POOL_WORKERS))
+                slices = [devices[i::n] for i in range(n)]
+                parts = await asyncio.gather(*[
+                    loop.run_in_executor(pool, compile_device_configs, sl, profiles, self._prev_state_for(sl), groups, overlays, artifacts)
+                    for sl in slices
+                ])
+                # Restore input order (slices were interleaved)
+                order = {(d.get("device_id") or "").strip(): i for i, d in enumerate(devices)}
+                merged = [r for part in parts for r in part]
+                merged.sort(key=lambda r: order.get(r["device_id"], 0))
+                return merged
+            except Exception:
+                _LOGGER.warning("compile_configs: process pool failed; falling back to thread executor", exc_info=True)
+                self._shutdown_process_pool()
+                mode = COMPILE_MODE_THREAD
+        prev_state = self._prev_state_for(devices)
+        if mode == COMPILE_MODE_THREAD:
+            return await self.hass.async_add_executor_job(
+                compile_device_configs, devices, profiles, prev_state, groups, overlays, artifacts,
+            )
+        return compile_device_configs(devices, profiles, prev_state, groups, overlays, artifacts)
+
+    def _prev_state_for(self, devices: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Last-published rev/hash/payload for the given devices (input to compile_device_configs)."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for d in devices:
+            did = (d.get("device_id") or "").strip()
+            st = self._config_state.get(did)
+            if st:
+                out[did] = dict(st)
+        return out
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # spawn: forking the multi-threaded HA process is unsafe
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=_PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._process_pool
+
+    def _shutdown_process_pool(self) -> None:
+        pool = self._process_pool
+        self._process_pool = None
+        if pool is not None:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                _LOGGER.debug("process pool shutdown failed", exc_info=True)
 
     async def async_dump_device_config(self, device_id: str, publish: bool = False, topic: Optional[str] = None) -> None:
         """Build and log the exact config JSON for a single device; optionally publish it."""
         try:
-            cfg_now: Dict[str, Any] = dict(self.cfg or {})
-            devs: List[Dict[str, Any]] = list(cfg_now.get(CONF_DEVICES, []) or [])
-            dev = next((d for d in devs if (d.get("device_id") or "").strip() == device_id.strip()), None)
+            dev = self._directory.get(device_id.strip())
             if not dev:
                 _LOGGER.warning("dump_device_config: device %s not found in devices list", device_id)
                 return
-            doc = self._build_config_for_device(dev, cfg_now)
+            doc = self._build_config_for_device(dev, await self._profiles_for([dev]))
             pretty = json.dumps(doc, indent=2, ensure_ascii=False)
             _LOGGER.info("dump_device_config(%s): %s", device_id, pretty)
             if publish:
@@ -578,559 +928,51 @@ class MqttBridge:
         except Exception:
             _LOGGER.exception("dump_device_config failed for %s", device_id)
 
-    def _build_config_for_device(self, dev: Dict[str, Any], cfg_now: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        device_id = dev.get("device_id") or ""
-        profile_name = dev.get("profile") or ""
-        src_cfg = cfg_now if cfg_now is not None else self.cfg
-        profiles: Dict[str, Any] = dict(src_cfg.get(CONF_PROFILES, {}) or {})
-        # Device-specific profiles: prefer profile keyed by device_id
-        prof = profiles.get(device_id)
-        if not prof and profile_name:
-            prof = profiles.get(profile_name)
-        try:
-            _LOGGER.debug(
-                "build_config: device=%s profile_key=%s found=%s", device_id, profile_name or device_id, bool(prof)
-            )
-        except Exception:
-            pass
-        # Harden: if no profile assigned but exactly one profile exists, auto-assign it
-        if not prof and len(profiles) == 1:
-            try:
-                only_name, only_prof = next(iter(profiles.items()))
-                prof = only_prof
-                _LOGGER.debug("auto-assigning lone profile '%s' to %s", only_name, device_id)
-            except Exception:
-                pass
-        # Or use a profile named "default" if present
-        if not prof and "default" in profiles:
-            prof = profiles.get("default")
-        base_dev = FIXED_DEVICE_BASE
-
-        if not prof:
-            _LOGGER.debug("build_config: no profile -> publishing unassigned placeholder for %s", device_id)
-            return {
-                "device_id": device_id,
-                # Device settings are not part of profile config anymore; app receives only UI + topics
-                "ui": { "widgets": [], "banner": f"unassigned: set profile in HA for {device_id}" },
-                "topics": {
-                    "settings": f"{base_dev}/{device_id}/settings",
-                    "hello":    f"{base_dev}/{device_id}/hello",
-                    "status":   f"{base_dev}/{device_id}/status",
-                },
-            }
-
-        # Normalize profile -> app config schema expected by iOS client
-        # App expects: { device_id, device:{...}, ui:{ widgets:[], grid?, ... }, topics:{...} }
-        raw = dict(prof)
-        # If profile is wrapped in a single top-level key (e.g., {"main_panel": {...}}), unwrap it
-        try:
-            if isinstance(raw, dict) and len(raw.keys()) == 1:
-                only_key = next(iter(raw.keys()))
-                inner = raw.get(only_key)
-                # Heuristic: if inner looks like a profile body, unwrap
-                if isinstance(inner, dict) and ("widgets" in inner or "ui" in inner or "grid" in inner or "dashboard" in inner):
-                    _LOGGER.debug("build_config: unwrapping single-key profile '%s' for device=%s", only_key, device_id)
-                    raw = dict(inner)
-        except Exception:
-            pass
-
-        # Device settings are moved to HA entities; config now contains only UI and topics
-        device = {}
-
-        # Build UI bucket and move widgets/grid-like keys under ui
-        ui: Dict[str, Any] = {}
-        if isinstance(raw.get("ui"), dict):
-            ui = dict(raw.get("ui") or {})
-        # Move known layout keys from top-level if present
-        for k in ("grid", "rowHeight", "gutter", "padding", "cols", "rows"):
-            if k in raw and k not in ui:
-                ui[k] = raw.pop(k)
-        # Widgets can be top-level or inside ui; normalize to ui.widgets
-        widgets = None
-        if isinstance(raw.get("widgets"), list):
-            widgets = list(raw.get("widgets") or [])
-        elif isinstance(ui.get("widgets"), list):
-            widgets = list(ui.get("widgets") or [])
-        else:
-            widgets = []
-        try:
-            _LOGGER.debug("build_config: device=%s initial_widgets=%d (pre-layout)", device_id, len(widgets or []))
-        except Exception:
-            pass
-
-        # HADashboard-like layout support (starter):
-        # If profile defines grid columns and a layout array of rows with entries like
-        #   "light.kitchen", "sensor.temp", "light.living(2x1)", "spacer", ""
-        # we translate them into concrete widget defs with x,y,w,h and topics.
-        try:
-            dash = raw.get("dashboard") if isinstance(raw.get("dashboard"), dict) else raw
-            cols = None
-            layout = None
-            dash_src = dash if isinstance(dash, dict) else {}
-            if isinstance(dash_src, dict):
-                cols = dash_src.get("columns") or dash_src.get("cols") or ui.get("columns")
-                layout = dash_src.get("layout") or ui.get("layout")
-            if isinstance(cols, int) and cols > 0 and isinstance(layout, list):
-                # Adopt widget_dimensions and margins if present
-                wd = dash_src.get("widget_dimensions") or ui.get("widget_dimensions") or [120, 120]
-                wm = dash_src.get("widget_margins") or ui.get("widget_margins") or [5, 5]
-                ws = dash_src.get("widget_size") or ui.get("widget_size") or [1, 1]
-                ui["grid"] = {
-                    "columns": cols,
-                    "widget_dimensions": wd,
-                    "widget_margins": wm,
-                    "widget_size": ws,
-                }
-                base_stream = FIXED_STATESTREAM_BASE
-                base_cmd = FIXED_COMMAND_BASE
-
-                def _parse_size(s: str):
-                    # looks for "(WxH)"
-                    if not isinstance(s, str):
-                        return (ws[0], ws[1])
-                    i = s.find("(")
-                    j = s.find(")", i+1) if i >= 0 else -1
-                    if i >= 0 and j > i:
-                        try:
-                            inner = s[i+1:j]
-                            if "x" in inner:
-                                a, b = inner.split("x", 1)
-                                return (int(a), int(b))
-                        except Exception:
-                            return (ws[0], ws[1])
-                    return (ws[0], ws[1])
-
-                def _strip_size(s: str):
-                    if not isinstance(s, str):
-                        return s
-                    i = s.find("(")
-                    return s[:i].strip() if i > 0 else s.strip()
-
-                def _mk_widget(entity: str, x: int, y: int, w: int, h: int) -> Optional[Dict[str, Any]]:
-                    if not entity:
-                        return None
-                    ent = entity.strip()
-                    if ent.lower() in ("spacer",):
-                        return None
-                    if "." not in ent and ent.lower() not in ("clock", "weather"):
-                        # Skip unknown non-entity widgets for now
-                        return None
-                    label = ent
-                    cmd_topic = None
-                    state_topic = None
-                    wtype = "value"
-                    dom = None
-                    obj = None
-                    if "." in ent:
-                        dom, obj = ent.split(".", 1)
-                        state_topic = f"{base_stream}/{dom}/{obj}/state"
-                        if dom == "light":
-                            wtype = "light"
-                            cmd_topic = f"{base_cmd}/{ent}"
-                        elif dom in ("switch", "input_boolean"):
-                            wtype = "switch"
-                            cmd_topic = f"{base_cmd}/{ent}"
-                        elif dom == "scene":
-                            wtype = "scene"
-                            cmd_topic = f"{base_cmd}/{ent}"
-                        elif dom in ("script", "button"):
-                            wtype = "button"
-                            cmd_topic = f"{base_cmd}/{ent}"
-                        else:
-                            wtype = "sensor"
-                    else:
-                        # non-entity simple widgets placeholder -> sensor-like for now
-                        wtype = "sensor"
-                    wdict = {
-                        "id": f"g:{x},{y}:{ent}",
-                        "type": wtype,
-                        "entity_id": ent if "." in ent else "",
-                        "state_topic": state_topic or "",
-                        "command_topic": cmd_topic or None,
-                        "label": label,
-                        "x": x, "y": y, "w": w, "h": h,
-                    }
-                    # Provide attr_topic for brightness on lights to support UI brightness controls
-                    if dom == "light" and obj:
-                        wdict["attr_topic"] = f"{base_stream}/{dom}/{obj}/attributes/brightness"
-                    return wdict
-
-                widgets_from_layout: List[Dict[str, Any]] = []
-                y = 0
-                for row in layout:
-                    # each row can be a string with comma separated entries or an array
-                    if isinstance(row, str):
-                        parts = [p.strip() for p in row.split(",")]
-                    elif isinstance(row, list):
-                        parts = row
-                    elif isinstance(row, dict) and "empty" in row:
-                        try:
-                            nraw = row.get("empty")
-                            nempty = int(nraw) if nraw is not None else 1
-                        except Exception:
-                            nempty = 1
-                        y += max(0, nempty)
-                        continue
-                    else:
-                        y += 1
-                        continue
-
-                    x = 0
-                    for item in parts:
-                        if not item or item.lower() == "spacer":
-                            x += 1
-                            continue
-                        w_cells, h_cells = _parse_size(item)
-                        name = _strip_size(item)
-                        wdef = _mk_widget(name, x, y, w_cells, h_cells)
-                        if wdef:
-                            widgets_from_layout.append(wdef)
-                        x += max(1, int(w_cells))
-                    y += 1
-
-                # Merge: explicit widgets (if any) first, then append layout-generated
-                widgets.extend(widgets_from_layout)
-        except Exception:
-            _LOGGER.exception("Failed to parse dashboard layout")
-
-        # At this point, widgets may contain raw profile-defined dicts. Profiles should NOT
-        # include MQTT topics; generate them here based on entity_id and type. Also accept
-        # user-friendly aliases for coordinates: row/col/rowspan/colspan.
-        norm_widgets: List[Dict[str, Any]] = []
-        base_stream = FIXED_STATESTREAM_BASE
-        base_cmd = FIXED_COMMAND_BASE
-
-        # Widget types that don't require an entity_id (use specialized entity fields instead)
-        _NO_ENTITY_TYPES = ("label", "clock", "timer", "camera", "webpage", "mealie", "printer")
-
-        def _coerce_int(v: Any, default: int) -> int:
-            try:
-                if isinstance(v, bool):
-                    return default
-                return int(v)
-            except Exception:
-                return default
-
-        def _normalize_one(it: Any, idx: int) -> Optional[Dict[str, Any]]:
-            """Normalize one widget dict — generate MQTT topics from entity refs."""
-            if not isinstance(it, dict):
-                return None
-            wdef = dict(it)
-            ent = wdef.get("entity_id") or wdef.get("entity") or wdef.get("eid") or ""
-            if isinstance(ent, str):
-                ent = ent.strip()
-            else:
-                ent = ""
-            wtype = (wdef.get("type") or "").strip().lower() if isinstance(wdef.get("type"), str) else ""
-            if wtype == "spacer":
-                return None
-            if not ent and wtype not in _NO_ENTITY_TYPES:
-                return None
-
-            # Position aliases
-            xi = _coerce_int(wdef.get("x", wdef.get("col")), 0)
-            yi = _coerce_int(wdef.get("y", wdef.get("row")), 0)
-            wi = max(1, _coerce_int(wdef.get("w", wdef.get("colspan")), 1))
-            hi = max(1, _coerce_int(wdef.get("h", wdef.get("rowspan")), 1))
-
-            dom = None
-            obj = None
-            if "." in ent:
-                try:
-                    dom, obj = ent.split(".", 1)
-                except Exception:
-                    pass
-            if not wtype:
-                if dom == "light": wtype = "light"
-                elif dom in ("switch", "input_boolean"): wtype = "switch"
-                elif dom == "scene": wtype = "scene"
-                elif dom in ("script", "button"): wtype = "button"
-                elif dom == "person": wtype = "person"
-                else: wtype = "sensor"
-
-            state_topic = f"{base_stream}/{dom}/{obj}/state" if dom and obj else ""
-            cmd_topic = None
-            if wtype in ("light", "switch", "button", "scene", "climate", "mediaplayer") and ent and "." in ent:
-                cmd_topic = f"{base_cmd}/{ent}"
-            # Local-only widgets have no MQTT state
-            if wtype in _NO_ENTITY_TYPES:
-                state_topic = ""
-
-            out: Dict[str, Any] = {
-                "id": wdef.get("id") or f"p:{idx}:{ent or wtype}",
-                "type": wtype,
-                "entity_id": ent,
-                "label": (wdef.get("label") or wdef.get("lbl") or ent or wtype),
-                "x": xi, "y": yi, "w": wi, "h": hi,
-                "state_topic": state_topic,
-            }
-            if cmd_topic:
-                out["command_topic"] = cmd_topic
-            p = wdef.get("protected")
-            if isinstance(p, (bool, int)):
-                out["protected"] = bool(p)
-            u = wdef.get("unit")
-            if isinstance(u, str) and u.strip():
-                out["unit"] = u.strip()
-            fmt = wdef.get("format")
-            if isinstance(fmt, dict) and fmt:
-                allowed = {
-                    "align", "vAlign", "textSize", "textColor", "bgColor",
-                    "onTextColor", "offTextColor", "onBgColor", "offBgColor",
-                    "wrap", "maxLines",
-                }
-                sanitized = {k: v for k, v in fmt.items() if k in allowed and isinstance(v, (str, int, float))}
-                if sanitized:
-                    out["format"] = sanitized
-
-            # Light: brightness attribute topic (skipped when dimmable is explicitly False)
-            if wtype == "light" and dom == "light" and obj:
-                _dimmable = wdef.get("dimmable")
-                if _dimmable is False:
-                    out["dimmable"] = False
-                else:
-                    out["attr_topic"] = f"{base_stream}/{dom}/{obj}/attributes/brightness"
-
-            # Label: text field
-            if wtype == "label":
-                txt = wdef.get("text")
-                if isinstance(txt, str):
-                    out["text"] = txt
-
-            # Clock: time_pattern
-            if wtype == "clock":
-                pat = wdef.get("time_pattern")
-                if isinstance(pat, str) and pat.strip():
-                    out["time_pattern"] = pat.strip()
-
-            # Timer: default_seconds, configurable
-            if wtype == "timer":
-                ds = wdef.get("default_seconds")
-                if isinstance(ds, (int, float)):
-                    out["default_seconds"] = int(ds)
-                c = wdef.get("configurable")
-                if isinstance(c, bool):
-                    out["configurable"] = c
-
-            # Climate: attr_base for temperatures, modes, state_formats
-            if wtype == "climate":
-                if dom and obj:
-                    out["attr_base"] = f"{base_stream}/{dom}/{obj}/attributes"
-                modes = wdef.get("modes")
-                if isinstance(modes, list):
-                    out["modes"] = modes
-                sf = wdef.get("state_formats")
-                if isinstance(sf, dict):
-                    out["state_formats"] = sf
-
-            # Weather: attr_base, attrs, attr_units
-            if wtype == "weather" and dom == "weather" and obj:
-                out["attr_base"] = f"{base_stream}/{dom}/{obj}/attributes"
-                attrs = wdef.get("attrs")
-                if isinstance(attrs, list) and attrs:
-                    out["attrs"] = [a for a in attrs if isinstance(a, str)]
-                attr_units = wdef.get("attr_units")
-                if isinstance(attr_units, dict) and attr_units:
-                    out["attr_units"] = {k: v for k, v in attr_units.items() if isinstance(k, str) and isinstance(v, str)}
-
-            # Helper: entity field → statestream topic
-            def _ent_t(field: str, key: str) -> None:
-                e = wdef.get(field)
-                if isinstance(e, str) and "." in e:
-                    ed, eo = e.split(".", 1)
-                    out[key] = f"{base_stream}/{ed}/{eo}/state"
-
-            # Printer: per-sensor topics
-            if wtype == "printer":
-                _ent_t("nozzle_entity", "nozzle_topic")
-                _ent_t("bed_entity", "bed_topic")
-                _ent_t("time_entity", "time_topic")
-                _ent_t("progress_entity", "progress_topic")
-                _ent_t("status_entity", "status_topic")
-                pu = wdef.get("progress_unit")
-                if isinstance(pu, str):
-                    out["progress_unit"] = pu
-                vr = wdef.get("visible_rows")
-                if isinstance(vr, list):
-                    out["visible_rows"] = vr
-
-            # Sous vide: temp/target/time topics
-            if wtype == "sousvide":
-                _ent_t("temp_entity", "temp_topic")
-                _ent_t("target_entity", "target_topic")
-                _ent_t("time_entity", "time_topic")
-
-            # Appliance: time/program topics
-            if wtype == "appliance":
-                _ent_t("time_entity", "time_topic")
-                _ent_t("program_entity", "program_topic")
-
-            # Media player: inject per-attribute statestream topics
-            if wtype == "mediaplayer" and dom and obj:
-                attr_base = f"{base_stream}/{dom}/{obj}/attributes"
-                out["title_topic"]    = f"{attr_base}/media_title"
-                out["artist_topic"]   = f"{attr_base}/media_artist"
-                out["position_topic"] = f"{attr_base}/media_position"
-                out["duration_topic"] = f"{attr_base}/media_duration"
-
-            # Camera: stream_url, scale_mode, overlay_button with topics
-            if wtype == "camera":
-                su = wdef.get("stream_url")
-                if isinstance(su, str) and su.strip():
-                    out["stream_url"] = su.strip()
-                sm = wdef.get("scale_mode")
-                if isinstance(sm, str):
-                    out["scale_mode"] = sm
-                ob = wdef.get("overlay_button")
-                if isinstance(ob, dict):
-                    ob_ent = ob.get("entity_id")
-                    ob_out: Dict[str, Any] = {}
-                    if isinstance(ob_ent, str) and "." in ob_ent:
-                        ob_d, ob_o = ob_ent.split(".", 1)
-                        ob_out["entity_id"] = ob_ent
-                        ob_out["state_topic"] = f"{base_stream}/{ob_d}/{ob_o}/state"
-                        ob_out["command_topic"] = f"{base_cmd}/{ob_ent}"
-                    for k in ("label", "action"):
-                        v = ob.get(k)
-                        if isinstance(v, str):
-                            ob_out[k] = v
-                    if ob_out:
-                        out["overlay"] = ob_out
-
-            # Webpage: stream_url / url
-            if wtype == "webpage":
-                su = wdef.get("stream_url") or wdef.get("url")
-                if isinstance(su, str) and su.strip():
-                    out["stream_url"] = su.strip()
-
-            # Mealie: pass through widget-specific fields
-            if wtype == "mealie":
-                for field in ("mealie_url", "mealie_api_key", "visible_section"):
-                    v = wdef.get(field)
-                    if isinstance(v, str):
-                        out[field] = v
-
-            return out
-
-        for idx, it in enumerate(widgets or []):
-            nw = _normalize_one(it, idx)
-            if nw is not None:
-                norm_widgets.append(nw)
-
-        ui["widgets"] = norm_widgets
-
-        # Normalize pages widgets (multi-page profiles: ui.pages[*].widgets)
-        if isinstance(ui.get("pages"), list):
-            normed_pages = []
-            for page in ui["pages"]:
-                if not isinstance(page, dict):
-                    normed_pages.append(page)
-                    continue
-                page_norm = []
-                for pidx, pw in enumerate(list(page.get("widgets") or [])):
-                    nw = _normalize_one(pw, pidx)
-                    if nw is not None:
-                        page_norm.append(nw)
-                pg = dict(page)
-                pg["widgets"] = page_norm
-                normed_pages.append(pg)
-            ui["pages"] = normed_pages
-        try:
-            _LOGGER.debug("build_config: device=%s normalized_widgets=%d", device_id, len(norm_widgets))
-        except Exception:
-            pass
-
-        # Topics (settings/hello/status)
-        topics = dict(raw.get("topics") or {})
-        topics.setdefault("settings", f"{base_dev}/{device_id}/settings")
-        topics.setdefault("hello",    f"{base_dev}/{device_id}/hello")
-        topics.setdefault("status",   f"{base_dev}/{device_id}/status")
-
-        # Attach last-known screen info if present on the device record (helps client layout decisions)
-        if isinstance(dev.get("screen"), dict):
-            device.setdefault("screen", dev.get("screen"))
-
-        # Compose final document
-        doc: Dict[str, Any] = {
-            "version": 1,
-            "device_id": device_id,
-            # Device bucket may include screen info. keep_awake/brightness/orientation are controlled via HA entities
-            "device": device or {},
-            "ui": ui,
-            "topics": topics,
-        }
-
-        try:
-            _LOGGER.debug(
-                "build_config: device=%s norm_widgets=%d base_dev=%s base_cmd=%s base_stream=%s",
-                device_id, len(ui.get("widgets", [])),
-                base_dev,
-                FIXED_COMMAND_BASE,
-                FIXED_STATESTREAM_BASE,
-            )
-        except Exception:
-            pass
-        return doc
+    def _build_config_for_device(self, dev: Dict[str, Any], profiles: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """One device's config document; ``profiles`` defaults to the snapshot's (bodies unless lazy, see _profiles_for)."""
+        profiles = self.cfg.profiles if profiles is None else profiles
+        return build_device_doc(
+            dev,
+            profiles,
+            self._storage_helper.get_groups(),
+            self._storage_helper.get_group_overlays(),
+            artifacts=self._usable_artifacts(profiles),
+        )
 
     # ---------- device list helpers ----------
-    def _dedupe_devices(self, devices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Return devices unique by device_id; prefer entries with GUID or a non-empty profile."""
-        by_id: Dict[str, Dict[str, Any]] = {}
-        for d in devices:
-            did = (d.get("device_id") or "").strip()
-            if not did:
-                continue
-            prev = by_id.get(did)
-            if not prev:
-                by_id[did] = d
-                continue
-            # prefer one with guid, then with profile
-            score_prev = (1 if prev.get("guid") else 0) + (1 if (prev.get("profile") or "") else 0)
-            score_new  = (1 if d.get("guid") else 0) + (1 if (d.get("profile") or "") else 0)
-            if score_new >= score_prev:
-                by_id[did] = d
-        return list(by_id.values())
-
-    def _save_devices(self, devices: List[Dict[str, Any]]) -> None:
-        cleaned = self._dedupe_devices(devices)
-        # Preserve all existing options to avoid dropping profiles/mirror on device updates
-        opts_now: Dict[str, Any] = dict(self.entry.options or {})
-        # If profiles exist, ensure we do not inadvertently clear an existing device-specific profile
-        existing_profiles: Dict[str, Any] = dict(opts_now.get(CONF_PROFILES, {}) or {})
-        for rec in cleaned:
-            did = (rec.get("device_id") or "").strip()
-            # If profile field is empty but we already have a profile keyed by device_id, relink it
-            if did and not (rec.get("profile") or "") and did in existing_profiles:
-                _LOGGER.debug("save_devices: preserving existing profile for %s", did)
-                rec["profile"] = did
-        prev_keys = list(opts_now.keys())
-        opts_now[CONF_DEVICES] = cleaned
+    def _link_profile(self, device_id: str, rec: Optional[Dict[str, Any]], fields: Dict[str, Any]) -> Dict[str, Any]:
+        """``fields`` plus a profile link when the record has none but a profile is keyed by ``device_id``."""
+        # Runtime profiles come from the Store; options may only hold the profile index
+        if not ((rec or {}).get("profile") or fields.get("profile")) and device_id in self.cfg.profiles:
+            _LOGGER.debug("save_devices: preserving existing profile for %s", device_id)
+            fields["profile"] = device_id
+        return fields
+
+    def _commit_devices(self, reason: str) -> None:
+        """Save device directory edits to the Store and refresh the runtime snapshot.
+
+        Full records go to the Store (delayed save), so screen/caps/group updates
+        stop there. Entry options carry only the directory (id, profile, guid) and
+        are rewritten only when it changed; the options listener then handles the
+        device set change (purge, entry reload).
+        """
+        wrote = self._storage_helper.commit_devices(reason)
+        if wrote:
+            opts_now: Dict[str, Any] = dict(self.entry.options or {})
+            opts_now[CONF_DEVICES] = device_directory(self._directory.records())
+            self.hass.config_entries.async_update_entry(self.entry, options=opts_now)
         _LOGGER.debug(
-            "save_devices: %d -> %d records; preserving option keys=%s",
-            len(devices), len(cleaned), prev_keys,
+            "save_devices (%s): %d records (options %s)", reason, len(self._directory), "updated" if wrote else "unchanged",
         )
-        # Write back options atomically (data portion untouched)
-        self.hass.config_entries.async_update_entry(self.entry, options=opts_now)
         # Update in-memory caches immediately so subsequent logic sees new devices
-        self._opts = dict(opts_now)
-        self.cfg = {**self._data, **self._opts}
-        # Best-effort profile persistence (does not block)
-        try:
-            # Only persist profiles if they exist (avoid empty file churn)
-            if self.cfg.get(CONF_PROFILES):
-                # Schedule in loop (fire and forget)
-                # Persist profiles via storage helper (fire-and-forget)
-                profiles = dict(self.cfg.get(CONF_PROFILES, {}) or {})
-                self.hass.async_create_task(self._storage_helper.persist_profiles(profiles))
-        except Exception:
-            _LOGGER.debug("save_devices: profile persistence skipped due to error", exc_info=True)
+        self._opts = self._store_options()
+        self._refresh_runtime()
 
     # ---------- mirror ----------
     async def _maybe_start_mirror(self, *, publish_snapshot: bool = True) -> None:
         # Compute effective entity list: auto-derive from profiles, or use manual list
         if self.cfg.get(CONF_MIRROR_AUTO):
-            profiles = dict(self.cfg.get(CONF_PROFILES, {}) or {})
-            wanted = _extract_entities_from_profiles(profiles)
+            wanted = self._profile_entities()
             _LOGGER.debug("mirror auto-derived %d entities from profiles", len(wanted))
         else:
             wanted = [w.lower() for w in list(self.cfg.get(CONF_MIRROR_ENTITIES, []) or [])
@@ -1196,9 +1038,55 @@ class MqttBridge:
     def _is_mirrored(self, entity_id: str) -> bool:
         return entity_id.lower() in self._mirror_wanted
 
-    async def async_publish_snapshot(self) -> None:
+    def _sync_entity_index(self) -> None:
+        snap = self.cfg
+        if snap.profiles_changed_since(self._entity_index_generation):
+            if self._storage_helper.lazy:
+                # The snapshot only has placeholders; use the entity sets kept with the profile metadata
+                self._entity_index.sync_entities(self._storage_helper.get_profile_entities())
+            else:
+                self._entity_index.sync(snap.profiles)
+            self._entity_index_generation = snap.profiles_generation
+
+    def _profile_entities(self) -> List[str]:
+        """Entities referenced by the current profiles (the auto-mirror set)."""
+        self._sync_entity_index()
+        return self._entity_index.entities()
+
+    def _device_entities(self, device_id: str) -> Optional[Set[str]]:
+        """Entities one device's dashboard references, or None for an unknown device."""
+        dev = self._directory.get(device_id)
+        if dev is None:
+            return None
+        self._sync_entity_index()
+        key = resolve_profile_key(dev, self.cfg.profiles, self._storage_helper.get_groups())
+        ents = self._entity_index.profile_entities(key) if key is not None else set()
+        overlay = self._storage_helper.get_group_overlays().get(device_id) if dev.get("group") else None
+        if isinstance(overlay, dict):
+            ents.update(scan_profile(overlay))
+        return ents
+
+    def _devices_using_profiles(self, keys: Set[str]) -> List[str]:
+        profiles = self.cfg.profiles
+        groups = self._storage_helper.get_groups()
+        return [
+            d["device_id"] for d in self.cfg.devices
+            if d.get("device_id") and resolve_profile_key(d, profiles, groups) in keys
+        ]
+
+    async def async_publish_snapshot(self, device_id: Optional[str] = None) -> None:
+        """Publish retained state for mirrored entities; only the ones a device uses when device_id is given."""
+        wanted = list(self._mirror_wanted)
+        if device_id:
+            ents = self._device_entities(device_id)
+            if ents is not None:
+                wanted = [e for e in wanted if e in ents]
+        _LOGGER.debug("snapshot: publishing %d entities (device=%s)", len(wanted), device_id or "*")
+        await self._publish_entity_snapshots(wanted)
+
+    async def _publish_entity_snapshots(self, entity_ids: List[str]) -> None:
         base = FIXED_STATESTREAM_BASE
-        for ent_id in list(self._mirror_wanted):
+        for ent_id in entity_ids:
             st = self.hass.states.get(ent_id)
             if not st: continue
             dom, obj = ent_id.split(".", 1)
@@ -1227,6 +1115,7 @@ class MqttBridge:
                 await mqtt.async_publish(self.hass, f"{base}/{dom}/{obj}/attributes/{k}", "", qos=0, retain=True)
 
     # ---------- device channels ----------
+    @serialized(refresh=True)
     async def _on_device_hello(self, msg):
         _LOGGER.debug("device_hello: topic=%s payload_len=%d", getattr(msg, "topic", ""), len(_payload_to_str(msg)))
         raw = _payload_to_str(msg)
@@ -1245,40 +1134,36 @@ class MqttBridge:
         prev_id = (payload.get("prev_id") or "").strip()
         # Optional screen info from client
         screen = payload.get("screen") if isinstance(payload.get("screen"), dict) else None
+        # Optional capability list (e.g. ["zlib", "chunked"]); None when the client sent none
+        caps = _parse_caps(payload.get("caps"))
 
-        # Always operate on a fresh snapshot of options to avoid overwriting concurrent edits
-        opts = dict(self.entry.options or {})
-        devices: List[Dict[str, Any]] = list(opts.get(CONF_DEVICES, []) or [])
+        directory = self._directory
 
         # If this device (by guid or incoming device_id) was explicitly purged via HA Delete Device, ignore hello
-        try:
-            await self._storage_helper.async_init()
-            if self._storage_helper.is_purged_device(device_id=(device_id or None), guid=(guid or None)):
-                _LOGGER.info("device_hello: ignoring purged device hello (device_id=%s guid=%s)", device_id, guid)
-                return
-        except Exception:
-            _LOGGER.debug("device_hello: purged check failed", exc_info=True)
+        # (the command batch reloaded the Store first)
+        if directory.is_purged(device_id=(device_id or None), guid=(guid or None)):
+            _LOGGER.info("device_hello: ignoring purged device hello (device_id=%s guid=%s)", device_id, guid)
+            return
 
-        # lookups
-        by_id = {d.get("device_id"): d for d in devices if d.get("device_id")}
-        by_guid = {d.get("guid"): d for d in devices if d.get("guid")}
+        # Fields the hello reports (screen and caps only when sent)
+        fields: Dict[str, Any] = {}
+        if screen:
+            fields["screen"] = screen
+        if caps is not None:
+            fields["caps"] = caps
 
         # 1) GUID match beats everything (rename if id differs)
-        if guid and guid in by_guid:
-            rec = by_guid[guid]
+        rec = directory.by_guid(guid)
+        if rec is not None:
             old_id = rec.get("device_id")
             if old_id != device_id:
-                rec["device_id"] = device_id
-                # drop any other entries that already use the new id to avoid duplicates
-                devices = [d for d in devices if (d is rec) or (d.get("device_id") != device_id)]
+                # Any other record already using the new id is dropped
+                directory.rename(old_id, device_id, self._link_profile(device_id, rec, fields))
                 if old_id:
                     ph = bool(self.entry.options.get("placeholder_on_remove", False))
                     await self._purge_device_retained(old_id, placeholder=ph)
-                # Update screen info if provided
-                if screen:
-                    rec["screen"] = screen
-                self._save_devices(devices)
-                await self.async_publish_all_configs()
+                self._commit_devices("hello_guid_rename")
+                self._commands.request_republish()
                 # Ensure HA updates device list immediately
                 self.schedule_entry_reload("hello_guid_rename")
                 # Update HA device registry: migrate identifier and name to new device_id
@@ -1287,31 +1172,30 @@ class MqttBridge:
                         await self._migrate_device_registry_identifier(old_id=old_id, new_id=device_id)
                 except Exception:
                     _LOGGER.debug("hello GUID rename: device registry migration failed", exc_info=True)
+            elif directory.update(device_id, fields):
+                # Same device, new app build or screen: re-encode its config for the advertised caps
+                # and screen (frames). Only the Store record changes; entry options stay as they are
+                self._commit_devices("hello")
+                self._commands.request_republish()
             # online status
             base_dev = FIXED_DEVICE_BASE
             await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/status", "online", qos=0, retain=True)
             return
 
         # 2) prev_id path (fallback if guid unknown)
-        if prev_id and prev_id in by_id:
-            rec = by_id[prev_id]
-            rec["device_id"] = device_id
+        rec = directory.get(prev_id)
+        if rec is not None:
             if guid:
-                rec["guid"] = guid
-            if screen:
-                rec["screen"] = screen
-            # remove any other entries for the target id
-            devices = [d for d in devices if (d is rec) or (d.get("device_id") != device_id)]
-            if prev_id:
-                ph = bool(self.entry.options.get("placeholder_on_remove", False))
-                await self._purge_device_retained(prev_id, placeholder=ph)
-            self._save_devices(devices)
-            await self.async_publish_all_configs()
+                fields["guid"] = guid
+            directory.rename(prev_id, device_id, self._link_profile(device_id, rec, fields))
+            ph = bool(self.entry.options.get("placeholder_on_remove", False))
+            await self._purge_device_retained(prev_id, placeholder=ph)
+            self._commit_devices("hello_prev_id_rename")
+            self._commands.request_republish()
             self.schedule_entry_reload("hello_prev_id_rename")
             # Update HA device registry: migrate identifier and name to new device_id
             try:
-                if isinstance(prev_id, str) and prev_id:
-                    await self._migrate_device_registry_identifier(old_id=prev_id, new_id=device_id)
+                await self._migrate_device_registry_identifier(old_id=prev_id, new_id=device_id)
             except Exception:
                 _LOGGER.debug("hello prev_id rename: device registry migration failed", exc_info=True)
             base_dev = FIXED_DEVICE_BASE
@@ -1319,18 +1203,18 @@ class MqttBridge:
             return
 
         # 3) new device (register)
-        if device_id not in by_id:
+        if device_id not in directory:
             rec = {"device_id": device_id, "profile": ""}
             if guid:
                 rec["guid"] = guid
-            if screen:
-                rec["screen"] = screen
-            devices.append(rec)
-            if device_id in (self.cfg.get(CONF_PROFILES, {}) or {}):
-                _LOGGER.debug("device_hello: new device %s already has profile key -> will preserve on save", device_id)
-            self._save_devices(devices)
-            await self.async_publish_all_configs()
+            rec.update(self._link_profile(device_id, None, fields))
+            directory.put(rec)
+            self._commit_devices("hello_new_device")
+            self._commands.request_republish()
             self.schedule_entry_reload("hello_new_device")
+        elif directory.update(device_id, fields):
+            self._commit_devices("hello")
+            self._commands.request_republish()
 
         base_dev = FIXED_DEVICE_BASE
         await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/status", "online", qos=0, retain=True)
@@ -1346,6 +1230,7 @@ class MqttBridge:
         return
 
 
+    @serialized()
     async def _on_device_request(self, msg) -> None:
         _LOGGER.debug("device_request: topic=%s payload_len=%d", getattr(msg, "topic", ""), len(_payload_to_str(msg)))
         raw = _payload_to_str(msg)
@@ -1367,8 +1252,8 @@ class MqttBridge:
 
         action = (req.get("action") or "").lower()
         if action == "snapshot":
-            _LOGGER.debug("device_request: snapshot requested")
-            await self.async_publish_snapshot()
+            _LOGGER.debug("device_request: snapshot requested by %s", device_id or "?")
+            await self.async_publish_snapshot(device_id or None)
         elif action == "onboard":
             # Explicit re-onboarding signal from client: clear purged markers and (re)publish config
             guid = (req.get("guid") or "").strip() if isinstance(req.get("guid"), str) else None
@@ -1379,21 +1264,17 @@ class MqttBridge:
                 _LOGGER.debug("device_request:onboard: failed to clear purged markers for %s / %s", device_id, guid, exc_info=True)
 
             # Ensure device exists in options; if missing, add placeholder record
-            devices: List[Dict[str, Any]] = list(self.cfg.get(CONF_DEVICES, []) or [])
-            by_id = {d.get("device_id"): d for d in devices if isinstance(d, dict)}
-            if device_id and device_id not in by_id:
+            if device_id and device_id not in self._directory:
                 rec: Dict[str, Any] = {"device_id": device_id, "profile": ""}
                 if guid:
                     rec["guid"] = guid
-                devices.append(rec)
-                self._save_devices(devices)
+                rec.update(self._link_profile(device_id, None, {}))
+                self._directory.put(rec)
+                self._commit_devices("onboard_new_device")
                 self.schedule_entry_reload("onboard_new_device")
 
-            # Re-publish configs and status online; also rehydrate retained settings
-            try:
-                await self.async_publish_all_configs()
-            except Exception:
-                _LOGGER.debug("device_request:onboard: publish configs failed", exc_info=True)
+            # Re-publish configs (after this batch) and status online; also rehydrate retained settings
+            self._commands.request_republish()
             base_dev = FIXED_DEVICE_BASE
             if device_id:
                 await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/status", "online", qos=0, retain=True)
@@ -1406,6 +1287,73 @@ class MqttBridge:
                 except Exception:
                     _LOGGER.debug("onboard settings republish skipped", exc_info=True)
 
+    async def _on_device_config_status(self, msg) -> None:
+        """Record which config revision/hash a client reports as applied."""
+        topic = getattr(msg, "topic", "") or ""
+        raw = _payload_to_str(msg)
+        try:
+            device_id = topic.split("/")[-2]  # mqttdash/dev/<device_id>/config_status
+            payload = json.loads(raw) if raw else {}
+        except Exception:
+            _LOGGER.debug("config_status: bad payload on %s: %r", topic, raw[:200])
+            return
+        if not isinstance(payload, dict):
+            return
+        if device_id not in self._directory:
+            return
+        rev = payload.get("rev")
+        phash = payload.get("hash")
+        rec: Dict[str, Any] = {
+            "rev": rev if isinstance(rev, int) else None,
+            "hash": phash if isinstance(phash, str) and phash else None,
+            "at": time.time(),
+        }
+        if isinstance(payload.get("group_rev"), int):
+            rec["group_rev"] = payload["group_rev"]
+        was_converged = device_id in self._applied and self._is_converged(device_id)
+        self._applied[device_id] = rec
+        converged = self._is_converged(device_id)
+        if converged and not was_converged and device_id in self._config_published_at and device_id not in self._converge_seconds:
+            self._converge_seconds[device_id] = round(rec["at"] - self._config_published_at[device_id], 3)
+        _LOGGER.debug(
+            "config_status: %s applied rev=%s current rev=%s converged=%s",
+            device_id, rec["rev"], (self._config_state.get(device_id) or {}).get("rev"), converged,
+        )
+        async_dispatcher_send(self.hass, SIGNAL_CONFIG_STATUS_UPDATED, device_id)
+
+    def _applied_hash(self, device_id: str) -> Optional[str]:
+        return (self._applied.get(device_id) or {}).get("hash")
+
+    def _is_converged(self, device_id: str) -> bool:
+        """True when the client's reported config matches what is currently published for it."""
+        applied = self._applied.get(device_id)
+        cur = self._config_state.get(device_id)
+        if not applied or not cur:
+            return False
+        if applied.get("hash"):
+            ok = applied["hash"] == cur.get("hash")
+        else:
+            ok = applied.get("rev") is not None and applied.get("rev") == cur.get("rev")
+        if ok and "group_rev" in applied:
+            # Group members may also confirm the shared group config they merged in
+            group = (self._directory.get(device_id) or {}).get("group")
+            gstate = self._config_state.get(group_state_key(group)) if group else None
+            if gstate:
+                ok = applied["group_rev"] == gstate.get("rev")
+        return ok
+
+    def get_config_status(self, device_id: str) -> Dict[str, Any]:
+        """Convergence view for diagnostics entities: converged is None until the client reports."""
+        cur = self._config_state.get(device_id) or {}
+        applied = self._applied.get(device_id)
+        return {
+            "rev": cur.get("rev"),
+            "applied_rev": applied.get("rev") if applied else None,
+            "converged": self._is_converged(device_id) if applied else None,
+            "converge_seconds": self._converge_seconds.get(device_id),
+        }
+
+    @serialized()
     async def _on_device_telemetry(self, msg) -> None:
         topic = getattr(msg, "topic", "") or ""
         payload = _payload_to_str(msg)
@@ -1471,7 +1419,7 @@ class MqttBridge:
             if dev:
                 await self.async_purge_device(dev)
         elif action == "publish_config":
-            await self.async_publish_all_configs()
+            await self._commands.submit("publish_config", republish=REPUBLISH_PUBLISH)
         elif action == "snapshot":
             await self.async_publish_snapshot()
 
@@ -1557,7 +1505,9 @@ class MqttBridge:
             await self.hass.services.async_call("homeassistant", service, {"entity_id": entity_id}, blocking=False)
 
     # ---------- maintenance ----------
-    async def async_purge_device(self, device_id: str) -> None:
+    @serialized(refresh=True)
+    async def async_purge_device(self, device_id: str, *, notify: bool = True) -> None:
+        """Offboard a device. notify=False skips the transient request when a broadcast already sent it."""
         _LOGGER.debug("purge_device: %s", device_id)
         # Explicit purge should fully clear retained topics without publishing placeholders
         await self._purge_device_retained(device_id, placeholder=False)
@@ -1566,14 +1516,14 @@ class MqttBridge:
             payload = json.dumps({"action": "offboard"})
             base_dev = FIXED_DEVICE_BASE
             # transient request channel (non-retained) so a connected app reacts immediately
-            await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/request", payload, qos=0, retain=False)
+            if notify:
+                await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/request", payload, qos=0, retain=False)
             # also publish a retained offboard settings to ensure reconnecting apps see it
             await mqtt.async_publish(self.hass, f"{base_dev}/{device_id}/settings", payload, qos=0, retain=True)
         except Exception:
             _LOGGER.debug("purge_device: failed to publish offboard notice for %s", device_id, exc_info=True)
-        devices: List[Dict[str, Any]] = list(self.cfg.get(CONF_DEVICES, []) or [])
-        devices = [d for d in devices if d.get("device_id") != device_id]
-        self._save_devices(devices)
+        if self._directory.remove(device_id) is not None:
+            self._commit_devices("purge_device")
         # Remove device and its entities from HA registries
         try:
             await self._remove_device_from_registry(device_id)
@@ -1581,18 +1531,14 @@ class MqttBridge:
             _LOGGER.debug("purge_device: registry removal failed for %s", device_id, exc_info=True)
         # Clear device settings and record a purged marker in Store to prevent resurrection
         try:
-            await self._storage_helper.async_init()
-            # remove device settings if present
-            ds = self._storage_helper.storage.get("device_settings", {})
-            if isinstance(ds, dict) and device_id in ds:
-                ds.pop(device_id, None)
-                if self._storage_helper._store:
-                    await self._storage_helper._store.async_save(self._storage_helper.storage)
+            await self._storage_helper.remove_device_settings(device_id)
+            await self._storage_helper.set_group_overlay(device_id, None)
             # add purged marker by device_id (guid marker added in __init__ handler when available)
             await self._storage_helper.add_purged(device_id=device_id)
         except Exception:
             _LOGGER.debug("purge_device: failed to update Store for %s", device_id, exc_info=True)
 
+    @serialized(refresh=True)
     async def async_rename_device(self, old_id: str, new_id: str) -> None:
         """Update the human-readable device_id for a device.
 
@@ -1603,38 +1549,34 @@ class MqttBridge:
         id so a connected client can self-rename.
         """
         _LOGGER.debug("rename_device: %s -> %s", old_id, new_id)
-        devices: List[Dict[str, Any]] = list(self.cfg.get(CONF_DEVICES, []) or [])
-        # Remove any pre-existing entries with new_id to avoid duplicates
-        devices = [d for d in devices if (d.get("device_id") != new_id)]
-        found = False
-        for d in devices:
-            if d.get("device_id") == old_id:
-                d["device_id"] = new_id
-                # Ensure profile follows the device id
-                if d.get("profile") and d.get("profile") != new_id:
-                    d["profile"] = new_id
-                found = True
-                break
-        if not found:
+        rec = self._directory.get(old_id)
+        if rec is not None:
+            # Ensure profile follows the device id; any record already using new_id is dropped
+            self._directory.rename(old_id, new_id, {"profile": new_id} if rec.get("profile") else None)
+        else:
             # Create a new blank record if old not found
-            devices.append({"device_id": new_id, "profile": ""})
+            self._directory.put({"device_id": new_id, "profile": ""})
         # Migrate profile key in Store/options if present
         try:
-            await self._storage_helper.async_init()
-            profs = dict(self._storage_helper.storage.get("profiles") or {})
-            if old_id in profs and new_id not in profs:
-                profs[new_id] = profs.pop(old_id)
-                await self._storage_helper.persist_profiles(profs)
+            keys = self._storage_helper.profile_keys()
+            if old_id in keys and new_id not in keys:
+                body = (await self._storage_helper.async_get_profiles([old_id])).get(old_id)
+                if body is not None:
+                    await self._storage_helper.async_update_profiles({new_id: body}, removed=[old_id])
+            overlay = self._storage_helper.get_group_overlays().get(old_id)
+            if overlay:
+                await self._storage_helper.set_group_overlay(new_id, overlay)
+                await self._storage_helper.set_group_overlay(old_id, None)
         except Exception:
             _LOGGER.exception("rename_device: profile migration failed for %s -> %s", old_id, new_id)
 
-        self._save_devices(devices)
+        self._commit_devices("rename_device")
 
         # Clear old retained topics; don't publish placeholder to avoid ghost device
         ph = bool(self.entry.options.get("placeholder_on_remove", False))
         await self._purge_device_retained(old_id, placeholder=ph)
-        # Publish updated configs for all devices
-        await self.async_publish_all_configs()
+        # Publish updated configs for all devices once the batch is applied
+        self._commands.request_republish()
         # Migrate HA device registry identifiers and name to the new device_id (preserve entities)
         try:
             await self._migrate_device_registry_identifier(old_id=old_id, new_id=new_id)
@@ -1660,8 +1602,14 @@ class MqttBridge:
             f"{base_dev}/{device_id}/heartbeat",
         ]
         _LOGGER.debug("purge_device_retained: clearing %d topics for %s", len(topics), device_id)
+        for state in (self._applied, self._published_hash, self._config_published_at, self._converge_seconds):
+            state.pop(device_id, None)
         for t in topics:
             await mqtt.async_publish(self.hass, t, "", qos=0, retain=True)
+        # Compressed/chunked config variant (manifest + chunks), if one was ever published
+        await self._clear_chunked_config(device_id, self._published_chunks.get(device_id, 0))
+        self._published_encoding.pop(device_id, None)
+        await self._publish_config_pages(device_id, [])
         if placeholder:
             # Optionally publish a placeholder unassigned config to let device recover quickly
             ph = {
@@ -1679,6 +1627,7 @@ class MqttBridge:
             _LOGGER.debug("purge_device_retained: publish placeholder %s bytes=%d", f"{base_cfg}/{device_id}/config", len(payload))
             await mqtt.async_publish(self.hass, f"{base_cfg}/{device_id}/config", payload, qos=0, retain=True)
 
+    @serialized()
     async def async_publish_device_settings(self, device_id: str, *, brightness: Optional[float] = None, keep_awake: Optional[bool] = None, orientation: Optional[str] = None) -> None:
         """Publish a settings JSON for the device to apply immediately on the client.
         App consumes keep_awake and brightness.
@@ -1710,27 +1659,170 @@ class MqttBridge:
         except Exception:
             _LOGGER.exception("store save failed (device_settings)")
 
+    @serialized()
     async def async_prune_unassigned(self) -> None:
         """Remove devices with no profile and no GUID, and purge their retained topics."""
-        devices: List[Dict[str, Any]] = list(self.cfg.get(CONF_DEVICES, []) or [])
-        keep: List[Dict[str, Any]] = []
-        removed: List[str] = []
-        for d in devices:
-            did = (d.get("device_id") or "").strip()
-            prof = (d.get("profile") or "").strip()
-            guid = (d.get("guid") or "").strip()
-            if did and (prof or guid):
-                keep.append(d)
-            elif did:
-                removed.append(did)
+        removed = [
+            d["device_id"] for d in self._directory
+            if not (d.get("profile") or "").strip() and not (d.get("guid") or "").strip()
+        ]
         if removed:
             _LOGGER.debug("pruning %d unassigned device(s): %s", len(removed), removed)
             for did in removed:
+                self._directory.remove(did)
                 await self._purge_device_retained(did)
-        self._save_devices(keep)
-        await self.async_publish_all_configs()
+        self._commit_devices("prune_unassigned")
+        self._commands.request_republish()
+
+    # ---------- entity registry ----------
+    async def _on_entity_registry_updated(self, event: Event) -> None:
+        data = event.data or {}
+        if data.get("action") != "update" or "old_entity_id" not in data:
+            return
+        old_id, new_id = data.get("old_entity_id"), data.get("entity_id")
+        if not isinstance(old_id, str) or not isinstance(new_id, str) or old_id == new_id:
+            return
+        self._sync_entity_index()
+        overlays = self._storage_helper.get_group_overlays()
+        if not self._entity_index.refs(old_id) and not any(
+            old_id.lower() in scan_profile(o) for o in overlays.values() if isinstance(o, dict)
+        ):
+            return
+        await self.async_rename_entity(old_id, new_id)
+
+    @serialized()
+    async def async_rename_entity(self, old_id: str, new_id: str) -> None:
+        """Point every profile widget using ``old_id`` at ``new_id`` and republish only affected devices."""
+        self._sync_entity_index()
+        keys = self._entity_index.profiles_using([old_id])
+        updates: Dict[str, Any] = {}
+        for key, prof in (await self._storage_helper.async_get_profiles(keys)).items():
+            renamed, changed = rename_entity_in_profile(prof, old_id, new_id)
+            if changed:
+                updates[key] = renamed
+        overlay_devices: List[str] = []
+        for did, overlay in self._storage_helper.get_group_overlays().items():
+            renamed, changed = rename_entity_in_profile(overlay, old_id, new_id)
+            if changed:
+                await self._storage_helper.set_group_overlay(did, renamed)
+                overlay_devices.append(did)
+        if not keys and not overlay_devices:
+            return
+        _LOGGER.debug("rename_entity: %s -> %s in profiles=%s overlays=%s", old_id, new_id, sorted(keys), overlay_devices)
+        if updates:
+            try:
+                # Also mirrors to options; the helper flags that write so it doesn't trigger a full options reload
+                await self._storage_helper.async_update_profiles(updates)
+                self._storage = dict(self._storage_helper.storage)
+                self._opts = self._store_options()
+                self._refresh_runtime()
+            except Exception:
+                _LOGGER.exception("rename_entity: persisting profiles failed")
+                return
+        if self.cfg.get(CONF_MIRROR_AUTO):
+            new_mirror = set(self._profile_entities())
+            removed = self._last_mirror_set - new_mirror
+            if removed:
+                await self._purge_mirror_entities(removed)
+            self._last_mirror_set = new_mirror
+            await self._maybe_start_mirror(publish_snapshot=False)
+            if new_id.lower() in self._mirror_wanted:
+                await self._publish_entity_snapshots([new_id.lower()])
+        affected = sorted(set(self._devices_using_profiles(keys)) | set(overlay_devices))
+        await self.async_publish_all_configs(reload=True, device_ids=affected)
+
+    # ---------- device groups ----------
+    @serialized()
+    async def async_set_group(self, group: str, profile: Optional[str]) -> None:
+        """Define a device group backed by a profile key; an empty profile deletes the group."""
+        group = (group or "").strip()
+        if not _valid_group_name(group):
+            _LOGGER.warning("set_group: invalid group name %r", group)
+            return
+        profile = (profile or "").strip() or None
+        if profile and profile not in self.cfg.profiles:
+            _LOGGER.warning("set_group: profile %s not found for group %s", profile, group)
+            return
+        await self._storage_helper.set_group(group, profile)
+        _LOGGER.debug("set_group: %s -> %s", group, profile)
+        self.schedule_republish_reload("set_group")
+
+    @serialized()
+    async def async_set_device_group(self, device_id: str, group: Optional[str], overlay: Optional[Dict[str, Any]] = None) -> None:
+        """Put a device in a group (empty group removes it) and store its overlay."""
+        group = (group or "").strip()
+        if group and not _valid_group_name(group):
+            _LOGGER.warning("set_device_group: invalid group name %r", group)
+            return
+        if device_id not in self._directory:
+            _LOGGER.warning("set_device_group: device %s not found", device_id)
+            return
+        await self._storage_helper.set_group_overlay(device_id, overlay if group else None)
+        if self._directory.update(device_id, {"group": group or None}):
+            self._commit_devices("set_device_group")
+        _LOGGER.debug("set_device_group: %s -> %s (overlay keys=%s)", device_id, group or None, list((overlay or {}).keys()))
+        self.schedule_republish_reload("set_device_group")
 
     # ---------- device actions ----------
+    async def _async_send_action(self, action: str, device_ids: List[str]) -> None:
+        """Deliver an action to the given devices with as few publishes as possible.
+
+        Broadcast-capable devices are covered by one publish on mqttdash/all/request
+        when every one of them is targeted, otherwise by one group request per group
+        whose capable members are all targeted. Everything else falls back to the
+        per-device request/settings pair.
+        """
+        if not device_ids:
+            return
+        groups = self._storage_helper.get_groups()
+        capable: Dict[str, str] = {}  # device_id -> defined group ("" when none)
+        for d in self.cfg.devices:
+            did = (d.get("device_id") or "").strip() if isinstance(d, dict) else ""
+            if did and CAP_BROADCAST in device_caps(d):
+                g = d.get("group") or ""
+                capable[did] = g if g in groups else ""
+        payload = json.dumps({"action": action})
+        remaining = set(device_ids)
+        if capable and set(capable) <= remaining:
+            _LOGGER.debug("send_action: %s via %s (%d device(s))", action, FIXED_BROADCAST_TOPIC, len(capable))
+            await mqtt.async_publish(self.hass, FIXED_BROADCAST_TOPIC, payload, qos=0, retain=False)
+            remaining -= set(capable)
+        else:
+            by_group: Dict[str, Set[str]] = {}
+            for did, g in capable.items():
+                if g:
+                    by_group.setdefault(g, set()).add(did)
+            for g, members in sorted(by_group.items()):
+                if members <= remaining:
+                    _LOGGER.debug("send_action: %s via group %s (%d device(s))", action, g, len(members))
+                    await mqtt.async_publish(self.hass, group_request_topic(g), payload, qos=0, retain=False)
+                    remaining -= members
+        for did in device_ids:
+            if did in remaining:
+                await self.async_publish_device_action(did, action=action)
+
+    @serialized()
+    async def async_broadcast_action(self, action: str, group: Optional[str] = None) -> None:
+        """Fleet-wide (or group-wide) reload, snapshot or offboard."""
+        action = (action or "").strip().lower()
+        if action not in _BROADCAST_ACTIONS:
+            _LOGGER.warning("broadcast_action: unsupported action %r", action)
+            return
+        group = (group or "").strip()
+        device_ids = [
+            (d.get("device_id") or "").strip()
+            for d in self.cfg.devices
+            if isinstance(d, dict) and (d.get("device_id") or "").strip() and (not group or d.get("group") == group)
+        ]
+        _LOGGER.debug("broadcast_action: %s group=%s devices=%d", action, group or None, len(device_ids))
+        if action == "snapshot":
+            # Refresh retained states first so clients re-reading them get current values
+            await self.async_publish_snapshot()
+        await self._async_send_action(action, device_ids)
+        if action == "offboard":
+            for did in device_ids:
+                await self.async_purge_device(did, notify=False)
+
     async def async_publish_device_action(self, device_id: str, *, action: str) -> None:
         if not device_id or not action:
             return
@@ -5,7 +5,7 @@ from typing import Any, Callable, Dict, List
 from homeassistant.core import HomeAssistant  # type: ignore
 from homeassistant.config_entries import ConfigEntry  # type: ignore
 
-from .const import DOMAIN, CONF_DEVICES  # type: ignore
+from .const import DOMAIN  # type: ignore
 from .mqtt_bridge import MqttBridge  # type: ignore
 import voluptuous as vol  # type: ignore
 import homeassistant.helpers.config_validation as cv  # type: ignore
@@ -49,7 +49,7 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         remove_callbacks.append(_remove)
 
     try:
-        devices: List[Dict[str, Any]] = list(bridge.cfg.get(CONF_DEVICES, []) or [])
+        devices: List[Dict[str, Any]] = list(bridge.cfg.devices)
         for d in devices:
             did = (d.get("device_id") or "").strip()
             if did:
@@ -0,0 +1,158 @@
+"""Immutable runtime configuration snapshots.
+
+The bridge used to rebuild and copy its merged ``data``/``options`` dict in
+nearly every method. A ``RuntimeSnapshot`` is built once per real change and
+shared by all readers without copying. Each snapshot carries a generation
+number, plus per-section generations for profiles and devices that only move
+when that section actually changed, so caches built on top can check
+staleness with a single integer comparison.
+
+Snapshots are read-only mappings. The profile table is a read-only view and
+the device list is a tuple. Profile bodies and device dicts are shared with the
+next snapshot when unchanged, so callers must treat them as read-only and copy
+before editing.
+
+When the caller knows the versions of the profile and device sections (the
+Store helper's profile generation and the device directory's generation), a
+rebuild compares just those numbers instead of the section contents, so it
+costs O(other options) rather than O(total config).
+"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .const import CONF_DEVICES, CONF_PROFILES
+
+
+class RuntimeSnapshot(Mapping):
+    """Read-only merged view of entry data + options with generation counters."""
+
+    __slots__ = (
+        "_cfg", "generation", "profiles_generation", "devices_generation", "profiles_version", "devices_version",
+    )
+
+    def __init__(
+        self,
+        cfg: Dict[str, Any],
+        generation: int,
+        profiles_generation: int,
+        devices_generation: int,
+        versions: Optional[Tuple[Any, Any]] = None,
+    ) -> None:
+        self._cfg = cfg
+        self.generation = generation
+        self.profiles_generation = profiles_generation
+        self.devices_generation = devices_generation
+        # Caller-supplied versions of the profile and device sections (None when unknown)
+        self.profiles_version, self.devices_version = versions or (None, None)
+
+    @classmethod
+    def build(
+        cls,
+        data: Optional[Dict[str, Any]],
+        options: Optional[Dict[str, Any]],
+        previous: Optional["RuntimeSnapshot"] = None,
+        versions: Optional[Tuple[Any, Any]] = None,
+    ) -> "RuntimeSnapshot":
+        """Merge ``data`` and ``options`` (options win) into a new snapshot.
+
+        Returns ``previous`` itself when nothing changed. Unchanged profile and
+        device sections reuse the previous objects and keep their generations.
+        ``versions`` is ``(profiles_version, devices_version)`` for the sections
+        in ``options``; when the previous snapshot has versions too, a section
+        counts as changed exactly when its version differs, and its contents
+        are not compared.
+        """
+        cfg: Dict[str, Any] = {**(data or {}), **(options or {})}
+        pv, dv = versions or (None, None)
+        if previous is None:
+            cls._own_sections(cfg)
+            return cls(cfg, 1, 1, 1, versions)
+
+        gen = previous.generation
+        prof_gen = previous.profiles_generation
+        dev_gen = previous.devices_generation
+        if cls._section_same(pv, previous.profiles_version, cfg, CONF_PROFILES, previous.profiles):
+            cfg[CONF_PROFILES] = previous.profiles
+        else:
+            prof_gen = gen + 1
+        if cls._section_same(dv, previous.devices_version, cfg, CONF_DEVICES, previous.devices):
+            cfg[CONF_DEVICES] = previous.devices
+        else:
+            dev_gen = gen + 1
+        if prof_gen == previous.profiles_generation and dev_gen == previous.devices_generation and cfg == previous._cfg:
+            # Versions seen for the first time (or changed without a content change): compare by them next time
+            previous.profiles_version, previous.devices_version = pv, dv
+            return previous
+        return cls(cfg, gen + 1, prof_gen, dev_gen, versions)
+
+    @classmethod
+    def _section_same(cls, version: Any, prev_version: Any, cfg: Dict[str, Any], key: str, prev_value: Any) -> bool:
+        """Normalize ``cfg[key]`` unless it is unchanged; by version when both are known, else by content."""
+        if version is not None and prev_version is not None:
+            if version == prev_version:
+                return True
+            cls._own_sections(cfg, key)
+            return False
+        if cfg.get(key) is prev_value:
+            return True
+        cls._own_sections(cfg, key)
+        return cfg[key] == prev_value
+
+    @staticmethod
+    def _own_sections(cfg: Dict[str, Any], only: Optional[str] = None) -> None:
+        """Make the profile table a read-only copy and the device list a tuple (``only`` one of them)."""
+        if only in (None, CONF_PROFILES):
+            profiles = cfg.get(CONF_PROFILES)
+            cfg[CONF_PROFILES] = MappingProxyType(dict(profiles) if isinstance(profiles, Mapping) else {})
+        if only in (None, CONF_DEVICES):
+            devices = cfg.get(CONF_DEVICES)
+            cfg[CONF_DEVICES] = (
+                tuple(d for d in devices if isinstance(d, dict)) if isinstance(devices, (list, tuple)) else ()
+            )
+
+    # Mapping protocol (read-only)
+    def __getitem__(self, key: str) -> Any:
+        return self._cfg[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._cfg)
+
+    def __len__(self) -> int:
+        return len(self._cfg)
+
+    def __repr__(self) -> str:
+        return (
+            f"RuntimeSnapshot(gen={self.generation}, profiles={len(self.profiles)}, "
+            f"devices={len(self.devices)})"
+        )
+
+    @property
+    def profiles(self) -> Mapping:
+        """Read-only view of the profile table."""
+        return self._cfg[CONF_PROFILES]
+
+    @property
+    def devices(self) -> Tuple[Dict[str, Any], ...]:
+        return self._cfg[CONF_DEVICES]
+
+    def device(self, device_id: str) -> Optional[Dict[str, Any]]:
+        return next((d for d in self.devices if d.get("device_id") == device_id), None)
+
+    def changed_since(self, generation: int) -> bool:
+        return self.generation != generation
+
+    def profiles_changed_since(self, generation: int) -> bool:
+        return self.profiles_generation != generation
+
+    def devices_changed_since(self, generation: int) -> bool:
+        return self.devices_generation != generation
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Plain (shallow) dict copy, e.g. for JSON dumps."""
+        out = dict(self._cfg)
+        out[CONF_PROFILES] = dict(self.profiles)
+        out[CONF_DEVICES] = list(self.devices)
+        return out
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import Any
 from ..const import DOMAIN, CONF_DEVICES
-from ..entities.device_sensors import BatteryLevelSensor
+from ..entities.device_sensors import BatteryLevelSensor, ConfigConvergeTimeSensor
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
@@ -13,6 +13,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
 		if not dev_id:
 			continue
 		ents.append(BatteryLevelSensor(hass, entry, dev_id))
+		ents.append(ConfigConvergeTimeSensor(hass, entry, dev_id))
 		# Charging moved to binary_sensor platform for compatibility
 		# (SensorDeviceClass.BATTERY_CHARGING may not exist in your HA version)
 	async_add_entities(ents, update_before_add=False)
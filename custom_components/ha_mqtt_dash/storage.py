@@ -1,19 +1,38 @@
+"""Store persistence for profiles, device records and settings (see StorageHelper).
+
+Profile revision history is bounded per profile: each profile keeps at most
+``HISTORY_MAX_REVISIONS`` reverse deltas totalling at most
+``HISTORY_MAX_BYTES``, stored in that profile's shard. There is no budget
+across profiles, so the history of the whole Store can grow to the number of
+profiles times ``HISTORY_MAX_BYTES``; it is dropped with the profile.
+"""
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import os
-from typing import Any, Dict, List, Set
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 import hashlib
+import json
 import time
 
 from homeassistant.core import HomeAssistant  # type: ignore
 from homeassistant.config_entries import ConfigEntry  # type: ignore
 from homeassistant.helpers.storage import Store  # type: ignore
 
+from .directory import DeviceDirectory, device_directory
+from .entity_index import scan_profile
+from .store_archive import ArchiveWriter, check_header, header, open_archive, read_records
+from .config_builder import COMPILER_VERSION, fleet_hash, profile_digest, refresh_artifacts
+from .json_delta import apply_patch, make_patch
 from .const import (
     CONF_DEVICES,
+    CONF_PROFILE_INDEX,
+    CONF_PROFILE_INDEX_ONLY,
+    CONF_PROFILE_LAZY,
     CONF_PROFILES,
+    DOMAIN,
     STORAGE_KEY,
     STORAGE_VERSION,
 )
@@ -21,109 +40,808 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+# hass.data key holding the shared StorageHelper per config entry
+_HELPERS_KEY = f"{DOMAIN}_storage"
+
+# Seconds to coalesce Store writes (write-behind); flushed on unload and by HA on shutdown
+SAVE_DELAY = 5.0
+# Longest a change may stay unwritten: each change restarts HA's delay timer, so steady traffic would postpone it forever
+SAVE_MAX_LATENCY = 30.0
+
+# Profile bodies kept in memory in lazy mode (least recently used go first; unsaved edits stay)
+PROFILE_CACHE_SIZE = 32
+
+# Revision history kept per profile (not per device or Store-wide): at most this many reverse deltas,
+# and at most this many bytes of them
+HISTORY_MAX_REVISIONS = 20
+HISTORY_MAX_BYTES = 64 * 1024
+
+# Index Store layout marker. Layout 2 keeps each profile (and its artifact) in a Store of its own;
+# a Store without it is the original single document and is migrated on load
+_SHARDED_LAYOUT = 2
+# Sections that live in the per-profile Stores rather than the index
+_SHARDED_KEYS = ("profiles", "artifacts", "history")
+# Index sections held by the DeviceDirectory while loaded
+_DIRECTORY_KEYS = ("devices", "purged_devices", "purged_guids")
+
+
+def _empty_storage() -> Dict[str, Any]:
+    return {
+        "profiles": {},
+        "device_settings": {},
+        "purged_devices": [],
+        "purged_guids": [],
+        "config_revs": {},
+        # Device groups: {group: {"profile": profile_key}}; members carry "group" on their device record
+        "groups": {},
+        # Per-device merge-patch overlays applied on top of the group config: {device_id: {...}}
+        "group_overlays": {},
+        # Precompiled profiles: {profile_key: {"compiler", "hash", "ui", "topics", "entities"}}
+        "artifacts": {},
+        # Revision history: {profile_key: [{"ts", "hash", "bytes", "patch"}, ...]}, newest first
+        # (see push_history)
+        "history": {},
+        # Device records (device_id, profile, guid, screen, caps, group); entry options only hold
+        # their directory (see device_directory)
+        "devices": [],
+    }
+
+def push_history(
+    history: List[Dict[str, Any]], old: Dict[str, Any], new: Dict[str, Any], old_hash: Optional[str],
+) -> List[Dict[str, Any]]:
+    """``history`` with a revision for ``old`` in front, trimmed to the caps (oldest go first).
+
+    Each revision is a reverse delta: its ``patch`` turns the body after it
+    (the current body for the newest) back into the body it replaced, so
+    ``steps`` revisions back is the current body with the first ``steps``
+    patches applied in order. A delta larger than HISTORY_MAX_BYTES is not
+    kept, and neither are the older revisions, since they no longer chain to
+    the current body.
+    """
+    patch = make_patch(new, old)
+    size = len(json.dumps(patch, separators=(",", ":"), ensure_ascii=False))
+    out = [{"ts": int(time.time()), "hash": old_hash or "", "bytes": size, "patch": patch}]
+    total = size
+    for rev in history[:HISTORY_MAX_REVISIONS - 1]:
+        total += rev.get("bytes", 0)
+        if total > HISTORY_MAX_BYTES:
+            break
+        out.append(rev)
+    return out if size <= HISTORY_MAX_BYTES else out[1:]
+
+
+def _shard_key(profile_key: str) -> str:
+    """Store key for one profile's shard (readable slug plus a hash for uniqueness)."""
+    slug = re.sub(r"[^a-z0-9_]+", "_", profile_key.lower()).strip("_")[:40] or "profile"
+    digest = hashlib.sha1(profile_key.encode("utf-8")).hexdigest()[:8]
+    return f"{DOMAIN}.profile.{slug}_{digest}"
+
+
+def get_storage_helper(hass: HomeAssistant, entry: ConfigEntry) -> "StorageHelper":
+    """Return the shared StorageHelper for ``entry`` (created on first use).
+
+    The bridge, options flow, services and HTTP views all use this one
+    instance, so the Store is read from disk once and kept in memory.
+    """
+    helpers: Dict[str, StorageHelper] = hass.data.setdefault(_HELPERS_KEY, {})
+    helper = helpers.get(entry.entry_id)
+    if helper is None:
+        helper = helpers[entry.entry_id] = StorageHelper(hass, entry)
+    else:
+        helper.entry = entry
+    return helper
+
+
+def drop_storage_helper(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the shared helper of a removed entry."""
+    hass.data.get(_HELPERS_KEY, {}).pop(entry.entry_id, None)
+
 
 class StorageHelper:
-    """Encapsulate HA Store usage and migration for profiles and device settings."""
+    """Encapsulate HA Store usage and migration for profiles and device settings.
+
+    Use ``get_storage_helper`` rather than constructing one: the Store is loaded
+    once and the in-memory copy is canonical afterwards. ``generation`` moves on
+    every change, so callers can tell whether anything changed since they last
+    looked without comparing contents; ``profiles_generation`` moves only when
+    the profiles (or, in lazy mode, the profile index) do.
+
+    On disk the data is sharded. A small index Store (``STORAGE_KEY``) holds
+    device records, device settings, purge markers, revisions, groups and the
+    profile → shard map, and every profile lives with its artifact in a Store
+    of its own. In memory ``storage`` stays one dict, except that device
+    records and purge markers are held by ``directory`` (a DeviceDirectory).
+    A change rewrites the index plus only the shards of the profiles it touched.
+
+    Writes are write-behind: changes mark Stores dirty and HA's delayed save
+    writes each one once per ``SAVE_DELAY`` window. Since every change
+    restarts that window, changes that keep coming (e.g. device telemetry)
+    force a flush once the oldest unwritten one is ``SAVE_MAX_LATENCY`` old.
+    HA flushes pending delayed saves on shutdown; ``async_flush`` writes them
+    on unload.
+
+    With the ``profile_lazy`` option, startup reads only the index: profile
+    keys, hashes, sizes and entity sets (``profiles_meta``). Bodies and their
+    artifacts are read from their shards by ``async_get_profiles`` and only the
+    ``PROFILE_CACHE_SIZE`` most recently used stay in ``storage["profiles"]``.
+    ``profile_keys`` always lists every profile.
+    """
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
         self.hass = hass
         self.entry = entry
         self._store: Store | None = Store(self.hass, STORAGE_VERSION, STORAGE_KEY)
-        self._storage: Dict[str, Any] = {"profiles": {}, "device_settings": {}, "purged_devices": [], "purged_guids": []}
+        self._shards: Dict[str, Store] = {}
+        self._storage: Dict[str, Any] = _empty_storage()
+        # Device records and purge markers, indexed (their Store sections while loaded)
+        self.directory = DeviceDirectory()
+        self._loaded = False
+        self.generation = 0
+        self.profiles_generation = 0
+        self._dirty = False
+        self._dirty_profiles: Set[str] = set()
+        # time.monotonic() of the oldest change not yet written, and the flush forced by SAVE_MAX_LATENCY
+        self._unsaved_since: Optional[float] = None
+        self._forced_flush: Optional[asyncio.Future] = None
+        # Every stored profile key (storage["profiles"] may hold only some bodies in lazy mode)
+        self._keys: Set[str] = set()
+        self.lazy = False
+        # profile_hash, JSON size and referenced entities per profile, recomputed only for profiles that changed
+        self._profile_hashes: Dict[str, str] = {}
+        self._profile_sizes: Dict[str, int] = {}
+        self._profile_entities: Dict[str, List[str]] = {}
+        # Called after this helper writes entry options, so the options listener can ignore its own write
+        self.on_options_mirror: Optional[Callable[[], None]] = None
+        # Saves asked for by changes vs Store writes actually done (diagnostics)
+        self.stats = {"writes_requested": 0, "writes_performed": 0}
 
     @property
     def storage(self) -> Dict[str, Any]:
         return self._storage
 
+    def _shard_store(self, key: str) -> Store:
+        store = self._shards.get(key)
+        if store is None:
+            store = self._shards[key] = Store(self.hass, STORAGE_VERSION, _shard_key(key))
+        return store
+
+    def _schedule_save(self, reason: str, profiles: Iterable[str] = ()) -> None:
+        """Record a change and schedule coalesced writes of the index and the given profile shards."""
+        self.generation += 1
+        self.stats["writes_requested"] += 1
+        self._dirty = True
+        try:
+            if self._store:
+                self._store.async_delay_save(self._index_data, SAVE_DELAY)
+                for key in profiles:
+                    self._dirty_profiles.add(key)
+                    self._shard_store(key).async_delay_save(lambda key=key: self._shard_data(key), SAVE_DELAY)
+        except Exception:
+            _LOGGER.exception("store save failed (%s)", reason)
+        now = time.monotonic()
+        if self._unsaved_since is None:
+            self._unsaved_since = now
+        elif now - self._unsaved_since >= SAVE_MAX_LATENCY and (self._forced_flush is None or self._forced_flush.done()):
+            _LOGGER.debug("store: changes unsaved for %.0fs, flushing (%s)", now - self._unsaved_since, reason)
+            self._forced_flush = self.hass.async_create_task(self.async_flush())
+
+    def _index_data(self) -> Dict[str, Any]:
+        # Called by the Store when the delayed write actually happens
+        self._dirty = False
+        self._unsaved_since = None
+        self.stats["writes_performed"] += 1
+        data = {k: v for k, v in self._storage.items() if k not in _SHARDED_KEYS}
+        data.update(self.directory.as_store())
+        data["layout"] = _SHARDED_LAYOUT
+        data["profile_shards"] = {k: _shard_key(k) for k in sorted(self._keys)}
+        return data
+
+    def _shard_data(self, key: str) -> Dict[str, Any]:
+        self._dirty_profiles.discard(key)
+        self.stats["writes_performed"] += 1
+        return {
+            "key": key,
+            "profile": (self._storage.get("profiles") or {}).get(key),
+            "artifact": self.get_artifacts().get(key),
+            "history": self._history().get(key) or [],
+        }
+
+    async def _async_drop_shards(self, keys: Iterable[str]) -> None:
+        """Delete the shard Stores of removed profiles (cancels their pending writes)."""
+        for key in keys:
+            self._dirty_profiles.discard(key)
+            try:
+                await self._shard_store(key).async_remove()
+            except Exception:
+                _LOGGER.debug("store: removing shard for %s failed", key, exc_info=True)
+            self._shards.pop(key, None)
+
+    async def async_flush(self) -> None:
+        """Write pending changes now (replaces the pending delayed saves). Shards go before the index."""
+        if not self._store:
+            return
+        for key in list(self._dirty_profiles):
+            if key not in self._keys:
+                self._dirty_profiles.discard(key)
+                continue
+            try:
+                await self._shard_store(key).async_save(self._shard_data(key))
+            except Exception:
+                self._dirty_profiles.add(key)
+                _LOGGER.exception("store flush failed (profile %s)", key)
+        if self._dirty:
+            try:
+                await self._store.async_save(self._index_data())
+            except Exception:
+                self._dirty = True
+                _LOGGER.exception("store flush failed")
+        _LOGGER.debug(
+            "store: flushed (writes requested=%d performed=%d)",
+            self.stats["writes_requested"], self.stats["writes_performed"],
+        )
+
+    def profile_index(self) -> Dict[str, Dict[str, Any]]:
+        """{profile_key: {"hash", "size"}} for the stored profiles (what index-only options hold)."""
+        return {
+            k: {"hash": self._profile_hashes.get(k, ""), "size": self._profile_sizes.get(k, 0)}
+            for k in sorted(self._keys)
+        }
+
+    def options_view(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """``options`` with profiles in the form entry options should hold.
+
+        With ``profile_index_only`` or ``profile_lazy`` set (in ``options``), or
+        while bodies are loaded lazily, profile bodies are replaced by the
+        profile index; otherwise the Store profiles are mirrored in full.
+        Devices are cut down to their directory entries.
+        """
+        out = dict(options or {})
+        if isinstance(out.get(CONF_DEVICES), list):
+            out[CONF_DEVICES] = device_directory(out[CONF_DEVICES])
+        if out.get(CONF_PROFILE_INDEX_ONLY) or out.get(CONF_PROFILE_LAZY) or self.lazy:
+            out.pop(CONF_PROFILES, None)
+            out[CONF_PROFILE_INDEX] = self.profile_index()
+        else:
+            out.pop(CONF_PROFILE_INDEX, None)
+            out[CONF_PROFILES] = dict(self._storage.get("profiles") or {})
+        return out
+
+    def _mirror_profiles(self, reason: str) -> None:
+        """Mirror Store profiles (or just their index) into entry options unless they already match."""
+        current = dict(self.entry.options or {})
+        new_opts = self.options_view(current)
+        if new_opts == current:
+            return
+        try:
+            self.hass.config_entries.async_update_entry(self.entry, options=new_opts)
+        except Exception:
+            _LOGGER.exception("options mirror failed (%s)", reason)
+            return
+        if self.on_options_mirror is not None:
+            self.on_options_mirror()
+
+    def _update_profiles_meta(self, changed: Optional[Iterable[str]] = None) -> bool:
+        """Re-digest ``changed`` profiles (all in memory when None) and refresh profiles_meta; True if it moved.
+
+        profiles_meta is ``{"hash": fleet hash (Merkle root), "profiles": {key: hash},
+        "sizes": {key: bytes}, "entities": {key: [entity_id, ...]}, "updated_at"}``.
+        Only profiles whose body is in memory can be re-digested.
+        """
+        profiles = self._storage.get("profiles") or {}
+        hashes = self._profile_hashes
+        for table in (hashes, self._profile_sizes, self._profile_entities):
+            for key in [k for k in table if k not in self._keys]:
+                table.pop(key, None)
+        for key in (profiles if changed is None else changed):
+            if key not in profiles:
+                continue
+            try:
+                hashes[key], self._profile_sizes[key] = profile_digest(profiles[key])
+                self._profile_entities[key] = sorted(scan_profile(profiles[key]))
+            except Exception:
+                _LOGGER.debug("store: hashing profile %s failed", key, exc_info=True)
+                hashes.pop(key, None)
+                self._profile_sizes.pop(key, None)
+                self._profile_entities.pop(key, None)
+        new_meta = {
+            "hash": fleet_hash(hashes),
+            "profiles": dict(hashes),
+            "sizes": dict(self._profile_sizes),
+            "entities": {k: list(v) for k, v in self._profile_entities.items()},
+        }
+        meta = self._storage.get("profiles_meta")
+        if isinstance(meta, dict) and all(meta.get(k) == v for k, v in new_meta.items()):
+            return False
+        new_meta["updated_at"] = int(time.time())
+        self._storage["profiles_meta"] = new_meta
+        return True
+
+    def get_profile_hash(self, key: str) -> Optional[str]:
+        """Content hash of one stored profile (usable as a cache key or HTTP ETag)."""
+        return self._profile_hashes.get(key)
+
+    def get_profile_entities(self) -> Dict[str, List[str]]:
+        """{profile_key: sorted entity IDs it references}, kept for every profile (shared; don't edit)."""
+        return self._profile_entities
+
+    def profile_keys(self) -> List[str]:
+        """Every stored profile key, whether or not its body is in memory."""
+        return sorted(self._keys)
+
+    def get_fleet_hash(self) -> str:
+        """Merkle root over all profile hashes; changes whenever any profile does."""
+        meta = self._storage.get("profiles_meta")
+        return meta.get("hash") if isinstance(meta, dict) and meta.get("hash") else fleet_hash(self._profile_hashes)
+
+    async def _refresh_artifacts(self) -> Set[str]:
+        """Recompile artifacts for new/changed profiles (or after a compiler bump); drops removed ones.
+
+        Returns the profile keys whose artifact was recompiled.
+        """
+        current = self._storage.get("artifacts")
+        current = current if isinstance(current, dict) else {}
+        try:
+            artifacts, compiled = await self.hass.async_add_executor_job(
+                refresh_artifacts, dict(self._storage.get("profiles") or {}), current, dict(self._profile_hashes),
+            )
+        except Exception:
+            _LOGGER.exception("profile artifact refresh failed")
+            return set()
+        self._storage["artifacts"] = artifacts
+        if compiled:
+            _LOGGER.debug("store: compiled profile artifacts %s", compiled)
+        return set(compiled)
+
+    def _profile_changed(self, key: str, prof: Any) -> bool:
+        if key not in self._keys:
+            return True
+        cur = (self._storage.get("profiles") or {}).get(key)
+        if cur is not None:
+            return cur is not prof and cur != prof
+        # Body not in memory (lazy mode): compare content hashes instead
+        try:
+            return profile_digest(prof)[0] != self._profile_hashes.get(key)
+        except Exception:
+            return True
+
+    async def _async_apply_profiles(self, updates: Dict[str, Any], removed: Iterable[str], reason: str) -> bool:
+        """Store new/edited profiles and drop ``removed`` ones; only their shards get rewritten.
+
+        Returns True if anything changed.
+        """
+        changed = {k for k, v in updates.items() if self._profile_changed(k, v)}
+        removed = {k for k in removed if k in self._keys and k not in updates}
+        if not changed and not removed:
+            return False
+        resident = self._storage.setdefault("profiles", {})
+        if self.lazy:
+            # The replaced bodies (and their history) are needed for the revision deltas
+            await self._async_load_bodies([k for k in changed if k in self._keys and k not in resident])
+        await self._async_record_history({k: updates[k] for k in changed if k in resident})
+        for key in removed:
+            resident.pop(key, None)
+            self.get_artifacts().pop(key, None)
+            self._history().pop(key, None)
+            self._keys.discard(key)
+        for key in changed:
+            # Re-inserted so it counts as most recently used
+            resident.pop(key, None)
+            resident[key] = updates[key]
+            self._keys.add(key)
+        self._update_profiles_meta(changed)
+        self.profiles_generation += 1
+        changed |= await self._refresh_artifacts()
+        await self._async_drop_shards(removed)
+        self._schedule_save(reason, profiles=changed)
+        self._evict()
+        return True
+
+    def _history(self) -> Dict[str, List[Dict[str, Any]]]:
+        history = self._storage.get("history")
+        if not isinstance(history, dict):
+            history = self._storage["history"] = {}
+        return history
+
+    async def _async_record_history(self, updates: Dict[str, Any]) -> None:
+        """Push a reverse delta for each stored profile about to be replaced by ``updates``.
+
+        The deltas are computed in the executor; only edits pay for them, never config publishes.
+        """
+        resident = self._storage.get("profiles") or {}
+        history = self._history()
+        jobs = [
+            (key, history.get(key) or [], resident[key], new, self._profile_hashes.get(key))
+            for key, new in updates.items()
+            if isinstance(resident.get(key), dict) and isinstance(new, dict)
+        ]
+        if not jobs:
+            return
+
+        def _run() -> Dict[str, List[Dict[str, Any]]]:
+            return {key: push_history(hist, old, new, old_hash) for key, hist, old, new, old_hash in jobs}
+
+        try:
+            history.update(await self.hass.async_add_executor_job(_run))
+        except Exception:
+            _LOGGER.exception("store: recording profile history failed")
+
+    async def async_get_profile_history(self, key: str) -> List[Dict[str, Any]]:
+        """Revisions kept for a profile, newest first, without their patches."""
+        await self.async_get_profiles([key])
+        return [{k: v for k, v in rev.items() if k != "patch"} for rev in self._history().get(key) or []]
+
+    async def async_rollback_profile(self, key: str, steps: int = 1) -> Optional[Dict[str, Any]]:
+        """Restore a profile to how it was ``steps`` revisions ago; returns the restored body.
+
+        The rollback is saved as a new revision, so it can itself be rolled back.
+        Returns None when the profile is unknown or has fewer revisions.
+        """
+        body = (await self.async_get_profiles([key])).get(key)
+        revisions = self._history().get(key) or []
+        if body is None or steps < 1 or steps > len(revisions):
+            _LOGGER.warning(
+                "store: cannot roll back %s by %d (%d revision(s) kept)", key, steps, len(revisions),
+            )
+            return None
+        try:
+            for rev in revisions[:steps]:
+                body = apply_patch(body, rev.get("patch") or [])
+        except ValueError:
+            _LOGGER.exception("store: revision history of %s does not apply", key)
+            return None
+        await self.async_update_profiles({key: body})
+        _LOGGER.info("store: rolled back profile %s by %d revision(s)", key, steps)
+        return body
+
+    async def _async_set_profiles(self, profiles: Dict[str, Any], reason: str) -> bool:
+        """Replace the profiles; only new, edited or recompiled profiles get their shard rewritten."""
+        return await self._async_apply_profiles(dict(profiles), self._keys - set(profiles), reason)
+
+    def _evict(self) -> None:
+        """Lazy mode: drop the least recently used bodies beyond PROFILE_CACHE_SIZE (unsaved ones stay)."""
+        if not self.lazy:
+            return
+        resident = self._storage.get("profiles") or {}
+        excess = len(resident) - PROFILE_CACHE_SIZE
+        for key in list(resident):
+            if excess <= 0:
+                break
+            if key in self._dirty_profiles:
+                continue
+            resident.pop(key, None)
+            self.get_artifacts().pop(key, None)
+            self._history().pop(key, None)
+            excess -= 1
+
+    async def async_get_profiles(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Profile bodies for ``keys`` (every profile when None); unknown keys are skipped.
+
+        The bodies are shared: copy before editing. In lazy mode missing ones
+        are read from their shards, and only the most recently used stay in memory.
+        """
+        resident = self._storage.setdefault("profiles", {})
+        wanted = sorted(self._keys) if keys is None else [k for k in dict.fromkeys(keys) if k in self._keys]
+        if self.lazy:
+            for key in wanted:
+                if key in resident:
+                    resident[key] = resident.pop(key)
+            missing = [k for k in wanted if k not in resident]
+            if missing:
+                await self._async_load_bodies(missing)
+        out = {k: resident[k] for k in wanted if k in resident}
+        self._evict()
+        return out
+
+    async def _async_load_bodies(self, keys: List[str]) -> None:
+        """Read the shards of ``keys`` into memory; fills in missing metadata and recompiles stale artifacts."""
+        profiles, artifacts, history, missing = await self._async_load_shards({k: _shard_key(k) for k in keys})
+        resident = self._storage.setdefault("profiles", {})
+        self._history().update(history)
+        current = self._storage.get("artifacts")
+        if not isinstance(current, dict):
+            current = self._storage["artifacts"] = {}
+        resident.update(profiles)
+        current.update(artifacts)
+        lost = [k for k in keys if k not in profiles]
+        self._keys.difference_update(lost)
+        stale = [k for k in profiles if k not in self._profile_hashes or k not in self._profile_entities]
+        moved = self._update_profiles_meta(stale) if stale or lost else False
+        if moved:
+            self.profiles_generation += 1
+        outdated = [
+            k for k in profiles
+            if not isinstance(current.get(k), dict)
+            or current[k].get("compiler") != COMPILER_VERSION
+            or current[k].get("hash") != self._profile_hashes.get(k)
+        ]
+        recompiled = await self._refresh_artifacts() if outdated else set()
+        if moved or recompiled:
+            self._schedule_save("profile metadata", profiles=recompiled)
+        _LOGGER.debug("store: loaded %d profile bod(ies) on demand (%d recompiled)", len(profiles), len(recompiled))
+
+    def _lazy_wanted(self) -> bool:
+        return bool({**(self.entry.data or {}), **(self.entry.options or {})}.get(CONF_PROFILE_LAZY))
+
+    async def _async_apply_mode(self) -> None:
+        """Follow the ``profile_lazy`` option: drop bodies down to the cache, or load them all back."""
+        lazy = self._lazy_wanted()
+        if lazy == self.lazy:
+            return
+        if lazy:
+            self.lazy = True
+            self._evict()
+        else:
+            resident = self._storage.setdefault("profiles", {})
+            missing = [k for k in sorted(self._keys) if k not in resident]
+            if missing:
+                await self._async_load_bodies(missing)
+            self.lazy = False
+        self.profiles_generation += 1
+        _LOGGER.debug("store: profile bodies %s", "loaded on demand" if lazy else "kept in memory")
+
+    def get_artifacts(self) -> Dict[str, Dict[str, Any]]:
+        """Return {profile_key: artifact} as last saved with the profiles (see config_builder.usable_artifacts)."""
+        artifacts = self._storage.get("artifacts")
+        if not isinstance(artifacts, dict):
+            return {}
+        return artifacts
+
     def _profiles_path(self) -> str:
         # Deprecated: no longer used; Store is the only persistence backend
         return self.hass.config.path("ha_mqtt_dash_profiles.json")
 
     async def async_init(self) -> None:
-        """Load HA Store. Store is the sole canonical source. Mirror to options for UI only."""
-        # 1) Load existing store
+        """Load the HA Store (once per helper) and mirror profiles to options for the UI.
+
+        Store is the sole canonical source. Later calls don't touch disk; they
+        only re-mirror profiles if options drifted. Nothing is written back
+        unless loading migrated something.
+        """
+        if not self._loaded:
+            await self._async_load()
+        await self._async_apply_mode()
+        self._mirror_profiles("init")
+
+    async def _async_load(self) -> None:
         loaded = None
         try:
             loaded = await self._store.async_load() if self._store else None
         except Exception:
             _LOGGER.exception("store load failed")
-        if isinstance(loaded, dict):
-            self._storage = {**{"profiles": {}, "device_settings": {}, "purged_devices": [], "purged_guids": []}, **loaded}
-        else:
-            self._storage = {"profiles": {}, "device_settings": {}, "purged_devices": [], "purged_guids": []}
-
-        # 2) Use Store contents as canonical; no options fallback
-        store_profiles = dict(self._storage.get("profiles", {}) or {})
-        self._storage["profiles"] = dict(store_profiles)
+        loaded = loaded if isinstance(loaded, dict) else {}
+        legacy = loaded.get("layout") != _SHARDED_LAYOUT
+        index = {k: v for k, v in loaded.items() if k not in ("layout", "profile_shards")}
+        self._storage = {**_empty_storage(), **index}
         # Ensure keys exist
+        dirty = legacy or any(k not in index for k in _empty_storage() if k not in _SHARDED_KEYS)
+        # Lazy mode reads no shards here; the legacy document holds every body anyway
+        self.lazy = self._lazy_wanted() and not legacy
+        if legacy:
+            # Original single-document layout: profiles and artifacts come from the same document
+            self._storage["profiles"] = dict(loaded.get("profiles") or {})
+            self._keys = set(self._storage["profiles"])
+        elif self.lazy:
+            self._keys = {k for k in loaded.get("profile_shards") or {} if isinstance(k, str)}
+            self._storage["profiles"], self._storage["artifacts"], self._storage["history"] = {}, {}, {}
+            meta = loaded.get("profiles_meta") if isinstance(loaded.get("profiles_meta"), dict) else {}
+            for table, name in ((self._profile_hashes, "profiles"), (self._profile_sizes, "sizes"), (self._profile_entities, "entities")):
+                src = meta.get(name) if isinstance(meta.get(name), dict) else {}
+                table.update({k: v for k, v in src.items() if k in self._keys})
+        else:
+            (
+                self._storage["profiles"], self._storage["artifacts"], self._storage["history"], missing,
+            ) = await self._async_load_shards(
+                loaded.get("profile_shards") or {}
+            )
+            self._keys = set(self._storage["profiles"])
+            dirty = dirty or missing
+        if not isinstance(index.get("devices"), list):
+            # Stores written before devices moved out of entry options: take them from the entry
+            cfg = {**(self.entry.data or {}), **(self.entry.options or {})}
+            self._storage["devices"] = [dict(d) for d in cfg.get(CONF_DEVICES) or [] if isinstance(d, dict)]
+            dirty = True
         if not isinstance(self._storage.get("purged_devices"), list):
             self._storage["purged_devices"] = []
+            dirty = True
         if not isinstance(self._storage.get("purged_guids"), list):
             self._storage["purged_guids"] = []
-        # Compute and persist metadata
-        try:
-            s = json.dumps(self._storage["profiles"], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
-            phash = hashlib.sha256(s.encode("utf-8")).hexdigest()
-            self._storage["profiles_meta"] = {"hash": phash, "updated_at": int(time.time())}
-        except Exception:
-            pass
+            dirty = True
+        self.directory.load(*(self._storage.pop(k) for k in _DIRECTORY_KEYS))
+        dirty = self._update_profiles_meta() or dirty
+        recompiled = await self._refresh_artifacts()
+        if self.lazy:
+            # Profiles stored before their metadata was kept: read them once, a cache-full at a time
+            backfill = [
+                k for k in sorted(self._keys)
+                if k not in self._profile_hashes or k not in self._profile_sizes or k not in self._profile_entities
+            ]
+            for i in range(0, len(backfill), PROFILE_CACHE_SIZE):
+                await self._async_load_bodies(backfill[i:i + PROFILE_CACHE_SIZE])
+                self._evict()
+        self._loaded = True
+        self.generation += 1
+        self.profiles_generation += 1
+        if legacy and self._storage["profiles"]:
+            # Move every profile into its own shard and write the new layout right away
+            self._schedule_save("migrate to sharded layout", profiles=list(self._storage["profiles"]))
+            await self.async_flush()
+            _LOGGER.info("store: migrated %d profile(s) to per-profile storage", len(self._storage["profiles"]))
+        elif dirty or recompiled:
+            self._schedule_save("init", profiles=recompiled)
+        _LOGGER.debug(
+            "store: loaded profiles (%d%s)%s", len(self._keys), ", bodies on demand" if self.lazy else "",
+            " and saved migrations" if dirty or recompiled else "",
+        )
+
+    async def _async_load_shards(self, shards: Dict[str, Any]) -> Any:
+        """Load the per-profile Stores listed in the index. Returns (profiles, artifacts, history, any_missing)."""
+        keys = [k for k in shards if isinstance(k, str)]
+        results = await asyncio.gather(*(self._shard_store(k).async_load() for k in keys), return_exceptions=True)
+        profiles: Dict[str, Any] = {}
+        artifacts: Dict[str, Any] = {}
+        history: Dict[str, Any] = {}
+        missing = False
+        for key, data in zip(keys, results):
+            if not isinstance(data, dict) or not isinstance(data.get("profile"), dict):
+                _LOGGER.warning("store: profile shard for %s is missing or unreadable; dropping it", key)
+                missing = True
+                continue
+            profiles[key] = data["profile"]
+            if isinstance(data.get("artifact"), dict):
+                artifacts[key] = data["artifact"]
+            if isinstance(data.get("history"), list) and data["history"]:
+                history[key] = data["history"]
+        return profiles, artifacts, history, missing
+
+    # Device directory
+    def get_devices(self) -> List[Dict[str, Any]]:
+        """Stored device records (shared; copy before editing)."""
+        return self.directory.records()
+
+    def set_devices(self, devices: Iterable[Dict[str, Any]]) -> bool:
+        """Replace the device records, unique by device_id (delayed save); True if anything changed.
+
+        Entry options are not touched; callers mirror ``device_directory`` when the set changes.
+        """
+        if not self.directory.replace(devices):
+            return False
+        self.commit_devices()
+        return True
+
+    def _save_directory(self, reason: str) -> None:
+        if self.directory.dirty:
+            self.directory.dirty = False
+            self._schedule_save(reason)
+
+    def commit_devices(self, reason: str = "devices") -> bool:
+        """Schedule a save of ``directory`` edits; True (once per change) if its options part changed."""
+        self._save_directory(reason)
+        changed, self.directory.directory_dirty = self.directory.directory_dirty, False
+        return changed
+
+    def merge_device_directory(self, entries: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Device records for directory ``entries`` (e.g. edited in the options flow).
+
+        The entries decide which devices exist and their profile; screen, caps,
+        group and other fields are kept from the stored record of the same device.
+        """
+        out: List[Dict[str, Any]] = []
+        for entry in entries or []:
+            did = entry.get("device_id") if isinstance(entry, dict) else None
+            if not did:
+                continue
+            rec = dict(self.directory.get(did) or {})
+            rec.update(entry)
+            if not entry.get("profile"):
+                rec.pop("profile", None)
+            out.append(rec)
+        return out
+
+    # Export / import (JSON Lines, see store_archive)
+    async def async_export(self, path: str) -> Dict[str, int]:
+        """Write profiles, device settings and purge markers to ``path``; returns record counts.
+
+        Profiles go out a cache-full at a time and all file I/O and JSON
+        encoding run in the executor. The file only replaces ``path`` once complete.
+        """
+        run = self.hass.async_add_executor_job
+        writer = await run(ArchiveWriter, path)
+        counts = {"profile": 0, "device_settings": 0, "purged_device": 0, "purged_guid": 0}
         try:
-            if self._store:
-                await self._store.async_save(self._storage)
-            _LOGGER.debug("store: confirmed profiles on init (%d)", len(self._storage.get("profiles") or {}))
+            await run(writer.write, [header()])
+            keys = self.profile_keys()
+            for i in range(0, len(keys), PROFILE_CACHE_SIZE):
+                bodies = await self.async_get_profiles(keys[i:i + PROFILE_CACHE_SIZE])
+                records = [{"type": "profile", "key": k, "profile": v} for k, v in bodies.items()]
+                counts["profile"] += await run(writer.write, records)
+            settings = self._storage.get("device_settings") or {}
+            records = [
+                {"type": "device_settings", "device_id": did, "settings": dict(cur)}
+                for did, cur in settings.items() if isinstance(cur, dict)
+            ]
+            records += [{"type": "purged_device", "device_id": d} for d in sorted(self.directory.purged_ids)]
+            records += [{"type": "purged_guid", "guid": g} for g in sorted(self.directory.purged_guids)]
+            for rec in records:
+                counts[rec["type"]] += 1
+            await run(writer.write, records)
+            size = await run(writer.commit)
         except Exception:
-            _LOGGER.exception("store save after init failed")
+            await run(writer.abort)
+            raise
+        _LOGGER.info("store: exported %s to %s (%d bytes)", counts, path, size)
+        return counts
 
-        new_opts = {**(self.entry.options or {})}
-        new_opts[CONF_PROFILES] = dict(self._storage.get("profiles") or {})
-        self.hass.config_entries.async_update_entry(self.entry, options=new_opts)
+    async def async_import(self, path: str, *, replace: bool = False) -> Dict[str, int]:
+        """Load an export written by ``async_export``; returns record counts.
+
+        Records are merged into the Store: profiles and device settings from the
+        file win, purge markers are added. With ``replace`` the profiles, device
+        settings and purge markers not in the file are dropped. Raises ValueError
+        for a file that isn't an export.
+        """
+        run = self.hass.async_add_executor_job
+        fh = await run(open_archive, path)
+        counts = {"profile": 0, "device_settings": 0, "purged_device": 0, "purged_guid": 0, "skipped": 0}
+        seen: Set[str] = set()
+        settings: Dict[str, Dict[str, Any]] = {}
+        purged_devices: List[str] = []
+        purged_guids: List[str] = []
+        try:
+            first = await run(read_records, fh, 1)
+            check_header(first[0] if first else None)
+            while True:
+                batch = await run(read_records, fh, PROFILE_CACHE_SIZE)
+                if not batch:
+                    break
+                updates: Dict[str, Any] = {}
+                for rec in batch:
+                    kind = rec.get("type")
+                    if kind == "profile" and isinstance(rec.get("key"), str) and isinstance(rec.get("profile"), dict):
+                        updates[rec["key"]] = rec["profile"]
+                    elif kind == "device_settings" and isinstance(rec.get("device_id"), str) and isinstance(rec.get("settings"), dict):
+                        settings[rec["device_id"]] = rec["settings"]
+                    elif kind == "purged_device" and isinstance(rec.get("device_id"), str):
+                        purged_devices.append(rec["device_id"])
+                    elif kind == "purged_guid" and isinstance(rec.get("guid"), str):
+                        purged_guids.append(rec["guid"])
+                    else:
+                        counts["skipped"] += 1
+                        continue
+                    counts[kind] += 1
+                if updates:
+                    seen.update(updates)
+                    await self._async_apply_profiles(updates, (), "import")
+                    if self.lazy:
+                        # Unsaved profiles stay in memory; write them so the cache can let go
+                        await self.async_flush()
+        finally:
+            await run(fh.close)
+        if replace:
+            await self._async_apply_profiles({}, self._keys - seen, "import")
+            self._storage["device_settings"] = {}
+            self.directory.purged_ids.clear()
+            self.directory.purged_guids.clear()
+        ds = self._storage.setdefault("device_settings", {})
+        for did, patch in settings.items():
+            ds[did] = {**(ds.get(did) or {}), **patch}
+        self.directory.purged_ids.update(purged_devices)
+        self.directory.purged_guids.update(purged_guids)
+        self._schedule_save("import")
+        self._mirror_profiles("import")
+        _LOGGER.info("store: imported %s from %s%s", counts, path, " (replacing)" if replace else "")
+        return counts
 
     # Purged devices helpers
     def is_purged_device(self, *, device_id: str | None = None, guid: str | None = None) -> bool:
-        try:
-            if device_id and device_id in (self._storage.get("purged_devices") or []):
-                return True
-            if guid and guid in (self._storage.get("purged_guids") or []):
-                return True
-        except Exception:
-            pass
-        return False
+        return self.directory.is_purged(device_id=device_id, guid=guid)
 
     async def add_purged(self, *, device_id: str | None = None, guid: str | None = None) -> None:
-        changed = False
-        try:
-            if device_id:
-                lst = self._storage.setdefault("purged_devices", [])
-                if device_id not in lst:
-                    lst.append(device_id)
-                    changed = True
-            if guid:
-                lstg = self._storage.setdefault("purged_guids", [])
-                if guid not in lstg:
-                    lstg.append(guid)
-                    changed = True
-            if changed and self._store:
-                await self._store.async_save(self._storage)
-        except Exception:
-            _LOGGER.exception("store save failed (purged add)")
+        if self.directory.add_purged(device_id=device_id, guid=guid):
+            self._save_directory("purged add")
 
     async def remove_purged(self, *, device_id: str | None = None, guid: str | None = None) -> None:
-        changed = False
-        try:
-            if device_id and device_id in (self._storage.get("purged_devices") or []):
-                lst = list(self._storage.get("purged_devices") or [])
-                lst = [x for x in lst if x != device_id]
-                self._storage["purged_devices"] = lst
-                changed = True
-            if guid and guid in (self._storage.get("purged_guids") or []):
-                lstg = list(self._storage.get("purged_guids") or [])
-                lstg = [x for x in lstg if x != guid]
-                self._storage["purged_guids"] = lstg
-                changed = True
-            if changed and self._store:
-                await self._store.async_save(self._storage)
-        except Exception:
-            _LOGGER.exception("store save failed (purged remove)")
+        if self.directory.remove_purged(device_id=device_id, guid=guid):
+            self._save_directory("purged remove")
 
     def get_device_settings(self, device_id: str) -> Dict[str, Any]:
         try:
@@ -139,45 +857,97 @@ class StorageHelper:
         cur_src = ds.get(device_id)
         cur = dict(cur_src) if isinstance(cur_src, dict) else {}
         cur.update(patch)
+        if cur == cur_src:
+            return dict(cur)
         ds[device_id] = cur
-        try:
-            if self._store:
-                await self._store.async_save(self._storage)
-        except Exception:
-            _LOGGER.exception("store save failed (device_settings)")
+        self._schedule_save("device_settings")
         return dict(cur)
 
+    async def remove_device_settings(self, device_id: str) -> None:
+        ds = self._storage.get("device_settings")
+        if isinstance(ds, dict) and device_id in ds:
+            ds.pop(device_id, None)
+            self._schedule_save("device_settings remove")
+
+    def get_config_revs(self) -> Dict[str, Dict[str, Any]]:
+        """Return {device_id: {"rev", "content_hash"}} for the last published configs."""
+        revs = self._storage.get("config_revs")
+        if not isinstance(revs, dict):
+            return {}
+        return {k: dict(v) for k, v in revs.items() if isinstance(v, dict)}
+
+    async def set_config_revs(self, revs: Dict[str, Dict[str, Any]]) -> None:
+        """Persist per-device config revisions so rev stays monotonic across restarts."""
+        if revs == self._storage.get("config_revs"):
+            return
+        self._storage["config_revs"] = dict(revs)
+        self._schedule_save("config_revs")
+
+    def get_groups(self) -> Dict[str, Dict[str, Any]]:
+        """Return {group: {"profile": profile_key}} for the defined device groups."""
+        groups = self._storage.get("groups")
+        if not isinstance(groups, dict):
+            return {}
+        return {k: dict(v) for k, v in groups.items() if isinstance(v, dict)}
+
+    def get_group_overlays(self) -> Dict[str, Dict[str, Any]]:
+        """Return {device_id: merge patch} overlays for group members."""
+        overlays = self._storage.get("group_overlays")
+        if not isinstance(overlays, dict):
+            return {}
+        return {k: v for k, v in overlays.items() if isinstance(v, dict)}
+
+    async def set_group(self, group: str, profile: str | None) -> None:
+        """Define or update a device group (profile None removes the group)."""
+        groups = self._storage.setdefault("groups", {})
+        if profile:
+            if groups.get(group) == {"profile": profile}:
+                return
+            groups[group] = {"profile": profile}
+        else:
+            if group not in groups:
+                return
+            groups.pop(group, None)
+        self._schedule_save("groups")
+
+    async def set_group_overlay(self, device_id: str, overlay: Dict[str, Any] | None) -> None:
+        """Store a member's overlay; an empty or None overlay removes it."""
+        overlays = self._storage.setdefault("group_overlays", {})
+        if overlay:
+            if overlays.get(device_id) == overlay:
+                return
+            overlays[device_id] = dict(overlay)
+        else:
+            if device_id not in overlays:
+                return
+            overlays.pop(device_id, None)
+        self._schedule_save("group_overlays")
+
     async def persist_profiles(self, profiles: Dict[str, Any]) -> Dict[str, Any]:
-        """Persist profiles to Store and mirror into options. Returns the saved profiles copy."""
-        self._storage["profiles"] = dict(profiles)
-        # Update metadata
-        try:
-            s = json.dumps(self._storage["profiles"], ensure_ascii=False, sort_keys=True, separators=(",", ":"))
-            phash = hashlib.sha256(s.encode("utf-8")).hexdigest()
-            self._storage["profiles_meta"] = {"hash": phash, "updated_at": int(time.time())}
-        except Exception:
-            pass
-        # Save to Store
-        try:
-            if self._store:
-                await self._store.async_save(self._storage)
+        """Persist profiles to Store and mirror into options. Returns the saved profiles copy.
+
+        A no-op (apart from re-checking the options mirror) when the profiles are unchanged.
+        """
+        if await self._async_set_profiles(profiles, "profiles"):
             _LOGGER.debug("store: saved profiles (%d)", len(profiles))
-        except Exception:
-            _LOGGER.exception("store save failed (profiles)")
         # Mirror to options so HA UI reflects latest immediately
-        try:
-            new_opts = {**(self.entry.options or {})}
-            new_opts[CONF_PROFILES] = dict(profiles)
-            self.hass.config_entries.async_update_entry(self.entry, options=new_opts)
-        except Exception:
-            _LOGGER.exception("options mirror failed (profiles)")
-        return dict(self._storage.get("profiles") or {})
-
-    async def prune_unused_profiles(self, profiles: Dict[str, Any], devices: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Remove unreferenced profiles, save, and mirror to options. Returns remaining profiles."""
-        profs = dict(profiles or {})
-        if not profs:
-            return profs
+        self._mirror_profiles("profiles")
+        return dict(profiles)
+
+    async def async_update_profiles(self, updates: Dict[str, Any], removed: Iterable[str] = ()) -> bool:
+        """Save new/edited profiles and drop ``removed`` ones, leaving the rest alone; mirrors to options.
+
+        Unlike ``persist_profiles`` this needs no other profile bodies, so it
+        doesn't load anything in lazy mode. Returns True if anything changed.
+        """
+        changed = await self._async_apply_profiles(dict(updates), removed, "profiles")
+        self._mirror_profiles("profiles")
+        return changed
+
+    async def prune_unused_profiles(self, devices: List[Dict[str, Any]]) -> List[str]:
+        """Remove profiles no device or group references, save, and mirror to options. Returns removed keys."""
+        if not self._keys:
+            return []
         used: Set[str] = set()
         for d in devices:
             pk = (d.get("profile") or "").strip()
@@ -186,22 +956,16 @@ class StorageHelper:
                 used.add(pk)
             if did:
                 used.add(did)
+        # Profiles backing a device group are in use even if no device names them
+        for gdef in self.get_groups().values():
+            gp = (gdef.get("profile") or "").strip()
+            if gp:
+                used.add(gp)
         keep_always = {"default"}
-        remove = [k for k in list(profs.keys()) if k not in used and k not in keep_always]
-        for k in remove:
-            profs.pop(k, None)
-        self._storage["profiles"] = dict(profs)
-        try:
-            if self._store:
-                await self._store.async_save(self._storage)
-        except Exception:
-            _LOGGER.exception("store save failed (prune)")
+        remove = [k for k in sorted(self._keys) if k not in used and k not in keep_always]
+        if remove:
+            await self._async_apply_profiles({}, remove, "prune")
         # Mirror to options
-        try:
-            new_opts = {**(self.entry.options or {})}
-            new_opts[CONF_PROFILES] = dict(profs)
-            self.hass.config_entries.async_update_entry(self.entry, options=new_opts)
-        except Exception:
-            _LOGGER.exception("options mirror failed (prune)")
-        _LOGGER.debug("pruned unused profiles: removed=%s remaining=%d", remove, len(profs))
-        return profs
+        self._mirror_profiles("prune")
+        _LOGGER.debug("pruned unused profiles: removed=%s remaining=%d", remove, len(self._keys))
+        return remove
@@ -0,0 +1,111 @@
+"""JSON Lines export/import files for the integration Store.
+
+An archive holds one compact JSON object per line, gzip-compressed when the
+file name ends in ``.gz``, so a large Store can be backed up or moved without
+building one big document. The first line is a header; the others are records:
+
+    {"type": "header", "format": "ha_mqtt_dash.store", "version": 1, "created_at": 1700000000}
+    {"type": "profile", "key": "ipad1", "profile": {...}}
+    {"type": "device_settings", "device_id": "ipad1", "settings": {...}}
+    {"type": "purged_device", "device_id": "old-ipad"}
+    {"type": "purged_guid", "guid": "..."}
+
+Everything here does blocking file I/O; call it from an executor.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import time
+from typing import IO, Any, Dict, Iterable, List
+
+from .const import DOMAIN
+
+ARCHIVE_FORMAT = f"{DOMAIN}.store"
+ARCHIVE_VERSION = 1
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def archive_path(config_dir: str, name: str) -> str:
+    """Absolute path of ``name`` under ``config_dir``; ValueError if it points outside it."""
+    base = os.path.realpath(config_dir)
+    path = os.path.realpath(os.path.join(base, name))
+    if os.path.commonpath([base, path]) != base or path == base:
+        raise ValueError(f"{name!r} is not a file under the config directory")
+    return path
+
+
+def header() -> Dict[str, Any]:
+    return {"type": "header", "format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "created_at": int(time.time())}
+
+
+def check_header(rec: Any) -> None:
+    """Raise ValueError unless ``rec`` is the header of an archive this version can read."""
+    if not isinstance(rec, dict) or rec.get("type") != "header" or rec.get("format") != ARCHIVE_FORMAT:
+        raise ValueError("not a ha_mqtt_dash Store export")
+    if not isinstance(rec.get("version"), int) or rec["version"] > ARCHIVE_VERSION:
+        raise ValueError(f"unsupported export version {rec.get('version')!r}")
+
+
+class ArchiveWriter:
+    """Writes records to a temporary file that replaces ``path`` on ``commit``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._tmp = f"{path}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if path.endswith(".gz"):
+            self._fh: IO[str] = gzip.open(self._tmp, "wt", encoding="utf-8")
+        else:
+            self._fh = open(self._tmp, "w", encoding="utf-8")
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        for rec in records:
+            self._fh.write(json.dumps(rec, separators=(",", ":"), ensure_ascii=False))
+            self._fh.write("\n")
+            n += 1
+        return n
+
+    def commit(self) -> int:
+        """Close and move the file into place; returns its size in bytes."""
+        self._fh.close()
+        os.replace(self._tmp, self.path)
+        return os.path.getsize(self.path)
+
+    def abort(self) -> None:
+        self._fh.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+def open_archive(path: str) -> IO[str]:
+    """Open an archive for reading; gzip is detected from the file contents, not the name."""
+    with open(path, "rb") as fh:
+        magic = fh.read(2)
+    if magic == _GZIP_MAGIC:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_records(fh: IO[str], limit: int) -> List[Dict[str, Any]]:
+    """Up to ``limit`` records from ``fh`` (an empty list at the end). Blank lines are skipped."""
+    out: List[Dict[str, Any]] = []
+    while len(out) < limit:
+        line = fh.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError as err:
+            raise ValueError(f"invalid JSON line in export: {err}") from err
+        if isinstance(rec, dict):
+            out.append(rec)
+    return out
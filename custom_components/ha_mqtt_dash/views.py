@@ -18,7 +18,14 @@ Security model
 - Body size capped at 512 KB (checked via header and at read time).
 - device_id sanitised: alphanumeric + hyphens/underscores, max 64 chars.
 - Profile sanitised: round-tripped through json.dumps/loads; structure and
-  widget-count limits enforced; all string values length-capped.
+  widget-count limits enforced; overlapping widgets rejected; all string
+  values length-capped.
+
+Versioning
+----------
+The apply response carries the stored profile's content hash as its ETag.
+An editor may send it back as If-Match; the POST is then rejected with 412
+when the device's profile changed in the meantime.
 
 CORS
 ----
@@ -37,7 +44,8 @@ import time
 from aiohttp import web
 
 from .const import DOMAIN, CONF_API_UNTIL_KEY
-from .storage import StorageHelper
+from .grid import find_widget_overlaps
+from .storage import get_storage_helper
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -62,7 +70,8 @@ _RATE_WINDOW_SECS     = 60.0
 _CORS_HEADERS = {
     "Access-Control-Allow-Origin":  "*",
     "Access-Control-Allow-Methods": "POST, OPTIONS",
-    "Access-Control-Allow-Headers": "Authorization, Content-Type",
+    "Access-Control-Allow-Headers": "Authorization, Content-Type, If-Match",
+    "Access-Control-Expose-Headers": "ETag",
     "Access-Control-Max-Age":       "3600",
 }
 
@@ -160,6 +169,13 @@ def _sanitise_profile(raw: object) -> dict:
         if total > _MAX_TOTAL_WIDGETS:
             raise ValueError(f"profile total widget count exceeds {_MAX_TOTAL_WIDGETS}")
 
+    # Overlap check (same grid-occupancy validator as the options flow)
+    overlaps = find_widget_overlaps(cleaned)
+    if overlaps:
+        shown = ", ".join(overlaps[:10])
+        more = f" (+{len(overlaps) - 10} more)" if len(overlaps) > 10 else ""
+        raise ValueError(f"overlapping widgets: {shown}{more}")
+
     # String-length check (iterative BFS to avoid recursion limit)
     queue: list = [cleaned]
     while queue:
@@ -179,6 +195,18 @@ def _sanitise_profile(raw: object) -> dict:
 
 # ── Helpers ────────────────────────────────────────────────────────────────────
 
+def _etag(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def _etag_matches(header: str, digest: str | None) -> bool:
+    """RFC 9110 If-Match check against the current profile hash ("*" = any existing profile)."""
+    tags = [t.strip() for t in header.split(",") if t.strip()]
+    if "*" in tags:
+        return digest is not None
+    return digest is not None and any(t.removeprefix("W/").strip('"') == digest for t in tags)
+
+
 def _err(status: int, text: str) -> web.Response:
     return web.Response(
         status=status, text=text,
@@ -286,11 +314,13 @@ async def _post_handler(request: web.Request) -> web.Response:
 
     # ── 11. Persist ───────────────────────────────────────────────────────
     try:
-        helper = StorageHelper(hass, entry)
+        helper = get_storage_helper(hass, entry)
         await helper.async_init()
-        profs = dict(helper.storage.get("profiles") or {})
-        profs[device_id] = profile
-        await helper.persist_profiles(profs)
+        if_match = request.headers.get("If-Match")
+        if if_match and not _etag_matches(if_match, helper.get_profile_hash(device_id)):
+            return _err(412, "Profile was changed since it was loaded; reload it and retry")
+        await helper.async_update_profiles({device_id: profile})
+        digest = helper.get_profile_hash(device_id) or ""
     except Exception:
         _LOGGER.exception(
             "apply_profile: failed to persist for '%s' (user '%s')",
@@ -311,8 +341,8 @@ async def _post_handler(request: web.Request) -> web.Response:
     )
     return web.Response(
         content_type="application/json",
-        text=json.dumps({"status": "ok", "device_id": device_id}),
-        headers={"Access-Control-Allow-Origin": "*"},
+        text=json.dumps({"status": "ok", "device_id": device_id, "hash": digest}),
+        headers={"Access-Control-Allow-Origin": "*", "Access-Control-Expose-Headers": "ETag", "ETag": _etag(digest)},
     )
 
 
@@ -0,0 +1,80 @@
+"""Shared test setup: run with ``python -m pytest tests`` from the repository root."""
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import sys
+from typing import Any, Dict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from custom_components.ha_mqtt_dash import storage  # noqa: E402
+
+
+class FakeStore:
+    """In-memory stand-in for ``homeassistant.helpers.storage.Store``; delayed saves write at once."""
+
+    data: Dict[str, Any] = {}
+
+    def __init__(self, hass, version, key, *args, **kwargs) -> None:
+        self.key = key
+
+    async def async_load(self):
+        return copy.deepcopy(self.data.get(self.key))
+
+    async def async_save(self, data) -> None:
+        self.data[self.key] = copy.deepcopy(data)
+
+    def async_delay_save(self, func, delay=0) -> None:
+        self.data[self.key] = copy.deepcopy(func())
+
+    async def async_remove(self) -> None:
+        self.data.pop(self.key, None)
+
+
+class FakeEntry:
+    def __init__(self, data=None, options=None) -> None:
+        self.entry_id = "entry"
+        self.data = data or {}
+        self.options = options or {}
+
+
+class FakeConfigEntries:
+    def async_update_entry(self, entry, options=None, data=None) -> bool:
+        if options is not None:
+            entry.options = options
+        return True
+
+
+class FakeHass:
+    def __init__(self) -> None:
+        self.data: Dict[str, Any] = {}
+        self.config_entries = FakeConfigEntries()
+
+    async def async_add_executor_job(self, func, *args):
+        return func(*args)
+
+    def async_create_task(self, coro, *args, **kwargs):
+        return asyncio.ensure_future(coro)
+
+
+@pytest.fixture
+def stores(monkeypatch) -> Dict[str, Any]:
+    """Store contents by key; every Store the storage module creates reads and writes here."""
+    data: Dict[str, Any] = {}
+    monkeypatch.setattr(FakeStore, "data", data)
+    monkeypatch.setattr(storage, "Store", FakeStore)
+    return data
+
+
+@pytest.fixture
+def new_helper(stores):
+    """Create a StorageHelper as after an HA restart (fresh hass, same Store contents)."""
+
+    def _new(options=None) -> storage.StorageHelper:
+        return storage.get_storage_helper(FakeHass(), FakeEntry(options=options))
+
+    return _new
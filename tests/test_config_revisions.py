@@ -0,0 +1,77 @@
+"""Config revision stamping and JSON-Patch deltas (config_builder.compile_device_configs)."""
+from __future__ import annotations
+
+import hashlib
+import json
+
+from custom_components.ha_mqtt_dash.config_builder import _stamp_rev, compile_device_configs, encode_config
+from custom_components.ha_mqtt_dash.json_delta import apply_patch
+
+PROFILES = {
+    "panel": {"grid": {"columns": 4}, "widgets": [{"id": "w1", "entity_id": "light.kitchen", "type": "light", "x": 0, "y": 0, "w": 1, "h": 1}]},
+}
+
+
+def _device(caps=("delta",)):
+    return {"device_id": "panel", "profile": "panel", "caps": list(caps)}
+
+
+def _prev(res, with_payload=True):
+    state = {"rev": res["rev"], "content_hash": res["content_hash"]}
+    if with_payload:
+        state["payload"] = res["payload"]
+    return {res["device_id"]: state}
+
+
+def _relabel(label):
+    prof = json.loads(json.dumps(PROFILES["panel"]))
+    prof["widgets"][0]["label"] = label
+    return {"panel": prof}
+
+
+def test_first_build_is_rev_1_without_delta():
+    (res,) = compile_device_configs([_device()], PROFILES)
+    assert res["rev"] == 1 and res["changed"] and res["delta"] is None
+    assert json.loads(res["payload"])["rev"] == 1
+    assert res["payload"].startswith(b'{"rev":1,')
+
+
+def test_unchanged_rebuild_keeps_rev_and_sends_no_delta():
+    (first,) = compile_device_configs([_device()], PROFILES)
+    (again,) = compile_device_configs([_device()], PROFILES, _prev(first))
+    assert again["rev"] == first["rev"] and not again["changed"] and again["delta"] is None
+    assert again["payload"] == first["payload"] and again["content_hash"] == first["content_hash"]
+
+
+def test_changed_rebuild_bumps_rev_and_delta_reproduces_payload():
+    (first,) = compile_device_configs([_device()], PROFILES)
+    (second,) = compile_device_configs([_device()], _relabel("Lamp"), _prev(first))
+    assert second["rev"] == 2 and second["changed"]
+    delta = json.loads(second["delta"])
+    assert delta["from"] == 1 and delta["rev"] == 2
+    patched = apply_patch(json.loads(first["payload"]), delta["ops"])
+    assert patched == json.loads(second["payload"])
+    assert hashlib.sha256(encode_config(patched)).hexdigest() == delta["hash"] == second["hash"]
+
+
+def test_delta_only_for_delta_capable_devices_with_a_previous_payload():
+    (first,) = compile_device_configs([_device(caps=())], PROFILES)
+    (second,) = compile_device_configs([_device(caps=())], _relabel("Lamp"), _prev(first))
+    assert second["rev"] == 2 and second["delta"] is None
+    (first,) = compile_device_configs([_device()], PROFILES)
+    (second,) = compile_device_configs([_device()], _relabel("Lamp"), _prev(first, with_payload=False))
+    assert second["rev"] == 2 and second["delta"] is None
+
+
+def test_rev_from_profile_does_not_leak_into_the_document():
+    profiles = {"panel": {**PROFILES["panel"], "rev": 99}}
+    (res,) = compile_device_configs([_device()], profiles)
+    assert json.loads(res["payload"])["rev"] == 1
+
+
+def test_stamp_rev_swaps_the_placeholder_or_re_encodes():
+    doc = {"rev": 0, "a": 1}
+    assert _stamp_rev(encode_config(doc), doc, 7) == b'{"rev":7,"a":1}'
+    # Without the leading placeholder the document is encoded again rather than sliced
+    other = {"a": 1, "rev": 0}
+    assert json.loads(_stamp_rev(encode_config(other), other, 7)) == {"a": 1, "rev": 7}
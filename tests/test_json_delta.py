@@ -0,0 +1,77 @@
+"""JSON-Patch diff/apply and merge patches (json_delta)."""
+from __future__ import annotations
+
+import pytest
+
+from custom_components.ha_mqtt_dash.json_delta import apply_patch, make_patch, merge_patch
+
+
+def _round_trip(old, new):
+    ops = make_patch(old, new)
+    assert apply_patch(old, ops) == new
+    return ops
+
+
+def test_round_trip_nested_edit_is_a_single_replace():
+    old = {"ui": {"widgets": [{"id": "w1", "label": "Kitchen"}, {"id": "w2"}]}, "rev": 3}
+    new = {"ui": {"widgets": [{"id": "w1", "label": "Hall"}, {"id": "w2"}]}, "rev": 3}
+    assert _round_trip(old, new) == [{"op": "replace", "path": "/ui/widgets/0/label", "value": "Hall"}]
+
+
+def test_round_trip_escapes_tilde_and_slash_in_keys():
+    old = {"a/b": 1, "c~d": {"e~/f": 1}, "keep": 0}
+    new = {"a/b": 2, "c~d": {"e~/f": 1, "x": [1]}}
+    ops = _round_trip(old, new)
+    paths = {op["path"] for op in ops}
+    assert "/a~1b" in paths and "/c~0d/x" in paths and "/keep" in paths
+
+
+def test_round_trip_list_shrink_and_grow():
+    _round_trip({"l": [1, 2, 3, 4]}, {"l": [1, 5]})
+    _round_trip({"l": [1]}, {"l": [1, 2, {"k": None}]})
+    _round_trip({"l": [1, 2]}, {"l": []})
+    # Shrinking removes from the end so the earlier indexes stay valid
+    ops = make_patch([1, 2, 3], [1])
+    assert [op["path"] for op in ops] == ["/2", "/1"]
+
+
+def test_round_trip_root_replacement():
+    assert _round_trip({"a": 1}, [1, 2]) == [{"op": "replace", "path": "", "value": [1, 2]}]
+    _round_trip(1, "x")
+
+
+def test_type_changes_are_not_treated_as_equal():
+    # True == 1 in Python, but they encode differently
+    assert _round_trip({"v": 1}, {"v": True}) == [{"op": "replace", "path": "/v", "value": True}]
+    assert make_patch({"v": 1.0}, {"v": 1}) != []
+
+
+def test_apply_does_not_mutate_the_input():
+    doc = {"l": [{"a": 1}]}
+    apply_patch(doc, [{"op": "replace", "path": "/l/0/a", "value": 2}])
+    assert doc == {"l": [{"a": 1}]}
+
+
+@pytest.mark.parametrize("ops", [
+    [{"op": "remove", "path": "/missing"}],
+    [{"op": "replace", "path": "/l/5", "value": 1}],
+    [{"op": "add", "path": "/l/9", "value": 1}],
+    [{"op": "move", "path": "/a"}],
+    [{"op": "add", "path": "no-slash", "value": 1}],
+    [{"op": "remove", "path": ""}],
+])
+def test_apply_rejects_ops_that_do_not_fit(ops):
+    with pytest.raises(ValueError):
+        apply_patch({"a": 1, "l": [0]}, ops)
+
+
+def test_merge_patch_null_removes_and_dicts_merge():
+    target = {"a": 1, "b": {"c": 2, "d": 3}, "l": [1, 2]}
+    out = merge_patch(target, {"a": None, "b": {"c": None, "e": 4}, "l": [9], "missing": None})
+    assert out == {"b": {"d": 3, "e": 4}, "l": [9]}
+    assert target == {"a": 1, "b": {"c": 2, "d": 3}, "l": [1, 2]}
+
+
+def test_merge_patch_non_dict_patch_replaces_target():
+    assert merge_patch({"a": 1}, [1]) == [1]
+    assert merge_patch(None, {"a": {"b": None}}) == {"a": {}}
@@ -0,0 +1,149 @@
+"""Store layout migration and profile revision history (storage.StorageHelper)."""
+from __future__ import annotations
+
+import asyncio
+
+from custom_components.ha_mqtt_dash import storage
+from custom_components.ha_mqtt_dash.const import STORAGE_KEY
+from custom_components.ha_mqtt_dash.storage import HISTORY_MAX_BYTES, HISTORY_MAX_REVISIONS, push_history
+
+PROFILES = {
+    "kitchen": {"widgets": [{"id": "w1", "entity_id": "light.kitchen", "type": "light", "x": 0, "y": 0, "w": 1, "h": 1}]},
+    "hall/ipad": {"widgets": [{"id": "w1", "entity_id": "sensor.temp", "type": "sensor", "x": 1, "y": 0, "w": 2, "h": 1}]},
+}
+
+
+def _body(label: str) -> dict:
+    return {"widgets": [{"id": "w1", "entity_id": "light.kitchen", "type": "light", "label": label, "x": 0, "y": 0, "w": 1, "h": 1}]}
+
+
+async def _loaded(new_helper, **kwargs) -> storage.StorageHelper:
+    helper = new_helper(**kwargs)
+    await helper.async_init()
+    return helper
+
+
+def test_legacy_document_is_migrated_to_shards(stores, new_helper):
+    stores[STORAGE_KEY] = {
+        "profiles": PROFILES,
+        "device_settings": {"kitchen": {"brightness": 0.4, "keep_awake": True}},
+        "devices": [{"device_id": "kitchen", "profile": "kitchen", "guid": "g1"}],
+        "purged_devices": ["old"],
+    }
+
+    async def run():
+        helper = await _loaded(new_helper)
+        index = stores[STORAGE_KEY]
+        assert index["layout"] == storage._SHARDED_LAYOUT
+        assert "profiles" not in index and "artifacts" not in index
+        assert set(index["profile_shards"]) == set(PROFILES)
+        for key, shard in index["profile_shards"].items():
+            assert stores[shard]["key"] == key and stores[shard]["profile"] == PROFILES[key]
+        assert index["device_settings"] == {"kitchen": {"brightness": 0.4, "keep_awake": True}}
+        assert index["devices"] == [{"device_id": "kitchen", "profile": "kitchen", "guid": "g1"}]
+        assert helper.profile_keys() == sorted(PROFILES)
+
+        # Restart: the sharded layout reads back the same data and needs no further writes
+        storage.drop_storage_helper(helper.hass, helper.entry)
+        before = dict(stores)
+        again = await _loaded(new_helper)
+        assert await again.async_get_profiles() == PROFILES
+        assert again.get_device_settings("kitchen") == {"brightness": 0.4, "keep_awake": True}
+        assert again.directory.is_purged(device_id="old")
+        assert stores == before
+
+    asyncio.run(run())
+
+
+def test_lazy_restart_reads_bodies_from_their_shards(stores, new_helper):
+    stores[STORAGE_KEY] = {"profiles": PROFILES}
+
+    async def run():
+        await _loaded(new_helper)
+        lazy = await _loaded(new_helper, options={"profile_lazy": True})
+        assert lazy.lazy and lazy.profile_keys() == sorted(PROFILES)
+        assert await lazy.async_get_profiles(["hall/ipad"]) == {"hall/ipad": PROFILES["hall/ipad"]}
+
+    asyncio.run(run())
+
+
+def test_push_history_keeps_at_most_max_revisions():
+    history: list = []
+    body = _body("v0")
+    for i in range(1, HISTORY_MAX_REVISIONS + 6):
+        new = _body(f"v{i}")
+        history = push_history(history, body, new, f"h{i - 1}")
+        body = new
+    assert len(history) == HISTORY_MAX_REVISIONS
+    # Newest first: the front revision restores the body just replaced
+    assert history[0]["hash"] == f"h{HISTORY_MAX_REVISIONS + 4}"
+
+
+def test_push_history_keeps_at_most_max_bytes():
+    history: list = []
+    body = {"blob": ""}
+    for i in range(12):
+        new = {"blob": str(i) * 10_000}
+        history = push_history(history, body, new, None)
+        body = new
+    assert sum(rev["bytes"] for rev in history) <= HISTORY_MAX_BYTES
+    assert 1 <= len(history) < 12
+
+
+def test_push_history_drops_a_delta_larger_than_the_cap():
+    small = push_history([], {"a": 1}, {"a": 2}, None)
+    # The older revisions patch the replaced body, not the current one, so they go too
+    assert push_history(small, {"blob": "x" * (HISTORY_MAX_BYTES + 1)}, {"blob": ""}, None) == []
+
+
+def test_history_cap_is_per_profile(stores, new_helper):
+    stores[STORAGE_KEY] = {"profiles": {"a": _body("a0"), "b": _body("b0")}}
+
+    async def run():
+        helper = await _loaded(new_helper)
+        for i in range(1, HISTORY_MAX_REVISIONS + 5):
+            await helper.async_update_profiles({"a": _body(f"a{i}")})
+        await helper.async_update_profiles({"b": _body("b1")})
+        assert len(await helper.async_get_profile_history("a")) == HISTORY_MAX_REVISIONS
+        assert len(await helper.async_get_profile_history("b")) == 1
+
+    asyncio.run(run())
+
+
+def test_rollback_restores_the_exact_earlier_body_as_a_new_revision(stores, new_helper):
+    versions = [_body("v0"), _body("v1"), {"widgets": [], "grid": {"columns": 3}}, _body("v3")]
+    stores[STORAGE_KEY] = {"profiles": {"kitchen": versions[0]}}
+
+    async def run():
+        helper = await _loaded(new_helper)
+        for body in versions[1:]:
+            await helper.async_update_profiles({"kitchen": body})
+        assert len(await helper.async_get_profile_history("kitchen")) == 3
+
+        assert await helper.async_rollback_profile("kitchen", 2) == versions[1]
+        assert (await helper.async_get_profiles(["kitchen"]))["kitchen"] == versions[1]
+        # The rollback is a revision of its own: undoing it brings back the body it replaced
+        assert len(await helper.async_get_profile_history("kitchen")) == 4
+        assert await helper.async_rollback_profile("kitchen", 1) == versions[3]
+        assert await helper.async_rollback_profile("kitchen", 4) == versions[1]
+
+        # Survives a restart: history is stored with the profile's shard
+        storage.drop_storage_helper(helper.hass, helper.entry)
+        again = await _loaded(new_helper)
+        assert await again.async_rollback_profile("kitchen", 1) == versions[3]
+
+    asyncio.run(run())
+
+
+def test_rollback_beyond_the_kept_history_changes_nothing(stores, new_helper):
+    stores[STORAGE_KEY] = {"profiles": {"kitchen": _body("v0")}}
+
+    async def run():
+        helper = await _loaded(new_helper)
+        await helper.async_update_profiles({"kitchen": _body("v1")})
+        assert await helper.async_rollback_profile("kitchen", 2) is None
+        assert await helper.async_rollback_profile("kitchen", 0) is None
+        assert await helper.async_rollback_profile("missing", 1) is None
+        assert (await helper.async_get_profiles(["kitchen"]))["kitchen"] == _body("v1")
+
+    asyncio.run(run())